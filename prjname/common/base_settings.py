@@ -11,12 +11,46 @@ APPLICATION_ID = '1'
 AUTO_RELOAD = False
 ENFORCE_POLICIES = True
 STATS_ENABLED = False
+# 'statsd' sends a packet per metric, 'aggregated' accumulates metrics in
+# process and flushes them every STATS_FLUSH_INTERVAL seconds
+STATS_BACKEND = 'statsd'
+STATS_FLUSH_INTERVAL = 1.0
+STATS_MAX_TIMING_SAMPLES = 100
+# Seconds distinct values reported with stat_set are counted for, the
+# 'aggregated' backend sends their number as the <stat>.cardinality gauge
+STATS_SET_WINDOW = 60
 
 JWT_TOKEN_NOT_BEFORE_TIMEDELTA = datetime.timedelta(minutes=1)
 
 LOG_DIR = os.path.expanduser("~")
+# Write log records from a background thread when enabled. On a full queue
+# records are dropped ('drop') or the logging call waits ('block')
+LOG_ASYNC = False
+LOG_QUEUE_SIZE = 10000
+LOG_QUEUE_OVERFLOW = 'drop'
+LOG_BATCH_SIZE = 512
+# Request and response bodies are truncated to this length in log messages
+LOG_BODY_MAX_LENGTH = 1024
+# When LOG_LEVEL is ERROR or CRITICAL the last LOG_TAIL_BUFFER_SIZE records of
+# each request are kept and only written for failed requests, requests slower
+# than LOG_TAIL_LATENCY_THRESHOLD milliseconds and a LOG_TAIL_SAMPLE_RATE
+# fraction of the successful ones
+LOG_TAIL_BUFFER_SIZE = 256
+LOG_TAIL_LATENCY_THRESHOLD = 1000
+LOG_TAIL_SAMPLE_RATE = 0.01
 LOGGER_NAME = 'service'
 ANALYTICS_LOGGER_NAME = 'analytics'
+# With ANALYTICS_PIPELINE analytics events are written in batches by a
+# background thread to rotating gzipped files in ANALYTICS_DIR (read them with
+# prjname-analytics) instead of the analytics logger. Events are dropped when ANALYTICS_MAX_BUFFERED_EVENTS
+# are waiting to be written
+ANALYTICS_PIPELINE = False
+ANALYTICS_DIR = os.path.join(LOG_DIR, 'prjname_analytics')
+ANALYTICS_BATCH_SIZE = 1000
+ANALYTICS_FLUSH_INTERVAL = 5.0
+ANALYTICS_MAX_BUFFERED_EVENTS = 100000
+ANALYTICS_ROTATE_BYTES = 64 * 1024 * 1024
+ANALYTICS_ROTATE_INTERVAL = 60 * 60
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -27,6 +61,9 @@ LOGGING = {
         },
         'analytics': {
             'format': '%(asctime)s %(env)s %(service)s %(handler)s %(app)s %(account)s %(user)s %(device)s'
+        },
+        'json': {
+            '()': 'prjname.common.utils.log_pipeline.JsonFormatter'
         }
     },
     'handlers': {
@@ -62,3 +99,139 @@ JSON_SCHEMA_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)),
 JSON_SCHEMA_BASE_URL = "http://prjname/jsonschema/"
 
 DATE_TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+# JSON library used for request and response bodies: auto (ujson, simplejson
+# or json, the first one installed), ujson, simplejson or json
+JSON_CODEC = 'auto'
+
+# Request time budget (seconds) when the client does not send one, 0 means none
+DEFAULT_REQUEST_TIMEOUT = 0
+# Upper bound (seconds) for the time budget a client can ask for
+MAX_REQUEST_TIMEOUT = 60
+
+# Responses stored for requests with Idempotency-Key (in memory store)
+IDEMPOTENCY_CACHE_SIZE = 10000
+IDEMPOTENCY_TTL = 24 * 60 * 60
+
+# RestAdapter adaptive timeouts: p<PERCENTILE> * FACTOR bounded to [MIN, MAX] seconds
+REST_ADAPTIVE_TIMEOUT = False
+REST_ADAPTIVE_TIMEOUT_PERCENTILE = 99
+REST_ADAPTIVE_TIMEOUT_FACTOR = 3.0
+REST_ADAPTIVE_TIMEOUT_MIN = 0.1
+REST_ADAPTIVE_TIMEOUT_MAX = 20.0
+REST_ADAPTIVE_TIMEOUT_MIN_SAMPLES = 100
+
+# RestAdapter content encoding: accept compressed responses and compress
+# request bodies of at least REST_COMPRESS_MIN_SIZE bytes
+REST_ACCEPT_COMPRESSED = False
+REST_COMPRESS_REQUESTS = False
+REST_COMPRESS_MIN_SIZE = 1024
+REST_COMPRESS_LEVEL = 6
+REST_REQUEST_ENCODING = 'gzip'
+
+# RestAdapter response decoding. Bodies of at least REST_DECODE_OFFLOAD_MIN_SIZE
+# bytes are decoded in the WORKER_THREADS pool, incrementally when enabled
+REST_DECODE_RESPONSES = False
+REST_INCREMENTAL_DECODING = False
+REST_OFFLOAD_DECODING = True
+REST_DECODE_OFFLOAD_MIN_SIZE = 256 * 1024
+
+# StreamingHandler request bodies: size limit (bytes, can be set per route
+# with max_body_size) and size kept in memory before spooling to a temp file
+STREAMING_MAX_BODY_SIZE = 100 * 1024 * 1024
+STREAMING_SPOOL_THRESHOLD = 1024 * 1024
+# BaseHandler.build_streaming_response sends the body in chunks of this size
+STREAMING_RESPONSE_FLUSH_SIZE = 64 * 1024
+
+# BaseHandler response compression (gzip/deflate, brotli when installed) of
+# bodies of at least RESPONSE_COMPRESSION_MIN_SIZE bytes, when enabled.
+# Compressed bodies of handlers with cache_compressed_response are kept in a cache
+RESPONSE_COMPRESSION = False
+RESPONSE_COMPRESSION_MIN_SIZE = 1024
+RESPONSE_COMPRESSION_LEVEL = 6
+RESPONSE_COMPRESSION_CACHE_SIZE = 256
+RESPONSE_COMPRESSION_CACHE_TTL = 60
+
+# Verified JWT tokens kept (until they expire, at most JWT_CACHE_MAX_TTL
+# seconds) so signatures are only checked once, in the thread pool if offloaded
+JWT_CACHE_SIZE = 10000
+JWT_CACHE_MAX_TTL = 60 * 60
+JWT_VERIFY_OFFLOAD = True
+
+# Policy enforcers by product set: used as they are for POLICY_CACHE_TTL
+# seconds, then refreshed in the background while the stale one is used for
+# up to POLICY_CACHE_STALE_TTL more seconds
+POLICY_CACHE_TTL = 5 * 60
+POLICY_CACHE_STALE_TTL = 60 * 60
+POLICY_CACHE_SIZE = 1024
+
+# Subscriptions by API key: found ones are cached API_KEY_CACHE_TTL seconds,
+# missing ones API_KEY_NEGATIVE_TTL seconds, or API_KEY_FAILURE_WINDOW seconds
+# once a key failed API_KEY_MAX_FAILURES times within that window
+API_KEY_CACHE_SIZE = 10000
+API_KEY_CACHE_TTL = 5 * 60
+API_KEY_NEGATIVE_TTL = 30
+API_KEY_MAX_FAILURES = 5
+API_KEY_FAILURE_WINDOW = 10 * 60
+
+# Admission control: token bucket limits as requests per second and burst,
+# 0 meaning no limit (handlers can override the route and client ones). With
+# RATE_LIMIT_SHARED the buckets are shared by the worker processes of a host
+RATE_LIMIT_GLOBAL_RATE = 0
+RATE_LIMIT_GLOBAL_BURST = 0
+RATE_LIMIT_ROUTE_RATE = 0
+RATE_LIMIT_ROUTE_BURST = 0
+RATE_LIMIT_CLIENT_RATE = 0
+RATE_LIMIT_CLIENT_BURST = 0
+RATE_LIMIT_MAX_KEYS = 100000
+RATE_LIMIT_SHARED = False
+RATE_LIMIT_SHARED_SLOTS = 65536
+# Requests are rejected with 503 while the IOLoop lag (measured every
+# IOLOOP_LAG_INTERVAL seconds) is above LOAD_SHEDDING_LAG_THRESHOLD ms, 0 disables it
+IOLOOP_LAG_INTERVAL = 0.5
+LOAD_SHEDDING_LAG_THRESHOLD = 0
+LOAD_SHEDDING_RETRY_AFTER = 1
+
+# Retries allowed by the retry decorator budgets: RETRY_BUDGET_RATIO retries
+# per call to the target plus RETRY_BUDGET_MIN_PER_SECOND retries per second
+RETRY_BUDGET_RATIO = 0.1
+RETRY_BUDGET_MIN_PER_SECOND = 10
+
+# Health plugins: each check is bounded by HEALTH_CHECK_TIMEOUT seconds and
+# its result reused for up to HEALTH_MAX_AGE seconds. They are checked in the
+# background every HEALTH_REFRESH_INTERVAL seconds (0 to only check on demand)
+HEALTH_CHECK_TIMEOUT = 2.0
+HEALTH_MAX_AGE = 10
+HEALTH_REFRESH_INTERVAL = 5
+# Saturation health plugins report WARNING from the first and ERROR from the
+# second threshold. Lag in ms, usages as fractions of the limit, 0 disables
+HEALTH_IOLOOP_LAG_WARNING = 100
+HEALTH_IOLOOP_LAG_ERROR = 500
+HEALTH_CASSANDRA_IN_FLIGHT_WARNING = 1000
+HEALTH_CASSANDRA_IN_FLIGHT_ERROR = 5000
+HEALTH_CASSANDRA_POOL_USAGE_WARNING = 0.7
+HEALTH_CASSANDRA_POOL_USAGE_ERROR = 0.9
+HEALTH_HTTP_QUEUE_WARNING = 10
+HEALTH_HTTP_QUEUE_ERROR = 100
+HEALTH_MEMORY_USAGE_WARNING = 0.8
+HEALTH_MEMORY_USAGE_ERROR = 0.9
+# RSS limit in MB, 0 uses the cgroup limit or else the physical memory
+HEALTH_MEMORY_LIMIT = 0
+HEALTH_FD_USAGE_WARNING = 0.8
+HEALTH_FD_USAGE_ERROR = 0.9
+
+# Warm-up hooks run when the service starts, each bounded by WARMUP_TIMEOUT
+# seconds; /ready answers 503 until they are done. Failed required hooks are
+# run again every WARMUP_RETRY_INTERVAL seconds
+WARMUP_TIMEOUT = 30
+WARMUP_RETRY_INTERVAL = 5
+# Keyspaces whose Cassandra sessions are connected during the warm-up
+WARMUP_CASSANDRA_KEYSPACES = []
+
+# Worker processes forked by runservice (--workers), 'auto' for one per CPU.
+# Crashed workers are restarted up to WORKER_MAX_RESTARTS times
+WORKERS = 1
+WORKER_MAX_RESTARTS = 100
+
+# Threads of each shared thread pool used to run work off the IOLoop
+WORKER_THREADS = 4
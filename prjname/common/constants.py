@@ -1,5 +1,11 @@
 # HTTP header name for request-id
 REQUEST_ID_HTTP_HEADER = "X-Request-Id"
+# HTTP header name for the remaining request time budget in milliseconds
+REQUEST_TIMEOUT_HTTP_HEADER = "X-Request-Timeout"
+# HTTP header name for the client supplied idempotency key and the one
+# flagging replayed responses
+IDEMPOTENCY_KEY_HTTP_HEADER = "Idempotency-Key"
+IDEMPOTENT_REPLAY_HTTP_HEADER = "Idempotent-Replayed"
 
 # String to log when we don't have a request id
 NO_REQUEST_ID = 'no-request-id'
@@ -118,6 +118,52 @@ class InvalidArgumentValue(BadRequestBase):
         super(InvalidArgumentValue, self).__init__(self.info)
 
 
+class PayloadTooLarge(BadRequestBase):
+    """
+    Used to notify a request body bigger than the limit of the resource.
+    context should include the limit.
+    """
+
+    def __init__(self, context):      # pylint: disable=E1002
+        self.info = dict()
+        self.info[DEVELOPER_MESSAGE_KEY] = 'Request body too large'
+        self.info[USER_MESSAGE_KEY] = 'Request body too large'
+        self.info[CONTEXT_KEY] = context
+
+        super(PayloadTooLarge, self).__init__(self.info)
+
+
+class TooManyRequests(BadRequestBase):
+    """
+    Used to notify a client sending requests faster than allowed.
+    context should include the limit exceeded, retry_after the seconds to wait.
+    """
+
+    def __init__(self, context, retry_after=None):      # pylint: disable=E1002
+        self.info = dict()
+        self.info[DEVELOPER_MESSAGE_KEY] = 'Too many requests'
+        self.info[USER_MESSAGE_KEY] = 'Too many requests, please try again later'
+        self.info[CONTEXT_KEY] = context
+        self.retry_after = retry_after
+
+        super(TooManyRequests, self).__init__(self.info)
+
+
+class IdempotencyKeyReused(BadRequestBase):
+    """
+    Used to notify an Idempotency-Key already used by a request with a different body.
+    context should include the key.
+    """
+
+    def __init__(self, context):      # pylint: disable=E1002
+        self.info = dict()
+        self.info[DEVELOPER_MESSAGE_KEY] = 'Idempotency key already used with a different request body'
+        self.info[USER_MESSAGE_KEY] = 'Idempotency key already used with a different request'
+        self.info[CONTEXT_KEY] = context
+
+        super(IdempotencyKeyReused, self).__init__(self.info)
+
+
 class ForbiddenBase(InfoException):
     """
     Inherit from this exception to create exceptions where the error is about forbidden.
@@ -327,6 +373,37 @@ class DatabaseOperationError(TemporaryServiceError):
         super(DatabaseOperationError, self).__init__(self.info)
 
 
+class DeadlineExceeded(TemporaryServiceError):
+    """
+    Use when the time budget of the request ran out before the work was done.
+    Context should include the operation that was dropped.
+    """
+
+    def __init__(self, context):      # pylint: disable=E1002
+        self.info = dict()
+        self.info[DEVELOPER_MESSAGE_KEY] = 'Request deadline exceeded'
+        self.info[USER_MESSAGE_KEY] = 'The request took too long to be processed'
+        self.info[CONTEXT_KEY] = context
+
+        super(DeadlineExceeded, self).__init__(self.info)
+
+
+class ServiceOverloaded(TemporaryServiceError):
+    """
+    Use when a request is rejected because the service is too busy to serve it in time.
+    Context should include the overload detected, retry_after the seconds to wait.
+    """
+
+    def __init__(self, context, retry_after=None):      # pylint: disable=E1002
+        self.info = dict()
+        self.info[DEVELOPER_MESSAGE_KEY] = 'Service overloaded'
+        self.info[USER_MESSAGE_KEY] = 'Service overloaded, please try again later'
+        self.info[CONTEXT_KEY] = context
+        self.retry_after = retry_after
+
+        super(ServiceOverloaded, self).__init__(self.info)
+
+
 class ExternalProviderUnavailablePermanently(PermanentServiceError):
     """
     Use when a external service provider is not available.
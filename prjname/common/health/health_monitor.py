@@ -1,34 +1,141 @@
+import datetime
+import time
+
 import stevedore
 
 from tornado import gen
+from tornado import ioloop
 
+from prjname.common import settings
 from prjname.common import version
 from prjname.common.health.plugin import HealthPlugin
+from prjname.common.utils import executors
 
 
 class HealthMonitor(object):  # pylint: disable=R0903
-    def __init__(self):
-        self.plugins = stevedore.extension.ExtensionManager(
+    """
+    Runs the health plugins concurrently in a thread pool, each one bounded
+    by timeout seconds, and keeps their results so /health answers from memory.
+    Results older than max_age seconds are checked again before answering;
+    with a refresh_interval they are refreshed in the background so that
+    does not happen.
+    """
+
+    def __init__(self, plugins=None, timeout=None, max_age=None, refresh_interval=None):
+        self.plugins = plugins if plugins is not None else stevedore.extension.ExtensionManager(
             namespace='prjname.health.plugins',
             invoke_on_load=True,
         )
+        self._timeout = float(timeout if timeout is not None else settings.HEALTH_CHECK_TIMEOUT)
+        self._max_age = float(max_age if max_age is not None else settings.HEALTH_MAX_AGE)
+        self._refresh_interval = float(refresh_interval if refresh_interval is not None
+                                       else settings.HEALTH_REFRESH_INTERVAL)
+
+        # Plugin name to (checked at, health, status)
+        self._results = {}
+        # Plugin checks still running, a hung plugin is not started again
+        self._pending = {}
+        self._refreshing = None
+        self._periodic_refresh = None
+
+    def start(self):
+        """
+        Refresh the results every refresh_interval seconds on the current IOLoop
+        """
+        if self._periodic_refresh is None and self._refresh_interval:
+            self._periodic_refresh = ioloop.PeriodicCallback(
+                self.refresh, self._refresh_interval * 1000)
+            self._periodic_refresh.start()
+
+    def stop(self):
+        if self._periodic_refresh is not None:
+            self._periodic_refresh.stop()
+            self._periodic_refresh = None
+
+    def refresh(self):
+        """
+        Check every plugin, concurrent calls share the same check
+        """
+        if self._refreshing is None:
+            self._refreshing = self._refresh()
+            self._refreshing.add_done_callback(self._refreshed)
+        return self._refreshing
+
+    def _refreshed(self, _):
+        self._refreshing = None
+
+    @gen.coroutine
+    def _refresh(self):
+        yield [self._check(plugin) for plugin in self.plugins]
+
+    @gen.coroutine
+    def _check(self, plugin):
+        try:
+            future = self._pending.get(plugin.name)
+            if future is None:
+                future = self._pending[plugin.name] = self._get_status(plugin)
+                # Thread pool futures run their callbacks on the worker thread
+                ioloop.IOLoop.current().add_future(
+                    future, lambda _: self._pending.pop(plugin.name, None))
+
+            health, status = yield gen.with_timeout(
+                datetime.timedelta(seconds=self._timeout), future)
+        except gen.TimeoutError:
+            health, status = self._error_status(plugin, 'timed out after %.1f s' % self._timeout)
+        except Exception as ex:  # pylint: disable=W0703
+            health, status = self._error_status(plugin, str(ex))
+
+        self._results[plugin.name] = (time.time(), health, status)
+
+    @staticmethod
+    def _get_status(plugin):
+        """
+        Start the plugin check, synchronous ones in the health thread pool
+        so the timeout is enforced and they run concurrently
+        """
+        if getattr(plugin.obj, 'RUN_ON_IOLOOP', False):
+            return gen.maybe_future(plugin.obj.get_status())
+        return executors.get_executor('health').submit(plugin.obj.get_status)
+
+    @staticmethod
+    def _error_status(plugin, error):
+        return HealthPlugin.ERROR, {
+            'name': plugin.name,
+            'status': HealthPlugin.ERROR[1],
+            'exposure': HealthPlugin.HIGH,
+            'error': error
+        }
+
+    def _is_stale(self, now):
+        return any(plugin.name not in self._results or
+                   now - self._results[plugin.name][0] > self._max_age
+                   for plugin in self.plugins)
 
     @gen.coroutine
     def get_status(self, include_details=False):
+        self.start()
+        if self._is_stale(time.time()):
+            yield self.refresh()
+
+        now = time.time()
         service_health = HealthPlugin.OK
+        oldest_check = now
 
         plugin_status = []
         for plugin in self.plugins:
-            health, status = yield plugin.obj.get_status()
+            checked_at, health, status = self._results[plugin.name]
             service_health = (health if health > service_health
                               else service_health)
-            plugin_status.append(status)
+            oldest_check = min(oldest_check, checked_at)
+            # Seconds since the plugin was checked
+            plugin_status.append(dict(status, age=round(now - checked_at, 3)))
 
         # health severity's status could be OK, WARNING or ERROR
         service_status = [{
             'name': 'systemHealth',
             'status': service_health[1],
-            'exposure': HealthPlugin.HIGH
+            'exposure': HealthPlugin.HIGH,
+            'age': round(now - oldest_check, 3)
         }]
 
         status = []
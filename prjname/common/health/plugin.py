@@ -22,6 +22,11 @@ class HealthPlugin(object):
                                               (2, 'ERROR'))
     HEALTH_EXPOSURE = (LOW, MEDIUM, HIGH) = ('LOW', 'MEDIUM', 'HIGH')
 
+    # get_status() is called in a worker thread so a blocking check does not
+    # stall the IOLoop. Plugins returning a Future (e.g. coroutines) must set
+    # it to True to be called on the IOLoop instead.
+    RUN_ON_IOLOOP = False
+
     @abc.abstractmethod
     def get_status(self):
         """Returns the status of the service/plugin/etc that this class checks.
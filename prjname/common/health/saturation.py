@@ -0,0 +1,171 @@
+"""
+Saturation health plugins: how close the process is to the limits of the
+IOLoop, the Cassandra connections, the outbound HTTP client, memory and
+file descriptors. Thresholds come from the HEALTH_* settings.
+"""
+import os
+import resource
+
+from tornado import httpclient
+
+from prjname.common import settings
+from prjname.common.health.plugin import HealthPlugin
+from prjname.common.utils import cassandra_adapter
+from prjname.common.utils import ioloop_lag
+
+CGROUP_MEMORY_LIMITS = ('/sys/fs/cgroup/memory.max',
+                        '/sys/fs/cgroup/memory/memory.limit_in_bytes')
+
+
+def severity(value, warning, error):
+    """
+    HEALTH_SEVERITY of value for the warning and error thresholds,
+    a threshold of 0 is not checked
+    """
+    warning, error = float(warning), float(error)
+    if error and value >= error:
+        return HealthPlugin.ERROR
+    if warning and value >= warning:
+        return HealthPlugin.WARNING
+    return HealthPlugin.OK
+
+
+class SaturationPlugin(HealthPlugin):
+    """
+    Base class of the saturation plugins, get_metrics() returns a list of
+    (metric name, value, warning threshold, error threshold) and the worst
+    severity of them is the plugin health
+    """
+    NAME = None
+    EXPOSURE = HealthPlugin.HIGH
+    # The metrics are cheap to read and some of them (lag monitor, HTTP
+    # client of the IOLoop) belong to the IOLoop thread
+    RUN_ON_IOLOOP = True
+
+    def get_metrics(self):
+        raise NotImplementedError()
+
+    def get_status(self):
+        health = HealthPlugin.OK
+        status = {'name': self.NAME, 'exposure': self.EXPOSURE}
+        for name, value, warning, error in self.get_metrics():
+            health = max(health, severity(value, warning, error))
+            status[name] = round(value, 3) if isinstance(value, float) else value
+        status['status'] = health[1]
+        return health, status
+
+
+class IOLoopLagPlugin(SaturationPlugin):
+    """
+    Smoothed IOLoop lag in ms measured by the ioloop_lag periodic timer
+    """
+    NAME = 'ioloopLag'
+
+    def get_metrics(self):
+        if ioloop_lag.get_monitor() is None:
+            ioloop_lag.start(float(settings.IOLOOP_LAG_INTERVAL))
+        monitor = ioloop_lag.get_monitor()
+        return [
+            ('lag', monitor.average, settings.HEALTH_IOLOOP_LAG_WARNING,
+             settings.HEALTH_IOLOOP_LAG_ERROR),
+            ('maxLag', monitor.reset_max(), 0, 0),
+        ]
+
+
+class CassandraPlugin(SaturationPlugin):
+    """
+    Queries waiting for an answer and usage of the connection pool of the
+    busiest host
+    """
+    NAME = 'cassandra'
+
+    def get_metrics(self):
+        adapter = cassandra_adapter.CassandraAdapter
+        return [
+            ('inFlight', adapter.get_in_flight(),
+             settings.HEALTH_CASSANDRA_IN_FLIGHT_WARNING,
+             settings.HEALTH_CASSANDRA_IN_FLIGHT_ERROR),
+            ('poolUsage', adapter.get_pool_usage(),
+             settings.HEALTH_CASSANDRA_POOL_USAGE_WARNING,
+             settings.HEALTH_CASSANDRA_POOL_USAGE_ERROR),
+        ]
+
+
+class HttpClientPlugin(SaturationPlugin):
+    """
+    Requests queued in the AsyncHTTPClient of the IOLoop waiting for one of
+    its max_clients slots
+    """
+    NAME = 'httpClient'
+    EXPOSURE = HealthPlugin.MEDIUM
+
+    def get_metrics(self):
+        client = httpclient.AsyncHTTPClient()
+        # simple_httpclient and curl_httpclient keep their queues apart
+        queued = len(getattr(client, 'queue', getattr(client, '_requests', ())))
+        if hasattr(client, 'active'):
+            active = len(client.active)
+        else:
+            active = len(getattr(client, '_curls', ())) - len(getattr(client, '_free_list', ()))
+        return [
+            ('queued', queued, settings.HEALTH_HTTP_QUEUE_WARNING,
+             settings.HEALTH_HTTP_QUEUE_ERROR),
+            ('active', active, 0, 0),
+        ]
+
+
+class MemoryPlugin(SaturationPlugin):
+    """
+    Resident memory as a fraction of HEALTH_MEMORY_LIMIT, the cgroup limit
+    or the physical memory
+    """
+    NAME = 'memory'
+
+    def __init__(self):
+        self._page_size = resource.getpagesize()
+        self._limit = self._get_limit()
+
+    def _get_limit(self):
+        if int(settings.HEALTH_MEMORY_LIMIT):
+            return int(settings.HEALTH_MEMORY_LIMIT) * 1024 * 1024
+
+        physical = os.sysconf('SC_PHYS_PAGES') * self._page_size
+        for path in CGROUP_MEMORY_LIMITS:
+            try:
+                with open(path) as limit_file:
+                    limit = limit_file.read().strip()
+            except IOError:
+                continue
+            # 'max' or a huge number mean no limit
+            if limit.isdigit() and int(limit) < physical:
+                return int(limit)
+        return physical
+
+    def get_rss(self):
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * self._page_size
+
+    def get_metrics(self):
+        rss = self.get_rss()
+        return [
+            ('usage', float(rss) / self._limit, settings.HEALTH_MEMORY_USAGE_WARNING,
+             settings.HEALTH_MEMORY_USAGE_ERROR),
+            ('rssMB', rss // (1024 * 1024), 0, 0),
+        ]
+
+
+class FileDescriptorPlugin(SaturationPlugin):
+    """
+    Open file descriptors as a fraction of the RLIMIT_NOFILE soft limit
+    """
+    NAME = 'fileDescriptors'
+
+    def get_metrics(self):
+        open_fds = len(os.listdir('/proc/self/fd'))
+        limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+        usage = float(open_fds) / limit if limit > 0 else 0.0
+        return [
+            ('usage', usage, settings.HEALTH_FD_USAGE_WARNING,
+             settings.HEALTH_FD_USAGE_ERROR),
+            ('open', open_fds, 0, 0),
+        ]
@@ -5,6 +5,11 @@ import stevedore
 from tornado import httpserver
 from tornado import ioloop
 
+from prjname.common import settings
+from prjname.common.tornado import prefork
+from prjname.common.utils import bootstrap
+from prjname.common.warmup import warmup_runner
+
 
 class AllCommand(cliff.command.Command):  # pylint: disable=too-few-public-methods
     def __init__(self, app, app_args):
@@ -15,7 +20,18 @@ class AllCommand(cliff.command.Command):  # pylint: disable=too-few-public-metho
             check_func=lambda plugin: plugin.name != 'all',
         )
 
+    def get_parser(self, prog_name):
+        parser = super(AllCommand, self).get_parser(prog_name)
+        parser.add_argument("--workers",
+                            help="Worker processes to fork, 'auto' for one "
+                                 "per CPU",
+                            type=prefork.parse_workers,
+                            default=str(settings.WORKERS))
+        return parser
+
     def take_action(self, parsed_args):
+        worker_id = prefork.start(parsed_args.workers)
+        bootstrap.bootstrap(worker_id=worker_id)
         for command in self.all_commands:
             print "[{0}] listening at port {1}...".format(
                 command.name, command.plugin.DEFAULT_PORT)
@@ -23,9 +39,11 @@ class AllCommand(cliff.command.Command):  # pylint: disable=too-few-public-metho
             server = httpserver.HTTPServer(
                 sys.modules[command.plugin.__module__].APPLICATION,
                 xheaders=True)
-            server.bind(command.plugin.DEFAULT_PORT)
+            server.bind(command.plugin.DEFAULT_PORT,
+                        reuse_port=worker_id is not None)
             server.start()
 
+        warmup_runner.start()
         ioloop.IOLoop.current().start()
 
     def get_description(self):
@@ -0,0 +1,70 @@
+"""
+Admission control: token bucket limits (global, per route and per client)
+and load shedding when the IOLoop falls behind
+"""
+from prjname.common import exceptions
+from prjname.common import settings
+from prjname.common.utils import ioloop_lag
+from prjname.common.utils import rate_limit
+
+
+class AdmissionController(object):
+    """
+    Decides whether a request is served. Limits are (rate per second, burst)
+    pairs, a rate of 0 means no limit. Buckets are kept in the shared store
+    when one was installed before forking (rate_limit.install_shared_store)
+    and in this process otherwise.
+    """
+
+    def __init__(self, store=None):
+        self._store = store
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = (rate_limit.get_shared_store() or
+                           rate_limit.LocalBucketStore(int(settings.RATE_LIMIT_MAX_KEYS)))
+        return self._store
+
+    def _consume(self, handler, scope, key, limit):
+        # Limits overridden from the environment are strings
+        rate, burst = float(limit[0] or 0), float(limit[1] or 0)
+        if not rate:
+            return
+
+        allowed, retry_after = self.store.consume('%s:%s' % (scope, key), rate,
+                                                  burst or rate)
+        if not allowed:
+            handler.support.stat_increment('admission.%s.rejected_count' % scope)
+            raise exceptions.TooManyRequests('%s rate limit exceeded' % scope, retry_after)
+
+    def admit(self, handler):
+        """
+        Apply load shedding and the global and route limits, raise
+        ServiceOverloaded or TooManyRequests when the request must be rejected
+        """
+        lag_threshold = float(settings.LOAD_SHEDDING_LAG_THRESHOLD)
+        if lag_threshold and ioloop_lag.current_lag() > lag_threshold:
+            handler.support.stat_increment('admission.shed_count')
+            raise exceptions.ServiceOverloaded(
+                'IOLoop lag %.0f ms' % ioloop_lag.current_lag(),
+                float(settings.LOAD_SHEDDING_RETRY_AFTER))
+
+        self._consume(handler, 'global', '', (settings.RATE_LIMIT_GLOBAL_RATE,
+                                              settings.RATE_LIMIT_GLOBAL_BURST))
+        self._consume(handler, 'route', handler.resource_name,
+                      handler.route_rate_limit or (settings.RATE_LIMIT_ROUTE_RATE,
+                                                   settings.RATE_LIMIT_ROUTE_BURST))
+
+    def admit_client(self, handler, client_id):
+        """
+        Apply the per client limit, raise TooManyRequests when exceeded
+        """
+        if client_id is None:
+            return
+        self._consume(handler, 'client', client_id,
+                      handler.client_rate_limit or (settings.RATE_LIMIT_CLIENT_RATE,
+                                                    settings.RATE_LIMIT_CLIENT_BURST))
+
+
+DEFAULT_CONTROLLER = AdmissionController()
@@ -1,36 +1,85 @@
 """
 BaseHandler
 """
-import collections
-import json
-import os
+import calendar
+import datetime
+import email.utils
+import hashlib
+import math
 import sys
+import time
 
-from logging import config
-from logging import getLogger
+from tornado import gen
 from tornado import httpclient
+from tornado import iostream
 from tornado import web
 
 from prjname.common import constants
 from prjname.common import exceptions
 from prjname.common import settings
+from prjname.common.tornado.handlers import admission
+from prjname.common.utils import bootstrap
+from prjname.common.utils import caches
+from prjname.common.utils import compression
+from prjname.common.utils import json_codec
+from prjname.common.utils.deadline import Deadline
 from prjname.common.utils.support import Support
+from prjname.common.utils.support import truncated
 
 METHODS = (OPTIONS, GET, POST, PUT, DELETE, HEAD, PATCH) = (
     'OPTIONS', 'GET', 'POST', 'PUT', 'DELETE', 'HEAD', 'PATCH'
 )
 
+COMPRESSIBLE_CONTENT_TYPES = ('application/json', 'application/x-ndjson', 'application/xml',
+                              'application/javascript')
+
+# Compressed bodies of handlers with cache_compressed_response, by
+# (encoding, level, body hash)
+COMPRESSED_RESPONSES = caches.TTLCache(int(settings.RESPONSE_COMPRESSION_CACHE_SIZE),
+                                       int(settings.RESPONSE_COMPRESSION_CACHE_TTL))
+
 
 class BaseHandler(web.RequestHandler):  # pylint: disable=too-many-public-methods
     """
     BaseHandler
     """
+
+    # Decode JSON bodies into OrderedDicts, slower than plain dicts so only
+    # for handlers that depend on the order of the keys sent by the client
+    preserve_body_key_order = False
+    # Bodies are parsed in prepare, invalid ones answered with 400 before the
+    # handler method runs. Handlers that may not need the body can parse it
+    # on first access to body_arguments instead, then InvalidArgument is
+    # raised there.
+    lazy_body_parsing = False
+
+    # Response compression: bodies of at least RESPONSE_COMPRESSION_MIN_SIZE
+    # bytes are compressed with the best encoding accepted by the client.
+    # Handlers sending the same bodies over and over (e.g. reference data)
+    # can keep them compressed with cache_compressed_response.
+    compress_response = True
+    compression_level = None
+    cache_compressed_response = False
+
+    # Admission control (see admission). (rate per second, burst) limits of
+    # this route and of every client on it, settings.RATE_LIMIT_ROUTE_*/
+    # RATE_LIMIT_CLIENT_* when None
+    admission_control = True
+    route_rate_limit = None
+    client_rate_limit = None
+
+    _NOT_PARSED = object()
+
     def __init__(self, application, request, **kwargs):
         """
         Constructor
         """
         super(BaseHandler, self).__init__(application, request, **kwargs)
         self.context = None
+        self.deadline = None
+        self.idempotency_key = None
+        self.recorded_response = None
+        self._body_arguments = self._NOT_PARSED
 
     def data_received(self, chunk):
         pass
@@ -40,24 +89,17 @@ class BaseHandler(web.RequestHandler):  # pylint: disable=too-many-public-method
         self.handler = handler
         self.request_id = self.request.headers.get(constants.REQUEST_ID_HTTP_HEADER)
 
-        config.dictConfig(settings.LOGGING)
-        logger = getLogger(settings.LOGGER_NAME)
-
-        environment_name = 'MFS_ENV'
-
-        environment = os.environ.get(environment_name)
-        if not environment:
-            raise exceptions.GeneralInfoException(
-                '{0} environment variable not found'.format(environment_name))
-        self.environment = environment
+        process_context = bootstrap.get_process_context()
+        self.environment = process_context.environment
 
         session_info = {
-            'environment': environment,
+            'environment': self.environment,
             'service': self.settings.get('service_name'),
             'handler': handler,
             'requestId': self.request_id
         }
-        self.support = Support(logger, session_info)
+        self.support = Support(process_context.logger, session_info,
+                               process_context.stats_client)
 
         self.resource_name = "{0}_{1}".format(session_info['service'],
                                               handler if handler else '')
@@ -69,7 +111,15 @@ class BaseHandler(web.RequestHandler):  # pylint: disable=too-many-public-method
         request method
         """
 
+        self.request.received_at = time.time()
         try:
+            self.deadline = Deadline.from_request(self.request)
+            if self.deadline:
+                self.deadline.check('%s %s' % (self.request.method, self.request.path))
+
+            if self.admission_control:
+                admission.DEFAULT_CONTROLLER.admit(self)
+
             self.process_query()
             self.process_headers()
             self.process_body()
@@ -77,19 +127,20 @@ class BaseHandler(web.RequestHandler):  # pylint: disable=too-many-public-method
             request = self.request
 
             self.support.notify_debug(
-                "[BaseHandler] request: %s %s" % (str(request.method), str(request.uri)))
+                "[BaseHandler] request: %s %s", request.method, request.uri)
             self.support.notify_debug(
-                "[BaseHandler] query: %s" % str(request.query))
+                "[BaseHandler] query: %s", request.query)
             self.support.notify_debug(
-                "[BaseHandler] headers: %s" % str(request.headers))
-            self.support.notify_debug(
-                "[BaseHandler] body: %s" % str(request.body))
+                "[BaseHandler] headers: %s", request.headers)
 
-            body_size = sys.getsizeof(request.body)
             self.support.stat_increment('net.requests.total_count')
-            self.support.stat_increment('net.requests.total_bytes', body_size)
             self.support.stat_increment('net.requests.' + str(request.method) + '_count')
-            self.support.stat_increment('net.requests.' + str(request.method) + '_bytes', body_size)
+
+            # Streamed bodies are reported once received
+            if not getattr(self, '_stream_request_body', False):
+                self.support.notify_debug(
+                    "[BaseHandler] body: %s", truncated(request.body))
+                self.report_request_bytes(sys.getsizeof(request.body))
 
         except exceptions.InfoException as ex:
             self.support.notify_error(ex)
@@ -98,10 +149,113 @@ class BaseHandler(web.RequestHandler):  # pylint: disable=too-many-public-method
             self.support.notify_error(ex)
             self.build_response(ex)
 
+    def finish(self, chunk=None):
+        if chunk is not None:
+            self.write(chunk)
+        if not self._headers_written:
+            # The ETag is computed before compressing, so it is the same
+            # whatever the content encoding negotiated
+            if (self._status_code == 200 and self.request.method in (GET, HEAD) and
+                    'Etag' not in self._headers):
+                self.set_etag_header()
+                if self.check_etag_header():
+                    self._write_buffer = []
+                    self.set_status(304)
+                    self.support.stat_increment('net.responses.not_modified_count')
+            self._compress_response()
+        return super(BaseHandler, self).finish()
+
+    def _is_compressible(self):
+        if not (self.compress_response and settings.RESPONSE_COMPRESSION):
+            return False
+        if self.request.method == 'HEAD' or self.get_status() in (204, 304):
+            return False
+        if 'Content-Encoding' in self._headers:
+            return False
+
+        content_type = self._headers.get('Content-Type', '').split(';')[0].strip()
+        return (content_type.startswith('text/') or
+                content_type in COMPRESSIBLE_CONTENT_TYPES or
+                content_type.endswith('+json') or content_type.endswith('+xml'))
+
+    def _compress_response(self):
+        """
+        Compress the buffered response body when the client accepts it
+        """
+        if not self._is_compressible():
+            return
+
+        body = b''.join(self._write_buffer)
+        if len(body) < int(settings.RESPONSE_COMPRESSION_MIN_SIZE):
+            return
+
+        self.add_header('Vary', 'Accept-Encoding')
+        encoding = compression.negotiate(self.request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return
+
+        level = int(self.compression_level or settings.RESPONSE_COMPRESSION_LEVEL)
+        start_time = time.time()
+
+        cache_key = None
+        compressed = None
+        if self.cache_compressed_response:
+            cache_key = (encoding, level, hashlib.sha1(body).digest())
+            compressed = COMPRESSED_RESPONSES.get(cache_key)
+            self.support.stat_increment('net.responses.compress.cache_%s_count' %
+                                        ('hit' if compressed is not None else 'miss'))
+
+        if compressed is None:
+            compressed = compression.compress(body, encoding, level)
+            if cache_key is not None:
+                COMPRESSED_RESPONSES.set(cache_key, compressed)
+
+        self._write_buffer = [compressed]
+        self.set_header('Content-Encoding', encoding)
+
+        elapsed_ms = (time.time() - start_time) * 1000.0
+        self.support.stat_timing('net.responses.compress.time', elapsed_ms)
+        self.support.stat_increment('net.responses.compress.original_bytes', len(body))
+        self.support.stat_increment('net.responses.compress.compressed_bytes', len(compressed))
+        self.support.notify_debug(
+            "[BaseHandler] compress %s: %d -> %d bytes (ratio %.2f) in %.2f ms",
+            encoding, len(body), len(compressed),
+            float(len(body)) / len(compressed) if compressed else 0, elapsed_ms)
+
+    def admit_client(self, client_id):
+        """
+        Apply the per client rate limit, called by the authorization
+        decorators once the client is known. Raises TooManyRequests.
+        """
+        if self.admission_control:
+            admission.DEFAULT_CONTROLLER.admit_client(self, client_id)
+
+    def report_request_bytes(self, body_size):
+        self.support.stat_increment('net.requests.total_bytes', body_size)
+        self.support.stat_increment('net.requests.' + str(self.request.method) + '_bytes',
+                                    body_size)
+
+    def on_connection_close(self):
+        """
+        The client went away: cancel the deadline so pending work (queries,
+        retries, downstream requests) for this request stops
+        """
+        if self.deadline:
+            self.deadline.cancel()
+        self.support.stat_increment('net.requests.cancelled_count')
+        super(BaseHandler, self).on_connection_close()
+
+    def on_finish(self):
+        self.support.finish_request(self.get_status(),
+                                    self.request.request_time() * 1000.0)
+
     def set_default_headers(self):
         self.set_header("Server", "Miramar Web Server")
         self.set_header('Access-Control-Allow-Headers', 'Authorization, '
-                        + 'Content-Type, ' + constants.REQUEST_ID_HTTP_HEADER)
+                        + 'Content-Type, ' + constants.REQUEST_ID_HTTP_HEADER + ', '
+                        + constants.REQUEST_TIMEOUT_HTTP_HEADER + ', '
+                        + constants.IDEMPOTENCY_KEY_HTTP_HEADER + ', '
+                        + 'If-None-Match, If-Modified-Since')
         self.set_header('Access-Control-Allow-Credentials', 'true')
         self.set_header('Access-Control-Allow-Origin', '*')
         self.set_header('Access-Control-Max-Age', '1728000')
@@ -153,11 +307,34 @@ class BaseHandler(web.RequestHandler):  # pylint: disable=too-many-public-method
     def process_body(self):
         """
         Process the request body to validate if it is valid based on the
-        Content-Type header.
+        Content-Type header, it is available in request.body_arguments. With
+        lazy_body_parsing the body is parsed on first access to body_arguments.
+        Overwrite this method to extend this behavior or to change it at all.
+        """
+
+        self._body_arguments = self._NOT_PARSED
+        if not self.lazy_body_parsing:
+            self.request.body_arguments = self.body_arguments
+
+    @property
+    def body_arguments(self):
+        """
+        Request body: decoded JSON for application/json bodies, the form
+        arguments for other POST/PUT bodies and None for other methods.
+        Raises InvalidArgument when the JSON body is not valid.
+        """
+
+        if self._body_arguments is self._NOT_PARSED:
+            self._body_arguments = self.parse_body()
+            self.request.body_arguments = self._body_arguments
+        return self._body_arguments
+
+    def parse_body(self):
+        """
+        Parse the request body based on the Content-Type header.
         Overwrite this method to extend this behavior or to change it at all.
         """
 
-        body = self.request.body
         method = self.request.method
 
         if method == 'POST' or method == 'PUT':
@@ -165,34 +342,171 @@ class BaseHandler(web.RequestHandler):  # pylint: disable=too-many-public-method
 
             if content_type.startswith('application/json'):
                 try:
-                    processed_body = json.loads(
-                        body, object_pairs_hook=collections.OrderedDict)
+                    return json_codec.loads(self.request.body,
+                                            ordered=self.preserve_body_key_order)
                 except (TypeError, ValueError) as ex:
                     raise exceptions.InvalidArgument('invalid body: %s' % ex)
             else:
-                processed_body = self.request.arguments
+                return self.request.arguments
         else:
-            processed_body = None
+            return None
 
-        self.request.body_arguments = processed_body
+    def build_response(self, result, status_code=None, version=None, last_modified=None):
+        """
+        Build the response data with the required format according to result.
+        For GET, version (ETag) and last_modified (datetime or seconds since
+        epoch) answer conditional requests with 304 without serializing the
+        result, without them the ETag is a hash of the body.
+        """
+        self._build_response_internal(True, result, status_code, version, last_modified)
 
-    def build_response(self, result, status_code=None):
+    def build_response_without_format(self, result, status_code=None, version=None,
+                                      last_modified=None):
         """
         Build the response data with the required format according to result
         """
-        self._build_response_internal(True, result, status_code)
+        self._build_response_internal(False, result, status_code, version, last_modified)
 
-    def build_response_without_format(self, result, status_code=None):
+    def check_not_modified(self, version=None, last_modified=None):
         """
-        Build the response data with the required format according to result
+        Set the ETag and Last-Modified headers of the entity and, when the
+        client copy is up to date (If-None-Match/If-Modified-Since), send a 304
+        response and return True. Call it before building the body when the
+        version is known up front (e.g. KeyValueAdapter.get_version):
+            if self.check_not_modified(version):
+                return
         """
-        self._build_response_internal(False, result, status_code)
+        if self.request.method not in (GET, HEAD):
+            return False
+
+        if version is not None:
+            self.set_header('Etag', '"%s"' % version)
+        if last_modified is not None:
+            if not isinstance(last_modified, datetime.datetime):
+                last_modified = datetime.datetime.utcfromtimestamp(last_modified)
+            self.set_header('Last-Modified', last_modified)
+
+        if not self._is_not_modified(last_modified):
+            return False
+
+        self.set_status(304)
+        if self.request_id:
+            self.set_header(constants.REQUEST_ID_HTTP_HEADER, self.request_id)
+        self.support.stat_increment('net.responses.total_count')
+        self.support.stat_increment('net.responses.not_modified_count')
+        self.finish()
+        return True
+
+    def _is_not_modified(self, last_modified=None):
+        if self.request.headers.get('If-None-Match'):
+            return 'Etag' in self._headers and self.check_etag_header()
 
-    def _build_response_internal(self, apply_format, result, status_code=None):
+        if_modified_since = self.request.headers.get('If-Modified-Since')
+        if if_modified_since and last_modified is not None:
+            since = email.utils.parsedate_tz(if_modified_since)
+            # Naive datetimes are UTC, aware ones are converted to UTC
+            return (since is not None and
+                    calendar.timegm(last_modified.utctimetuple()) <= email.utils.mktime_tz(since))
+
+        return False
+
+    @gen.coroutine
+    def build_streaming_response(self, items, ndjson=False, status_code=None):
+        """
+        Build the response from an iterable of items without holding the
+        whole result in memory: items are encoded one by one and sent (with
+        chunked transfer encoding) every settings.STREAMING_RESPONSE_FLUSH_SIZE
+        bytes, waiting for each flush so slow clients slow down the producer.
+        Items that are futures are waited for.
+        The body is a JSON array, or one JSON document per line with ndjson.
+        Streamed responses are not compressed nor recorded for
+        Idempotency-Key replays.
+        """
+
+        flush_size = int(settings.STREAMING_RESPONSE_FLUSH_SIZE)
+        separator = '\n' if ndjson else ','
+        # Bodies smaller than flush_size would otherwise be compressed in finish
+        self.compress_response = False
+
+        self.set_header("Content-Type",
+                        "application/x-ndjson" if ndjson else "application/json")
+        self.set_status(status_code if status_code is not None else 200)
+        if self.request_id:
+            self.set_header(constants.REQUEST_ID_HTTP_HEADER, self.request_id)
+
+        chunks = [] if ndjson else ['[']
+        chunks_size = sum(len(chunk) for chunk in chunks)
+        total_size = 0
+        first = True
+        flushed = False
+
+        try:
+            for item in items:
+                if gen.is_future(item):
+                    item = yield item
+
+                chunk = json_codec.dumps(item)
+                if ndjson:
+                    chunk += separator
+                elif not first:
+                    chunk = separator + chunk
+                first = False
+
+                chunks.append(chunk)
+                chunks_size += len(chunk)
+
+                if chunks_size >= flush_size:
+                    self.write(''.join(chunks))
+                    total_size += chunks_size
+                    chunks = []
+                    chunks_size = 0
+                    flushed = True
+                    yield self.flush()
+
+            if not ndjson:
+                chunks.append(']')
+                chunks_size += 1
+            self.write(''.join(chunks))
+            total_size += chunks_size
+
+        except iostream.StreamClosedError:
+            self.support.notify_info("[BaseHandler] client closed streamed response after %s bytes",
+                                     total_size)
+            return
+        except Exception as ex:  # pylint: disable=W0703
+            self.support.notify_error(ex)
+            if not flushed:
+                self.clear()
+                self.build_response(ex)
+            else:
+                # Status and part of the body are already sent, the truncated
+                # body tells the client the response is not complete. Closing
+                # first keeps finish() from ending the body, it still records
+                # the request as failed
+                self.support.stat_increment('net.responses.total_count')
+                self.support.stat_increment('net.responses.streamed_error_count')
+                self.request.connection.close()
+                self.set_status(500)
+                self.finish()
+            return
+
+        self.support.stat_increment('net.responses.total_count')
+        self.support.stat_increment('net.responses.streamed_count')
+        self.support.stat_increment('net.responses.total_bytes', total_size)
+
+        self.finish()
+
+    def _build_response_internal(self, apply_format, result, status_code=None,
+                                 version=None, last_modified=None):
         """
         Build the response data with the required format according to result
         """
 
+        if (not isinstance(result, Exception) and status_code in (None, 200) and
+                (version is not None or last_modified is not None) and
+                self.check_not_modified(version, last_modified)):
+            return
+
         if apply_format:
             self.set_header("Content-Type", "application/json")
 
@@ -201,7 +515,7 @@ class BaseHandler(web.RequestHandler):  # pylint: disable=too-many-public-method
             self.write(body)
         else:
             if apply_format:
-                body = json.dumps(result)
+                body = json_codec.dumps(result)
             else:
                 body = result
 
@@ -224,13 +538,60 @@ class BaseHandler(web.RequestHandler):  # pylint: disable=too-many-public-method
         self.support.stat_increment('net.responses.total_count')
         self.support.stat_increment('net.responses.total_bytes', sys.getsizeof(body))
 
+        if self.idempotency_key:
+            self._record_response(body)
+
+        self.finish()
+
+    # Headers set by tornado or per request that must not be replayed
+    NOT_REPLAYED_HEADERS = ('Server', 'Date', 'Content-Length',
+                            constants.REQUEST_ID_HTTP_HEADER)
+
+    def _record_response(self, body):
+        """
+        Keep the response of a request with Idempotency-Key to replay it
+        """
+        if isinstance(body, dict):
+            body = json_codec.dumps(body)
+
+        self.recorded_response = {
+            'status_code': self.get_status(),
+            'headers': dict((name, value) for name, value in self._headers.get_all()
+                            if name not in self.NOT_REPLAYED_HEADERS),
+            'body': body
+        }
+
+    def replay_response(self, response):
+        """
+        Send a response recorded for a previous request with the same
+        Idempotency-Key without running the handler again
+        """
+        self.set_status(response['status_code'])
+        for name, value in response['headers'].iteritems():
+            self.set_header(name, value)
+        self.set_header(constants.IDEMPOTENT_REPLAY_HTTP_HEADER, 'true')
+        if self.request_id:
+            self.set_header(constants.REQUEST_ID_HTTP_HEADER, self.request_id)
+        if response['body'] is not None and response['status_code'] not in (204, 304):
+            self.write(response['body'])
+
+        self.support.stat_increment('net.responses.idempotent_replay_count')
         self.finish()
 
     def _build_response_from_exception(self, ex):
         """
         Build HTTP response from an exception
         """
-        if isinstance(ex, exceptions.BadRequestBase):
+        if isinstance(ex, exceptions.PayloadTooLarge):
+            self.set_status(413)
+            response_body = str(ex)
+        elif isinstance(ex, exceptions.TooManyRequests):
+            self.set_status(429, 'Too Many Requests')
+            response_body = str(ex)
+        elif isinstance(ex, exceptions.IdempotencyKeyReused):
+            self.set_status(422, 'Unprocessable Entity')
+            response_body = str(ex)
+        elif isinstance(ex, exceptions.BadRequestBase):
             self.set_status(400)
             response_body = str(ex)
         elif isinstance(ex, exceptions.UnauthorizedBase):
@@ -261,6 +622,10 @@ class BaseHandler(web.RequestHandler):  # pylint: disable=too-many-public-method
             ex = exceptions.GeneralInfoException(formatted_lines[-1])
             response_body = str(ex)
 
+        retry_after = getattr(ex, 'retry_after', None)
+        if retry_after:
+            self.set_header('Retry-After', int(math.ceil(retry_after)))
+
         return response_body
 
     def options(self, *args, **kwargs):
@@ -293,9 +658,11 @@ class Context(object):  # pylint: disable=too-many-instance-attributes
     Context
     """
 
-    def __init__(self, request):
+    def __init__(self, request=None):
         """
-        Constructor
+        Constructor. Without a request the context belongs to the process,
+        e.g. for work shared by many requests: it has no request id and no
+        deadline.
         """
         self.account_id = None
         self.client_id = None
@@ -305,7 +672,13 @@ class Context(object):  # pylint: disable=too-many-instance-attributes
         self.products = None
         self.token = None
 
+        self.request_id = None
+        self.deadline = None
+        if request is None:
+            return
+
         self.request_id = request.headers.get(constants.REQUEST_ID_HTTP_HEADER)
+        self.deadline = Deadline.from_request(request)
 
         token = getattr(request, 'token', None)
         self.update_from_token(token)
@@ -1,19 +1,20 @@
 import functools
-from logging import getLogger
 import time
 
 from tornado import gen
-from tornado import ioloop
 
+from prjname.common import constants
 from prjname.common import exceptions
 from prjname.common import settings
-from prjname.common.policy import configuration
-from prjname.common.policy import enforcer
 from prjname.common.policy import exceptions as policy_exceptions
-from prjname.common.repositories.authorization.subscription_config import SubscriptionConfigRepository
 from prjname.common.tokens import exceptions as token_exceptions
-from prjname.common.tokens.jwt_token import JWTToken
+from prjname.common.tornado.handlers import idempotency
+from prjname.common.tornado.handlers import policy_cache
+from prjname.common.tornado.handlers import subscription_cache
+from prjname.common.tornado.handlers import token_cache
 from prjname.common.tornado.handlers.base import Context
+from prjname.common.utils import bootstrap
+from prjname.common.utils import retry as retry_policy
 
 
 # This decorator must be before @gen.coroutine
@@ -33,23 +34,21 @@ def oauth2_authorization(func=None):
 
                 try:
                     token_str = authorization_header[len('Bearer '):]
-                    self.request.token = JWTToken(
-                        token=token_str,
-                        certificate=self.application_settings.PRIVATE_CERTIFICATE)
+                    self.request.token = yield token_cache.DEFAULT_CACHE.get_token(
+                        token_str, self.application_settings.PRIVATE_CERTIFICATE,
+                        self.support)
                     self.context = Context(self.request)
+                    self.admit_client(self.context.client_id)
                     self.support.stat_set('active_families', self.context.account_id)
                     self.support.stat_set('active_devices', self.context.device_id)
-                    logger = getLogger(settings.ANALYTICS_LOGGER_NAME)
-                    extra = {
-                        'env': self.mfs_environment,
-                        'service': self.settings.get('service_name'),
-                        'handler': self.handler,
-                        'app': self.context.client_id,
-                        'account': self.context.account_id,
-                        'user': self.context.member_id,
-                        'device': self.context.device_id
-                    }
-                    logger.info(None, extra=extra)
+                    bootstrap.get_process_context().analytics.record(
+                        self.environment,
+                        self.settings.get('service_name'),
+                        self.handler,
+                        self.context.client_id,
+                        self.context.account_id,
+                        self.context.member_id,
+                        self.context.device_id)
                 except (TypeError, token_exceptions.InvalidToken):
                     raise exceptions.Unauthorized('Invalid token')
 
@@ -59,13 +58,8 @@ def oauth2_authorization(func=None):
 
                 if (self.application_settings.ENFORCE_POLICIES and
                         self.context.products):
-                    configuration_policy = (
-                        configuration.ConfigurationPolicy(
-                            self.support, self.context))
-                    policies_config = yield configuration_policy.get_policies(
-                        self.context.products)
-
-                    policy_enforcer = enforcer.Enforcer(policies_config)
+                    policy_enforcer = yield policy_cache.DEFAULT_CACHE.get_enforcer(
+                        self.context.products, self.support, self.context)
                     try:
                         yield policy_enforcer.enforce(self.request, self)
                     except policy_exceptions.PolicyEnforcementFailed as ex:
@@ -99,15 +93,14 @@ def api_key_authorization(func=None, api_key_name='client_id', render_response=F
                 if not api_key_str:
                     raise exceptions.Unauthorized('Missing api_key')
 
-                subscription_config_repo = SubscriptionConfigRepository(
-                    self.support,
-                    self.settings.get('cassandra_adapter')
-                )
-
-                result = yield subscription_config_repo.get_subscription_from_client_id(api_key_str)
+                result = yield subscription_cache.DEFAULT_CACHE.get_subscription(
+                    api_key_str, self.support, self.settings.get('cassandra_adapter'))
                 if not result:
                     raise exceptions.Unauthorized('Invalid client_id query parameter.')
 
+                # Only known clients get a rate limit bucket
+                self.admit_client(api_key_str)
+
                 self.context = Context(self.request)
                 yield func(self, *args, **kwargs)
             except exceptions.InfoException as ex:
@@ -132,14 +125,83 @@ def api_key_authorization(func=None, api_key_name='client_id', render_response=F
         return the_decorator
 
 
-def retry(exception_to_check, tries=3, delay=3, backoff=2, support=None):  # pylint: disable=unused-argument
+# This decorator must be before @gen.coroutine and after the authorization ones
+def idempotent(func=None, store=None, cached_status_codes=()):
+    """
+    Run the handler only once per Idempotency-Key header value.
+    Concurrent requests with the same key wait for the one in flight and
+    retries get the stored response replayed.
+    Only 2xx responses are stored, a key reused with a different request body
+    is answered with a 422.
+    @param store: where responses are stored, in memory by default. Use a
+        idempotency.KeyValueIdempotencyStore to share them between processes.
+    @param cached_status_codes: 4xx status codes that are deterministic for
+        this resource and are also stored, e.g. (400, 404)
+    """
+    def the_decorator(func):
+        @gen.coroutine
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            key = self.request.headers.get(constants.IDEMPOTENCY_KEY_HTTP_HEADER)
+            if not key:
+                yield func(self, *args, **kwargs)
+                return
+
+            response_store = store or idempotency.DEFAULT_STORE
+            request_fingerprint = idempotency.fingerprint(self.request)
+            key = idempotency.scoped_key(self, key)
+            yield idempotency.acquire(key)
+            try:
+                stored_response = yield response_store.get(key)
+                if stored_response:
+                    if not idempotency.matches(stored_response, request_fingerprint):
+                        raise exceptions.IdempotencyKeyReused(
+                            self.request.headers.get(constants.IDEMPOTENCY_KEY_HTTP_HEADER))
+                    self.replay_response(stored_response)
+                    return
+
+                self.idempotency_key = key
+                yield func(self, *args, **kwargs)
+
+                if idempotency.is_cacheable(self.recorded_response, cached_status_codes):
+                    response = dict(self.recorded_response, fingerprint=request_fingerprint)
+                    yield response_store.set(key, response)
+            except Exception as ex:  # pylint: disable=W0703
+                self.support.notify_error(ex)
+                if not self._finished:  # pylint: disable=protected-access
+                    self.build_response(ex)
+            finally:
+                idempotency.release(key)
+
+        return wrapper
+
+    if func:
+        return the_decorator(func)
+    else:
+        return the_decorator
+
+
+# pylint: disable=too-many-arguments
+def retry(exception_to_check, tries=3, delay=3, backoff=2, support=None,
+          jitter=retry_policy.FULL_JITTER, max_delay=None, max_elapsed=None, budget=None):
     """
-    Retry calling the decorated function using an exponential backoff
+    Retry calling the decorated function using an exponential backoff with jitter
 
     @param exception_to_check: may be one exception or a tuple of them
     @param tries: number of times to try
     @param delay: initial delay between retries in seconds
     @param backoff: backoff multiplier. E.g. value of 2 will double the delay after each retry
+    @param support: Support to report retry stats to, by default the support
+        (or _support) of the decorated method's object
+    @param jitter: 'full' (default), 'decorrelated' or 'none', see retry.backoff_delays
+    @param max_delay: maximum seconds to wait before a retry
+    @param max_elapsed: maximum seconds since the first try to start a retry
+    @param budget: name of the target whose retry budget (see retry.RetryBudget)
+        is shared by every function retrying calls to it, no budget when None
+
+    Retries stop when the deadline of the decorated method's object (e.g. an
+    adapter built from a request Context) would pass while waiting or was
+    cancelled because the client went away.
     """
 
     def decorator_retry(function):
@@ -148,28 +210,62 @@ def retry(exception_to_check, tries=3, delay=3, backoff=2, support=None):  # pyl
         @param function function to decorate
         """
 
+        stat_prefix = 'retry.%s' % (budget or function.__name__)
+
         @gen.coroutine
         @functools.wraps(function)
         def function_retry(*args, **kwargs):
             """
-            Retry algorithm using an exponential backoff
+            Retry algorithm using an exponential backoff with jitter
             """
 
-            number_of_tries = tries
-            delay_seconds = delay
+            owner = args[0] if args else None
+            deadline = getattr(owner, 'deadline', None)
+            stats_support = (support or getattr(owner, 'support', None) or
+                             getattr(owner, '_support', None))
+            retry_budget = retry_policy.get_budget(budget) if budget else None
+            delays = retry_policy.backoff_delays(delay, backoff, max_delay, jitter)
+            start_time = time.time()
+
+            def report(stat, value=1):
+                if stats_support:
+                    stats_support.stat_increment('%s.%s' % (stat_prefix, stat), value)
 
-            while number_of_tries > 1:
+            # Only the call itself deposits in the budget, not its retries
+            if retry_budget:
+                retry_budget.record_call()
+
+            for number_of_try in range(1, tries + 1):
                 try:
                     response = yield function(*args, **kwargs)
                     raise gen.Return(response)
-                except exception_to_check:
-                    yield gen.Task(ioloop.IOLoop.current().add_timeout,
-                                   time.time() + delay_seconds)
-                    number_of_tries -= 1
-                    delay_seconds *= backoff
-
-            response = yield function(*args, **kwargs)
-            raise gen.Return(response)
+                except gen.Return:
+                    raise
+                except exception_to_check as ex:
+                    report('failure_count')
+                    if number_of_try == tries:
+                        report('exhausted_count')
+                        raise
+
+                    wait = next(delays)
+                    if max_elapsed is not None and time.time() - start_time + wait > max_elapsed:
+                        report('max_elapsed_count')
+                        raise
+                    if deadline and deadline.remaining() <= wait:
+                        report('deadline_count')
+                        raise
+                    if retry_budget and not retry_budget.try_retry():
+                        report('budget_exhausted_count')
+                        raise
+
+                    if stats_support:
+                        stats_support.notify_debug('[retry] %s failed (%s), retry %d in %.3f s',
+                                                   function.__name__, ex, number_of_try, wait)
+                    report('retry_count')
+                    yield gen.sleep(wait)
+
+                    if deadline:
+                        deadline.check('retry of %s' % function.__name__)
 
         return function_retry   # Decorator
 
@@ -20,6 +20,9 @@ class HealthHandler(base.BaseHandler):
 
     LOG_TAG = '[Health Handler] %s'
 
+    # Health checks must answer even when the service is shedding load
+    admission_control = False
+
     # RequestHandler interface
 
     @gen.coroutine
@@ -0,0 +1,114 @@
+"""
+Idempotency-Key support: the first completed response of a request is
+stored and replayed to the retries of the same request
+"""
+import hashlib
+
+from tornado import concurrent
+from tornado import gen
+
+from prjname.common import exceptions
+from prjname.common import settings
+from prjname.common.utils import caches
+
+# Responses being produced right now in this process, by scoped key
+_IN_FLIGHT = {}
+
+
+class MemoryIdempotencyStore(object):
+    """
+    Stores responses in a bounded in process cache
+    """
+
+    def __init__(self, maxsize=None, ttl=None):
+        self._cache = caches.TTLCache(
+            maxsize if maxsize is not None else int(settings.IDEMPOTENCY_CACHE_SIZE),
+            ttl if ttl is not None else int(settings.IDEMPOTENCY_TTL))
+
+    @gen.coroutine
+    def get(self, key):
+        raise gen.Return(self._cache.get(key))
+
+    @gen.coroutine
+    def set(self, key, response):
+        self._cache.set(key, response)
+
+
+class KeyValueIdempotencyStore(object):
+    """
+    Stores responses in a KeyValueAdapter bucket, so they are shared by
+    every process using the same bucket
+    """
+
+    def __init__(self, keyvalue_adapter, ttl=None):
+        self._adapter = keyvalue_adapter
+        self._ttl = ttl if ttl is not None else int(settings.IDEMPOTENCY_TTL)
+
+    @gen.coroutine
+    def get(self, key):
+        try:
+            response = yield self._adapter.get_value(key)
+        except exceptions.DatabaseOperationError:
+            response = None
+        raise gen.Return(response)
+
+    @gen.coroutine
+    def set(self, key, response):
+        yield self._adapter.set_value(key, response, self._ttl)
+
+
+def scoped_key(handler, key):
+    """
+    Idempotency keys are only unique per client and resource
+    """
+    client_id = handler.context.client_id if handler.context else None
+    return '%s:%s:%s:%s' % (client_id or '', handler.request.method,
+                            handler.request.path, key)
+
+
+@gen.coroutine
+def acquire(key):
+    """
+    Wait until no other request with the same key is in flight in this
+    process and take ownership of the key until release() is called
+    """
+    while key in _IN_FLIGHT:
+        yield _IN_FLIGHT[key]
+    _IN_FLIGHT[key] = concurrent.Future()
+
+
+def release(key):
+    future = _IN_FLIGHT.pop(key, None)
+    if future is not None:
+        future.set_result(None)
+
+
+def fingerprint(request):
+    """
+    Identifies the request body sent with a key, so a key reused for a
+    different request is not answered with the stored response
+    """
+    return hashlib.sha1(request.body or b'').hexdigest()
+
+
+def matches(stored_response, request_fingerprint):
+    """
+    Responses stored without fingerprint match any request
+    """
+    stored_fingerprint = stored_response.get('fingerprint')
+    return stored_fingerprint is None or stored_fingerprint == request_fingerprint
+
+
+def is_cacheable(response, status_codes=()):
+    """
+    Only successful responses are stored, plus the client errors listed in
+    status_codes which must be deterministic for the request. Anything else
+    (server errors, 429, 409...) may succeed when retried
+    """
+    if response is None:
+        return False
+    status_code = response['status_code']
+    return 200 <= status_code < 300 or status_code in status_codes
+
+
+DEFAULT_STORE = MemoryIdempotencyStore()
@@ -0,0 +1,151 @@
+"""
+Cache of policy enforcers by product set, refreshed in the background
+(stale-while-revalidate) so requests do not wait on policy fetches
+"""
+import datetime
+import time
+
+from tornado import concurrent
+from tornado import gen
+from tornado import ioloop
+
+from prjname.common import exceptions
+from prjname.common import settings
+from prjname.common.policy import configuration
+from prjname.common.policy import enforcer
+from prjname.common.tornado.handlers.base import Context
+from prjname.common.utils import bootstrap
+from prjname.common.utils import caches
+from prjname.common.utils.support import Support
+
+
+class PolicyCache(object):
+    """
+    Enforcers built from the policies configuration of a product set.
+    Entries younger than ttl seconds are used as they are, older ones are
+    still used while a background refresh fetches the configuration again,
+    up to ttl + stale_ttl seconds when they are dropped.
+    Concurrent requests missing the same product set share a single fetch.
+    Fetches are not bound to any of the requests waiting for them, each
+    request only waits until its own deadline.
+    It must be used from the IOLoop thread.
+    """
+
+    def __init__(self, ttl=None, stale_ttl=None, maxsize=None):
+        self._ttl = ttl if ttl is not None else int(settings.POLICY_CACHE_TTL)
+        stale_ttl = stale_ttl if stale_ttl is not None else int(settings.POLICY_CACHE_STALE_TTL)
+        self._cache = caches.TTLCache(
+            maxsize if maxsize is not None else int(settings.POLICY_CACHE_SIZE),
+            self._ttl + stale_ttl)
+        self._fetching = {}
+        self._support = None
+
+    @property
+    def support(self):
+        """
+        Support of the fetches, shared by the requests
+        """
+        if self._support is None:
+            process_context = bootstrap.get_process_context()
+            self._support = Support(process_context.logger,
+                                    {'environment': process_context.environment,
+                                     'handler': 'PolicyCache'},
+                                    process_context.stats_client)
+        return self._support
+
+    @staticmethod
+    def _key(products):
+        return tuple(sorted(set(products)))
+
+    @gen.coroutine
+    def get_enforcer(self, products, support, context):
+        """
+        Return the enforcer of the policies of products
+        """
+        key = self._key(products)
+        entry = self._cache.get(key)
+
+        if entry is None:
+            support.stat_increment('policies.cache_miss_count')
+            policy_enforcer = yield self._wait(self._fetch(key), context)
+            raise gen.Return(policy_enforcer)
+
+        fetched_at, policy_enforcer = entry
+        if time.time() - fetched_at >= self._ttl:
+            support.stat_increment('policies.cache_stale_count')
+            if key not in self._fetching:
+                ioloop.IOLoop.current().spawn_callback(self._refresh, key)
+        else:
+            support.stat_increment('policies.cache_hit_count')
+
+        raise gen.Return(policy_enforcer)
+
+    @staticmethod
+    @gen.coroutine
+    def _wait(future, context):
+        """
+        Wait for a shared fetch until the deadline of context, the fetch
+        goes on for the other requests
+        """
+        deadline = getattr(context, 'deadline', None)
+        if deadline is None or (not deadline.bounded and not deadline.cancelled):
+            result = yield future
+            raise gen.Return(result)
+
+        try:
+            result = yield gen.with_timeout(
+                datetime.timedelta(seconds=deadline.remaining()), future)
+        except gen.TimeoutError:
+            raise exceptions.DeadlineExceeded('[PolicyCache] policies fetch')
+        raise gen.Return(result)
+
+    def _fetch(self, key):
+        """
+        Fetch the policies of key, or return the fetch in progress
+        """
+        future = self._fetching.get(key)
+        if future is None:
+            future = self._fetching[key] = concurrent.Future()
+            concurrent.chain_future(self._build_enforcer(key), future)
+            future.add_done_callback(lambda _: self._fetching.pop(key, None))
+        return future
+
+    @gen.coroutine
+    def _build_enforcer(self, key):
+        start_time = time.time()
+        configuration_policy = configuration.ConfigurationPolicy(self.support, Context())
+        policies_config = yield configuration_policy.get_policies(list(key))
+        policy_enforcer = enforcer.Enforcer(policies_config)
+        self._cache.set(key, (time.time(), policy_enforcer))
+        self.support.stat_timing('policies.fetch.time', (time.time() - start_time) * 1000.0)
+        raise gen.Return(policy_enforcer)
+
+    @gen.coroutine
+    def _refresh(self, key):
+        try:
+            yield self._fetch(key)
+        except Exception as ex:  # pylint: disable=W0703
+            # The stale enforcer is used until it expires or a refresh works
+            self.support.stat_increment('policies.refresh_error_count')
+            self.support.notify_warning('[PolicyCache] could not refresh policies of %s: %s',
+                                        key, ex)
+
+    def invalidate(self, products=None):
+        """
+        Drop the enforcer of products, or all of them, so the next request
+        fetches the policies again
+        """
+        if products is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(self._key(products))
+
+
+DEFAULT_CACHE = PolicyCache()
+
+
+def invalidate(products=None):
+    """
+    Hook to call when policies change
+    """
+    DEFAULT_CACHE.invalidate(products)
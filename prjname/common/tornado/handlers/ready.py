@@ -0,0 +1,36 @@
+"""
+Tornado handler for ready resource
+"""
+import json
+
+from prjname.common.tornado.handlers import base
+from prjname.common.warmup import warmup_runner
+
+
+# pylint: disable=too-many-public-methods
+class ReadyHandler(base.BaseHandler):
+    """
+    Tornado handler for ready resource. Answers 200 once the service warmed
+    up and 503 before, unlike /health it says whether the service should
+    get traffic, not whether it works.
+    """
+
+    LOG_TAG = '[Ready Handler] %s'
+
+    # Readiness checks must answer even when the service is shedding load
+    admission_control = False
+
+    # RequestHandler interface
+
+    def get(self):
+        """
+        /ready GET handler
+        """
+        ready, state, result = warmup_runner.DEFAULT_RUNNER.get_status()
+
+        self.set_header("Content-Type", "application/json")
+        self.set_status(200 if ready else 503)
+        self.write(json.dumps({"status": {"ready": ready,
+                                          "state": state,
+                                          "info": result}}))
+        self.finish()
@@ -0,0 +1,193 @@
+"""
+StreamingHandler: BaseHandler receiving the request body as it arrives
+"""
+import base64
+import hashlib
+import tempfile
+
+from tornado import web
+
+from prjname.common import exceptions
+from prjname.common import settings
+from prjname.common.tornado.handlers.base import BaseHandler
+from prjname.common.utils import json_codec
+
+# Digest header (RFC 3230) algorithm names to hashlib names
+DIGEST_ALGORITHMS = {
+    'md5': 'md5',
+    'sha': 'sha1',
+    'sha-256': 'sha256',
+    'sha-512': 'sha512',
+}
+
+
+class RequestBody(object):
+    """
+    Request body received in chunks: kept in memory up to spool_threshold
+    bytes and in a temporary file past it, hashed and size checked as the
+    chunks arrive
+    """
+
+    def __init__(self, max_size, spool_threshold, hash_algorithms=('sha256',)):
+        self.max_size = max_size
+        self.size = 0
+        self.file = tempfile.SpooledTemporaryFile(max_size=spool_threshold)
+        self._hashes = dict((algorithm, hashlib.new(algorithm))
+                            for algorithm in hash_algorithms)
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.max_size and self.size > self.max_size:
+            raise exceptions.PayloadTooLarge('body is bigger than %s bytes' % self.max_size)
+
+        for body_hash in self._hashes.itervalues():
+            body_hash.update(chunk)
+        self.file.write(chunk)
+
+    @property
+    def spooled(self):
+        return self.file._rolled  # pylint: disable=protected-access
+
+    def digest(self, algorithm='sha256'):
+        return self._hashes[algorithm].digest()
+
+    def hexdigest(self, algorithm='sha256'):
+        return self._hashes[algorithm].hexdigest()
+
+    def close(self):
+        self.file.close()
+
+
+@web.stream_request_body
+class StreamingHandler(BaseHandler):  # pylint: disable=too-many-public-methods
+    """
+    Handler for large request bodies. Instead of buffering the whole upload
+    in memory the body is written to a RequestBody (spooled to disk past
+    spool_threshold bytes) and handlers read it from body_file.
+    The body size limit can be set per route with the max_body_size
+    argument, bodies sent with Content-MD5 or Digest headers are verified.
+    """
+
+    body_hash_algorithm = 'sha256'
+    # The body arrives after prepare
+    lazy_body_parsing = True
+
+    def __init__(self, application, request, **kwargs):
+        """
+        Constructor
+        """
+        self.body = None
+        self.max_body_size = None
+        self.spool_threshold = None
+        self._body_verified = False
+        super(StreamingHandler, self).__init__(application, request, **kwargs)
+
+    # pylint: disable=arguments-differ
+    def initialize(self, application_settings, handler=None, max_body_size=None,
+                   spool_threshold=None):
+        super(StreamingHandler, self).initialize(application_settings, handler)
+        self.max_body_size = int(max_body_size or settings.STREAMING_MAX_BODY_SIZE)
+        self.spool_threshold = int(spool_threshold or settings.STREAMING_SPOOL_THRESHOLD)
+
+    def prepare(self):
+        try:
+            content_length = self.request.headers.get('Content-Length')
+            if content_length and int(content_length) > self.max_body_size:
+                raise exceptions.PayloadTooLarge('body is bigger than %s bytes' %
+                                                 self.max_body_size)
+        except (exceptions.InfoException, ValueError) as ex:
+            self.support.notify_error(ex)
+            self.build_response(ex)
+            return
+
+        self.request.connection.set_max_body_size(self.max_body_size)
+        self.body = RequestBody(self.max_body_size, self.spool_threshold,
+                                set([self.body_hash_algorithm] +
+                                    [algorithm for algorithm, _ in self._expected_digests()]))
+
+        super(StreamingHandler, self).prepare()
+
+    def data_received(self, chunk):
+        if self._finished:
+            return
+
+        try:
+            self.body.write(chunk)
+        except exceptions.InfoException as ex:
+            self.support.notify_error(ex)
+            self._close_body()
+            self.build_response(ex)
+            # Depending on the tornado version the handler method still runs
+            # once the rest of the body is read, there is nothing left for it
+            setattr(self, self.request.method.lower(), self._body_rejected)
+
+    def _body_rejected(self, *args, **kwargs):
+        pass
+
+    def _close_body(self):
+        if self.body is not None:
+            self.report_request_bytes(self.body.size)
+            self.body.close()
+            self.body = None
+
+    @property
+    def body_file(self):
+        """
+        File object with the whole request body, positioned at the start.
+        Raises InvalidArgument when the body does not match the digest sent
+        by the client.
+        """
+        if self.body is None:
+            return None
+
+        if not self._body_verified:
+            self._verify_body()
+            self._body_verified = True
+            self.support.notify_debug("[StreamingHandler] body: %s bytes, spooled: %s",
+                                      self.body.size, self.body.spooled)
+
+        self.body.file.seek(0)
+        return self.body.file
+
+    def parse_body(self):
+        method = self.request.method
+
+        if method == 'POST' or method == 'PUT':
+            content_type = self.request.headers.get('Content-Type')
+
+            if content_type.startswith('application/json'):
+                try:
+                    return json_codec.loads(self.body_file.read(),
+                                            ordered=self.preserve_body_key_order)
+                except (TypeError, ValueError) as ex:
+                    raise exceptions.InvalidArgument('invalid body: %s' % ex)
+            return self.body_file
+        return None
+
+    def _expected_digests(self):
+        digests = []
+
+        content_md5 = self.request.headers.get('Content-MD5')
+        if content_md5:
+            digests.append(('md5', content_md5.strip()))
+
+        for item in self.request.headers.get('Digest', '').split(','):
+            name, _, value = item.strip().partition('=')
+            algorithm = DIGEST_ALGORITHMS.get(name.strip().lower())
+            if algorithm and value:
+                digests.append((algorithm, value.strip()))
+
+        return digests
+
+    def _verify_body(self):
+        for algorithm, expected in self._expected_digests():
+            if base64.b64encode(self.body.digest(algorithm)) != expected:
+                raise exceptions.InvalidArgument('body does not match its %s digest' % algorithm)
+
+    def on_finish(self):
+        self._close_body()
+        super(StreamingHandler, self).on_finish()
+
+    def on_connection_close(self):
+        self._close_body()
+        super(StreamingHandler, self).on_connection_close()
@@ -0,0 +1,110 @@
+"""
+Cache of subscriptions by API key (client_id), including the keys that do
+not exist so invalid keys do not reach the database at the request rate
+"""
+import time
+
+from tornado import concurrent
+from tornado import gen
+
+from prjname.common import settings
+from prjname.common.repositories.authorization.subscription_config import SubscriptionConfigRepository
+from prjname.common.utils import caches
+
+# Cached value of keys without subscription
+_NOT_FOUND = object()
+
+
+class SubscriptionCache(object):
+    """
+    Subscriptions by client_id: found ones are kept for ttl seconds and
+    missing ones for negative_ttl seconds. Keys failing max_failures times
+    within failure_window seconds are rejected for failure_window seconds
+    without looking them up. Concurrent misses of the same key share a
+    single lookup.
+    It must be used from the IOLoop thread.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, maxsize=None, ttl=None, negative_ttl=None, max_failures=None,
+                 failure_window=None):
+        maxsize = maxsize if maxsize is not None else int(settings.API_KEY_CACHE_SIZE)
+        self._ttl = ttl if ttl is not None else int(settings.API_KEY_CACHE_TTL)
+        self._negative_ttl = (negative_ttl if negative_ttl is not None
+                              else int(settings.API_KEY_NEGATIVE_TTL))
+        self._max_failures = (max_failures if max_failures is not None
+                              else int(settings.API_KEY_MAX_FAILURES))
+        self._failure_window = (failure_window if failure_window is not None
+                                else int(settings.API_KEY_FAILURE_WINDOW))
+
+        self._cache = caches.TTLCache(maxsize, self._ttl)
+        self._failures = caches.TTLCache(maxsize, self._failure_window)
+        self._looking_up = {}
+
+    @gen.coroutine
+    def get_subscription(self, client_id, support, cassandra_adapter):
+        """
+        Return the subscription of client_id or None when there is none
+        """
+        subscription = self._cache.get(client_id)
+        if subscription is not None:
+            support.stat_increment('auth.api_key.cache_hit_count')
+        else:
+            support.stat_increment('auth.api_key.cache_miss_count')
+            subscription = yield self._lookup(client_id, support, cassandra_adapter)
+
+        if subscription is _NOT_FOUND:
+            raise gen.Return(None)
+        raise gen.Return(subscription)
+
+    def _lookup(self, client_id, support, cassandra_adapter):
+        future = self._looking_up.get(client_id)
+        if future is None:
+            future = self._looking_up[client_id] = concurrent.Future()
+            concurrent.chain_future(
+                self._lookup_internal(client_id, support, cassandra_adapter), future)
+            future.add_done_callback(lambda _: self._looking_up.pop(client_id, None))
+        return future
+
+    @gen.coroutine
+    def _lookup_internal(self, client_id, support, cassandra_adapter):
+        start_time = time.time()
+        repository = SubscriptionConfigRepository(support, cassandra_adapter)
+        subscription = yield repository.get_subscription_from_client_id(client_id)
+        support.stat_timing('auth.api_key.lookup.time', (time.time() - start_time) * 1000.0)
+
+        if subscription:
+            self._failures.pop(client_id)
+            self._cache.set(client_id, subscription)
+            raise gen.Return(subscription)
+
+        failures = self._failures.get(client_id, 0) + 1
+        if failures >= self._max_failures:
+            support.stat_increment('auth.api_key.blocked_count')
+            self._cache.set(client_id, _NOT_FOUND, self._failure_window)
+        else:
+            self._cache.set(client_id, _NOT_FOUND, self._negative_ttl)
+        self._failures.set(client_id, failures)
+        raise gen.Return(_NOT_FOUND)
+
+    def invalidate(self, client_id=None):
+        """
+        Drop the cached subscription of client_id, or all of them, e.g. when
+        a subscription is created or revoked
+        """
+        if client_id is None:
+            self._cache.clear()
+            self._failures.clear()
+        else:
+            self._cache.pop(client_id)
+            self._failures.pop(client_id)
+
+
+DEFAULT_CACHE = SubscriptionCache()
+
+
+def invalidate(client_id=None):
+    """
+    Hook to call when subscriptions change
+    """
+    DEFAULT_CACHE.invalidate(client_id)
@@ -0,0 +1,80 @@
+"""
+Cache of verified JWT tokens so the signature of a token is only checked
+the first time it is seen
+"""
+import hashlib
+import time
+
+from tornado import gen
+
+from prjname.common import settings
+from prjname.common.tokens.jwt_token import JWTToken
+from prjname.common.utils import caches
+from prjname.common.utils import executors
+
+
+class VerifiedTokenCache(object):
+    """
+    Bounded LRU cache of verified tokens by token digest. Entries expire with
+    the token (exp claim) or after max_ttl seconds, whichever comes first.
+    Signatures of tokens not in the cache are verified in the 'tokens' thread
+    pool when offload is enabled so the IOLoop keeps serving requests.
+    Cached tokens are shared by requests, their payload must not be modified.
+    """
+
+    def __init__(self, maxsize=None, max_ttl=None, offload=None):
+        self._cache = caches.TTLCache(
+            maxsize if maxsize is not None else int(settings.JWT_CACHE_SIZE))
+        self._max_ttl = max_ttl if max_ttl is not None else int(settings.JWT_CACHE_MAX_TTL)
+        self._offload = offload if offload is not None else settings.JWT_VERIFY_OFFLOAD
+
+    @staticmethod
+    def _key(token_str):
+        if isinstance(token_str, unicode):
+            token_str = token_str.encode('utf-8')
+        return hashlib.sha256(token_str).digest()
+
+    def _ttl(self, token):
+        expiration = token.payload.get('exp')
+        if expiration is None:
+            return self._max_ttl
+        try:
+            return min(self._max_ttl, float(expiration) - time.time())
+        except (TypeError, ValueError):
+            return 0
+
+    @gen.coroutine
+    def get_token(self, token_str, certificate, support=None):
+        """
+        Return the JWTToken for token_str, verified with certificate.
+        Raises the JWTToken exceptions for invalid tokens, which are not cached.
+        """
+        key = self._key(token_str)
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] == certificate:
+            if support:
+                support.stat_increment('auth.jwt.cache_hit_count')
+            raise gen.Return(entry[1])
+
+        start_time = time.time()
+        if self._offload:
+            token = yield executors.get_executor('tokens').submit(
+                JWTToken, token=token_str, certificate=certificate)
+        else:
+            token = JWTToken(token=token_str, certificate=certificate)
+
+        if support:
+            support.stat_increment('auth.jwt.cache_miss_count')
+            support.stat_timing('auth.jwt.verify.time', (time.time() - start_time) * 1000.0)
+
+        ttl = self._ttl(token)
+        if ttl > 0:
+            self._cache.set(key, (certificate, token), ttl)
+
+        raise gen.Return(token)
+
+    def clear(self):
+        self._cache.clear()
+
+
+DEFAULT_CACHE = VerifiedTokenCache()
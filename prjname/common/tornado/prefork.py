@@ -0,0 +1,145 @@
+"""
+Pre-fork worker processes: the parent process forks the workers, restarts
+the ones that crash and forwards SIGTERM/SIGINT to them
+"""
+import argparse
+import errno
+import multiprocessing
+import os
+import random
+import signal
+import sys
+
+from tornado import ioloop
+
+from prjname.common import exceptions
+from prjname.common import settings
+from prjname.common.utils import bootstrap
+
+AUTO = 'auto'
+
+_WORKER_ID = None
+
+
+def get_worker_id():
+    """
+    Id (0 to workers - 1) of this worker process, None when not forked
+    """
+    return _WORKER_ID
+
+
+def parse_workers(value):
+    """
+    argparse type of the --workers option: a number of processes or 'auto'
+    for one per CPU
+    """
+    if value == AUTO:
+        try:
+            return multiprocessing.cpu_count()
+        except NotImplementedError:
+            return 1
+    try:
+        workers = int(value)
+    except ValueError:
+        workers = 0
+    if workers < 1:
+        raise argparse.ArgumentTypeError(
+            "workers must be a positive number or '{0}'".format(AUTO))
+    return workers
+
+
+def fork_workers(num_workers, max_restarts=100):
+    """
+    Fork num_workers processes and return the worker id in each of them.
+    The parent process does not return: it restarts crashed workers (up to
+    max_restarts times in total) and exits once all of them exited.
+    Sockets, threads, the IOLoop and clients (Cassandra sessions, HTTP
+    clients) must be created after this call so every worker has its own.
+    """
+    global _WORKER_ID  # pylint: disable=global-statement
+
+    if ioloop.IOLoop.initialized():
+        raise exceptions.GeneralInfoException(
+            'IOLoop already initialized, workers cannot be forked '
+            '(AUTO_RELOAD must be off)')
+
+    worker_signals = dict((signum, signal.getsignal(signum))
+                          for signum in (signal.SIGTERM, signal.SIGINT))
+    children = {}
+    stopping = []
+
+    def start_worker(worker_id):
+        pid = os.fork()
+        if pid == 0:
+            for signum, handler in worker_signals.items():
+                signal.signal(signum, handler)
+            # Do not share the random sequence of the parent
+            random.seed()
+            return worker_id
+        children[pid] = worker_id
+        return None
+
+    def stop_workers(signum, frame):  # pylint: disable=unused-argument
+        stopping.append(signum)
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+    # Output buffered by the parent would be written again by every worker
+    sys.stdout.flush()
+    sys.stderr.flush()
+    for worker_id in range(num_workers):
+        if start_worker(worker_id) is not None:
+            _WORKER_ID = worker_id
+            return worker_id
+
+    for signum in worker_signals:
+        signal.signal(signum, stop_workers)
+
+    restarts = 0
+    while children:
+        try:
+            pid, status = os.wait()
+        except OSError as ex:
+            if ex.errno == errno.EINTR:
+                continue
+            raise
+        if pid not in children:
+            continue
+
+        worker_id = children.pop(pid)
+        if stopping:
+            continue
+        if os.WIFSIGNALED(status):
+            print "Worker {0} (pid {1}) killed by signal {2}, restarting...".format(
+                worker_id, pid, os.WTERMSIG(status))
+        elif os.WEXITSTATUS(status) != 0:
+            print "Worker {0} (pid {1}) exited with status {2}, restarting...".format(
+                worker_id, pid, os.WEXITSTATUS(status))
+        else:
+            continue
+
+        restarts += 1
+        if restarts > max_restarts:
+            stop_workers(signal.SIGTERM, None)
+            raise exceptions.GeneralInfoException(
+                'Too many worker restarts, giving up')
+        if start_worker(worker_id) is not None:
+            _WORKER_ID = worker_id
+            return worker_id
+
+    sys.exit(0)
+
+
+def start(num_workers):
+    """
+    Fork num_workers workers sharing the resources created by
+    bootstrap.before_fork. Return the worker id, None when there is a
+    single process and nothing was forked.
+    """
+    if num_workers <= 1:
+        return None
+    bootstrap.before_fork()
+    return fork_workers(num_workers, int(settings.WORKER_MAX_RESTARTS))
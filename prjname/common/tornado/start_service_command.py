@@ -5,6 +5,11 @@ import six
 from tornado import httpserver
 from tornado import ioloop
 
+from prjname.common import settings
+from prjname.common.tornado import prefork
+from prjname.common.utils import bootstrap
+from prjname.common.warmup import warmup_runner
+
 
 @six.add_metaclass(abc.ABCMeta)  # pylint: disable=R0903
 class StartServiceCommand(cliff.command.Command):  # pylint: disable=too-few-public-methods
@@ -25,12 +30,25 @@ class StartServiceCommand(cliff.command.Command):  # pylint: disable=too-few-pub
         parser.add_argument("--port",
                             help="The port that the server will use",
                             type=int, default=self.DEFAULT_PORT)
+        parser.add_argument("--workers",
+                            help="Worker processes to fork, 'auto' for one "
+                                 "per CPU",
+                            type=prefork.parse_workers,
+                            default=str(settings.WORKERS))
         return parser
 
     def take_action(self, parsed_args):
-        print "Listening at port {0}...".format(parsed_args.port)
+        print "Listening at port {0} with {1} worker(s)...".format(
+            parsed_args.port, parsed_args.workers)
 
+        # Everything below is created in each worker after the fork
+        worker_id = prefork.start(parsed_args.workers)
+        bootstrap.bootstrap(worker_id=worker_id)
         server = httpserver.HTTPServer(self.service_application, xheaders=True)
-        server.bind(parsed_args.port)
+        # Workers bind their own socket to the port, the kernel balances
+        # the connections between them
+        server.bind(parsed_args.port, reuse_port=worker_id is not None)
         server.start()
+        # /ready answers 503 until the warm-up hooks are done
+        warmup_runner.start()
         ioloop.IOLoop.current().start()
@@ -0,0 +1,272 @@
+"""
+Analytics events pipeline: events are appended to an in memory columnar
+buffer and written in batches by a background thread to rotating gzipped
+NDJSON files.
+Every line of a file is a batch:
+    {"fields": [...], "values": {field: [distinct values]},
+     "columns": {field: [index in values for each event]}, "time": [ms, ...]}
+so values repeated across the events of a batch (environment, service,
+application...) are written once. See analytics_reader to read them back.
+"""
+import atexit
+import gzip
+import json
+import os
+import threading
+import time
+
+from tornado import ioloop
+
+FIELDS = ('env', 'service', 'handler', 'app', 'account', 'user', 'device')
+
+FILE_SUFFIX = '.ndjson.gz'
+PARTIAL_SUFFIX = '.part'
+
+
+class ColumnarBuffer(object):
+    """
+    Events stored by column, each column holding indexes into the distinct
+    values seen for its field
+    """
+
+    def __init__(self, fields=FIELDS):
+        self.fields = fields
+        self.times = []
+        self._columns = [[] for _ in fields]
+        self._indexes = [{} for _ in fields]
+        self._values = [[] for _ in fields]
+
+    def __len__(self):
+        return len(self.times)
+
+    def append(self, event_time, values):
+        self.times.append(int(event_time * 1000))
+        for column, indexes, distinct_values, value in zip(
+                self._columns, self._indexes, self._values, values):
+            index = indexes.get(value)
+            if index is None:
+                index = indexes[value] = len(distinct_values)
+                distinct_values.append(value)
+            column.append(index)
+
+    def to_batch(self):
+        return {
+            'fields': list(self.fields),
+            'values': dict(zip(self.fields, self._values)),
+            'columns': dict(zip(self.fields, self._columns)),
+            'time': self.times,
+        }
+
+
+def batch_events(batch):
+    """
+    Events (dicts with a 'time' key in seconds) of a batch line
+    """
+    fields = batch['fields']
+    values = [batch['values'][field] for field in fields]
+    columns = [batch['columns'][field] for field in fields]
+    for position, event_time in enumerate(batch['time']):
+        event = dict((field, field_values[column[position]])
+                     for field, field_values, column in zip(fields, values, columns))
+        event['time'] = event_time / 1000.0
+        yield event
+
+
+class RotatingGzipWriter(object):
+    """
+    Writes lines to gzipped files in directory, starting a new file after
+    max_bytes compressed bytes or max_age seconds. Files are written with a
+    .part suffix, removed once complete.
+    """
+
+    def __init__(self, directory, prefix='analytics', max_bytes=64 * 1024 * 1024,
+                 max_age=3600):
+        self._directory = directory
+        self._prefix = prefix
+        self._max_bytes = max_bytes
+        self._max_age = max_age
+        self._file = None
+        self._gzip_file = None
+        self._path = None
+        self._opened_at = 0
+
+    def _open(self):
+        now = time.time()
+        name = '%s-%s-%d-%s%s' % (self._prefix, time.strftime('%Y%m%d%H%M%S', time.gmtime(now)),
+                                  os.getpid(), ('%.6f' % now).split('.')[1], FILE_SUFFIX)
+        self._path = os.path.join(self._directory, name)
+        self._file = open(self._path + PARTIAL_SUFFIX, 'wb')
+        self._gzip_file = gzip.GzipFile(filename=name, mode='wb', fileobj=self._file)
+        self._opened_at = now
+
+    def write_lines(self, lines):
+        if self._gzip_file is None:
+            self._open()
+        for line in lines:
+            self._gzip_file.write(line)
+            self._gzip_file.write('\n')
+        self._gzip_file.flush()
+
+        if self._file.tell() >= self._max_bytes:
+            self.close()
+        else:
+            self.close_expired()
+
+    def close_expired(self):
+        """
+        Close the current file once it is max_age seconds old, also when
+        nothing is being written to it
+        """
+        if self._gzip_file is not None and time.time() - self._opened_at >= self._max_age:
+            self.close()
+
+    def close(self):
+        if self._gzip_file is None:
+            return
+        self._gzip_file.close()
+        self._file.close()
+        os.rename(self._path + PARTIAL_SUFFIX, self._path)
+        self._gzip_file = None
+        self._file = None
+
+
+class AnalyticsPipeline(object):  # pylint: disable=too-many-instance-attributes
+    """
+    Collects analytics events without blocking the caller. Events are
+    buffered and written by a background thread every flush_interval seconds
+    or as soon as batch_size events are buffered. When max_buffered events
+    are waiting (the writer does not keep up) new events are dropped and
+    counted in dropped, reported to the support given to set_support.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, writer, batch_size=1000, flush_interval=5.0, max_buffered=100000,
+                 fields=FIELDS):
+        self._writer = writer
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._max_buffered = max_buffered
+        self._fields = fields
+
+        self._lock = threading.Lock()
+        self._buffer = ColumnarBuffer(fields)
+        self._flush_requested = threading.Event()
+        self._stopping = False
+        self.dropped = 0
+        self._reported_dropped = 0
+        self.written = 0
+        self._support = None
+        self._io_loop = None
+
+        self._thread = threading.Thread(target=self._run, name='analytics-writer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def record(self, *values):
+        """
+        Record an event with a value for each field, in FIELDS order
+        """
+        with self._lock:
+            buffered = len(self._buffer)
+            if buffered >= self._max_buffered:
+                self.dropped += 1
+                return
+            self._buffer.append(time.time(), values)
+        if buffered + 1 == self._batch_size:
+            self._flush_requested.set()
+
+    def is_alive(self):
+        return self._thread.is_alive()
+
+    def set_support(self, support, io_loop=None):
+        """
+        Report dropped events to support. Stats clients are not thread safe,
+        they are reported from io_loop (the current IOLoop by default).
+        """
+        self._io_loop = io_loop or ioloop.IOLoop.current()
+        self._support = support
+
+    def _report_dropped(self):
+        with self._lock:
+            dropped = self.dropped - self._reported_dropped
+            self._reported_dropped = self.dropped
+        if dropped:
+            self._support.stat_increment('analytics.dropped_count', dropped)
+
+    def _swap_buffer(self):
+        with self._lock:
+            buffer_to_write = self._buffer
+            self._buffer = ColumnarBuffer(self._fields)
+        return buffer_to_write
+
+    def _write(self, buffer_to_write):
+        if not len(buffer_to_write):
+            return
+        try:
+            self._writer.write_lines([json.dumps(buffer_to_write.to_batch(),
+                                                 separators=(',', ':'), default=str)])
+            self.written += len(buffer_to_write)
+        except (IOError, OSError):
+            with self._lock:
+                self.dropped += len(buffer_to_write)
+
+    def _run(self):
+        while not self._stopping:
+            self._flush_requested.wait(self._flush_interval)
+            self._flush_requested.clear()
+            self._write(self._swap_buffer())
+            try:
+                self._writer.close_expired()
+            except (IOError, OSError):
+                pass
+
+            with self._lock:
+                report = self._support is not None and self.dropped != self._reported_dropped
+            if report:
+                self._io_loop.add_callback(self._report_dropped)
+
+    def close(self, timeout=5):
+        """
+        Write buffered events and stop the writer thread
+        """
+        if self._thread.is_alive():
+            self._stopping = True
+            self._flush_requested.set()
+            self._thread.join(timeout)
+        self._write(self._swap_buffer())
+        self._writer.close()
+
+
+class LoggerAnalytics(object):  # pylint: disable=too-few-public-methods
+    """
+    Writes analytics events through the analytics logger, as before the
+    pipeline existed
+    """
+
+    def __init__(self, logger, fields=FIELDS):
+        self._logger = logger
+        self._fields = fields
+
+    def record(self, *values):
+        self._logger.info(None, extra=dict(zip(self._fields, values)))
+
+
+_PIPELINE = None
+
+
+def install(directory, batch_size=1000, flush_interval=5.0, max_buffered=100000,
+            max_bytes=64 * 1024 * 1024, max_age=3600):
+    """
+    Create the process analytics pipeline, again if its writer thread is
+    gone (e.g. after a fork)
+    """
+    global _PIPELINE  # pylint: disable=global-statement
+
+    if _PIPELINE is None or not _PIPELINE.is_alive():
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        writer = RotatingGzipWriter(directory, max_bytes=max_bytes, max_age=max_age)
+        _PIPELINE = AnalyticsPipeline(writer, batch_size, flush_interval, max_buffered)
+        atexit.register(_PIPELINE.close)
+
+    return _PIPELINE
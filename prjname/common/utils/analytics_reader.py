@@ -0,0 +1,81 @@
+"""
+Reads the files written by the analytics pipeline for offline aggregation.
+
+    prjname-analytics FILE_OR_DIRECTORY... [--count-by FIELD...] [--since TIME]
+
+Without --count-by every event is printed as a JSON line, with it the number
+of events (and distinct accounts/devices) per combination of the fields.
+"""
+import argparse
+import collections
+import glob
+import gzip
+import json
+import os
+import sys
+
+from prjname.common.utils import analytics
+
+
+def iter_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for file_path in sorted(glob.glob(os.path.join(path, '*' + analytics.FILE_SUFFIX))):
+                yield file_path
+        else:
+            yield path
+
+
+def iter_events(paths, since=None):
+    """
+    Events of the analytics files (or directories) in paths
+    """
+    for file_path in iter_files(paths):
+        gzip_file = gzip.open(file_path, 'rb')
+        try:
+            for line in gzip_file:
+                if not line.strip():
+                    continue
+                for event in analytics.batch_events(json.loads(line)):
+                    if since is None or event['time'] >= since:
+                        yield event
+        finally:
+            gzip_file.close()
+
+
+def aggregate(events, count_by):
+    """
+    Count events, accounts and devices by the values of the count_by fields
+    """
+    counts = collections.defaultdict(lambda: {'events': 0, 'accounts': set(), 'devices': set()})
+    for event in events:
+        group = counts[tuple(event.get(field) for field in count_by)]
+        group['events'] += 1
+        group['accounts'].add(event.get('account'))
+        group['devices'].add(event.get('device'))
+
+    for key, group in sorted(counts.items()):
+        result = dict(zip(count_by, key))
+        result.update(events=group['events'], accounts=len(group['accounts']),
+                      devices=len(group['devices']))
+        yield result
+
+
+def main(argv=None, output=sys.stdout):
+    parser = argparse.ArgumentParser(description='Read analytics event files')
+    parser.add_argument('paths', nargs='+', help='analytics files or directories')
+    parser.add_argument('--count-by', nargs='+', choices=analytics.FIELDS,
+                        help='count events by these fields')
+    parser.add_argument('--since', type=float,
+                        help='only events from this time (seconds since epoch)')
+    args = parser.parse_args(argv)
+
+    events = iter_events(args.paths, args.since)
+    results = aggregate(events, args.count_by) if args.count_by else events
+    for result in results:
+        output.write(json.dumps(result, sort_keys=True) + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
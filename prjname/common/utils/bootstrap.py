@@ -0,0 +1,135 @@
+"""
+Process level setup, done once instead of on every request: logging
+configuration, environment, analytics pipeline, IOLoop lag monitor, rate
+limit buckets and stats client
+"""
+from logging import config
+from logging import getLogger
+import os
+
+import statsd
+
+from prjname.common import exceptions
+from prjname.common import settings
+from prjname.common.utils import analytics
+from prjname.common.utils import ioloop_lag
+from prjname.common.utils import log_pipeline
+from prjname.common.utils import rate_limit
+from prjname.common.utils import stats
+
+ENVIRONMENT_NAME = 'MFS_ENV'
+
+_PROCESS_CONTEXT = None
+
+
+class ProcessContext(object):  # pylint: disable=too-few-public-methods
+    """
+    Resources shared by every request handled by this process
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, environment, logger, analytics_logger, stats_client,
+                 log_entire_request, analytics_pipeline=None, worker_id=None):
+        self.environment = environment
+        # Pre-forked worker process id, None when not forked
+        self.worker_id = worker_id
+        self.logger = logger
+        self.analytics_logger = analytics_logger
+        # Records analytics events: analytics.AnalyticsPipeline or
+        # analytics.LoggerAnalytics (analytics logger)
+        self.analytics = (analytics_pipeline if analytics_pipeline is not None
+                          else analytics.LoggerAnalytics(analytics_logger))
+        self.stats_client = stats_client
+        self.log_entire_request = log_entire_request
+
+
+def before_fork():
+    """
+    Create the resources the pre-forked worker processes share, everything
+    else is created by bootstrap in each worker. Only called by prefork.start
+    before forking, a single process keeps everything to itself.
+    """
+    if settings.RATE_LIMIT_SHARED:
+        rate_limit.install_shared_store(int(settings.RATE_LIMIT_SHARED_SLOTS))
+
+
+def bootstrap(force=False, worker_id=None):
+    """
+    Configure logging and stats for this process. Further calls return the
+    same ProcessContext unless force is True (e.g. after a fork). Stats of
+    pre-forked workers are prefixed with their worker_id.
+    """
+    global _PROCESS_CONTEXT  # pylint: disable=global-statement
+
+    if _PROCESS_CONTEXT is not None and not force:
+        return _PROCESS_CONTEXT
+
+    environment = os.environ.get(ENVIRONMENT_NAME)
+    if not environment:
+        raise exceptions.GeneralInfoException(
+            '{0} environment variable not found'.format(ENVIRONMENT_NAME))
+
+    config.dictConfig(settings.LOGGING)
+    if settings.LOG_ASYNC:
+        log_pipeline.install([settings.LOGGER_NAME, settings.ANALYTICS_LOGGER_NAME],
+                             queue_size=int(settings.LOG_QUEUE_SIZE),
+                             overflow=settings.LOG_QUEUE_OVERFLOW,
+                             batch_size=int(settings.LOG_BATCH_SIZE))
+
+    analytics_pipeline = None
+    if settings.ANALYTICS_PIPELINE:
+        analytics_pipeline = analytics.install(
+            settings.ANALYTICS_DIR,
+            batch_size=int(settings.ANALYTICS_BATCH_SIZE),
+            flush_interval=float(settings.ANALYTICS_FLUSH_INTERVAL),
+            max_buffered=int(settings.ANALYTICS_MAX_BUFFERED_EVENTS),
+            max_bytes=int(settings.ANALYTICS_ROTATE_BYTES),
+            max_age=int(settings.ANALYTICS_ROTATE_INTERVAL))
+
+    ioloop_lag.start(float(settings.IOLOOP_LAG_INTERVAL))
+
+    stats_client = None
+    if settings.STATS_ENABLED:
+        prefix = 'prjname.' + environment
+        if worker_id is not None:
+            prefix += '.worker{0}'.format(worker_id)
+        stats_client = _create_stats_client(prefix)
+
+    _PROCESS_CONTEXT = ProcessContext(
+        environment=environment,
+        logger=getLogger(settings.LOGGER_NAME),
+        analytics_logger=getLogger(settings.ANALYTICS_LOGGER_NAME),
+        stats_client=stats_client,
+        log_entire_request=settings.LOG_LEVEL in ['CRITICAL', 'ERROR'],
+        analytics_pipeline=analytics_pipeline,
+        worker_id=worker_id)
+
+    if analytics_pipeline is not None:
+        # support imports this module
+        from prjname.common.utils.support import Support
+        analytics_pipeline.set_support(Support(
+            _PROCESS_CONTEXT.logger, {'environment': environment, 'handler': 'Analytics'},
+            stats_client))
+    return _PROCESS_CONTEXT
+
+
+def _create_stats_client(prefix):
+    """
+    statsd client sending every metric as it is reported, or aggregating
+    client flushing them periodically, depending on settings.STATS_BACKEND
+    """
+    if settings.STATS_BACKEND == 'statsd':
+        return statsd.StatsClient(host=settings.STATS_SERVICE_HOSTNAME,
+                                  port=8125, prefix=prefix)
+
+    stats_client = stats.AggregatingStatsClient(
+        host=settings.STATS_SERVICE_HOSTNAME, port=8125, prefix=prefix,
+        flush_interval=float(settings.STATS_FLUSH_INTERVAL),
+        max_timing_samples=int(settings.STATS_MAX_TIMING_SAMPLES),
+        set_window=float(settings.STATS_SET_WINDOW))
+    stats_client.start()
+    return stats_client
+
+
+def get_process_context():
+    return _PROCESS_CONTEXT if _PROCESS_CONTEXT is not None else bootstrap()
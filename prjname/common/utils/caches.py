@@ -0,0 +1,51 @@
+"""
+In process caches
+"""
+import collections
+import time
+
+
+class TTLCache(object):
+    """
+    Bounded LRU cache whose entries expire after a time to live (seconds)
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._entries = collections.OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return default
+
+        # Move to the end, entries are evicted from the beginning
+        del self._entries[key]
+        self._entries[key] = entry
+        return value
+
+    def set(self, key, value, ttl=None):
+        self._entries.pop(key, None)
+        self._entries[key] = (time.time() + (ttl if ttl is not None else self._ttl),
+                              value)
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        entry = self._entries.pop(key, None)
+        return entry[1] if entry is not None else default
+
+    def clear(self):
+        self._entries.clear()
+
+    def __contains__(self, key):
+        return self.get(key, self) is not self
+
+    def __len__(self):
+        return len(self._entries)
@@ -1,5 +1,8 @@
+import threading
+
 import cassandra
 from cassandra import cluster
+from cassandra import connection
 from cassandra.io import libevreactor
 from tornado import concurrent
 
@@ -11,6 +14,10 @@ ConsistencyLevel = cassandra.ConsistencyLevel
 
 class CassandraAdapter(object):  # pylint: disable=R0903
     INSTANCE = {}
+    # Queries sent by any adapter of this process and not answered yet,
+    # answers arrive on the driver event loop thread
+    _in_flight = 0
+    _in_flight_lock = threading.Lock()
 
     def __init__(self, *args, **kwargs):
         self.setting = kwargs
@@ -24,21 +31,66 @@ class CassandraAdapter(object):  # pylint: disable=R0903
         return self.INSTANCE[keyspace]
 
     def execute_async(self, keyspace, query, params=None,
-                      consistency_level=cassandra.ConsistencyLevel.QUORUM):
+                      consistency_level=cassandra.ConsistencyLevel.QUORUM,
+                      timeout=None):
         statement = cassandra.query.SimpleStatement(
             query, consistency_level=consistency_level)
+        options = {'timeout': timeout} if timeout is not None else {}
         cassandra_future = self.connect(keyspace).execute_async(
-            statement, params or {})
-        return self.to_tornado_future(cassandra_future)
+            statement, params or {}, **options)
+        self._count_in_flight(1)
+        return self.to_tornado_future(
+            cassandra_future, on_done=lambda: self._count_in_flight(-1))
+
+    @classmethod
+    def _count_in_flight(cls, delta):
+        with cls._in_flight_lock:
+            CassandraAdapter._in_flight += delta
+
+    @classmethod
+    def get_in_flight(cls):
+        return cls._in_flight
+
+    @classmethod
+    def get_pool_state(cls):
+        """
+        Connections and requests in flight to every host of the connected
+        sessions: {host: {'open_count': int, 'in_flights': [int, ...]}}
+        """
+        pool_state = {}
+        for session in cls.INSTANCE.values():
+            for host, state in session.get_pool_state().items():
+                host_state = pool_state.setdefault(
+                    str(host), {'open_count': 0, 'in_flights': []})
+                host_state['open_count'] += state.get('open_count', 0)
+                host_state['in_flights'].extend(state.get('in_flights', []))
+        return pool_state
+
+    @classmethod
+    def get_pool_usage(cls):
+        """
+        Fraction of the request streams of the open connections in use,
+        for the busiest host
+        """
+        usage = 0.0
+        for state in cls.get_pool_state().values():
+            if state['open_count']:
+                usage = max(usage, float(sum(state['in_flights'])) /
+                            (state['open_count'] * connection.Connection.max_in_flight))
+        return usage
 
     @staticmethod
-    def to_tornado_future(cassandra_future):
+    def to_tornado_future(cassandra_future, on_done=None):
         tornado_future = concurrent.Future()
 
         def callback_success(result):
+            if on_done is not None:
+                on_done()
             tornado_future.set_result(result)
 
         def callback_error(ex):
+            if on_done is not None:
+                on_done()
             tornado_future.set_exception(
                 exceptions.DatabaseOperationError(ex.message))
 
@@ -0,0 +1,127 @@
+"""
+HTTP content encodings: gzip, deflate and brotli (when brotli is installed)
+"""
+import gzip
+import io
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENCODINGS = (BROTLI, GZIP, DEFLATE, IDENTITY) = ('br', 'gzip', 'deflate', 'identity')
+
+
+def available_encodings():
+    """
+    Encodings supported by this process, preferred first
+    """
+    return (BROTLI, GZIP, DEFLATE) if brotli else (GZIP, DEFLATE)
+
+
+def accept_encoding_header():
+    return ', '.join(available_encodings())
+
+
+def compress(data, encoding, level=6):
+    """
+    Compress data with the given content encoding
+    @param level: 1 (fastest) to 9 (smallest), mapped to 0-11 for brotli
+    """
+    if encoding == GZIP:
+        buf = io.BytesIO()
+        gzip_file = gzip.GzipFile(mode='wb', fileobj=buf, compresslevel=level)
+        gzip_file.write(data)
+        gzip_file.close()
+        return buf.getvalue()
+    elif encoding == DEFLATE:
+        return zlib.compress(data, level)
+    elif encoding == BROTLI and brotli:
+        return brotli.compress(data, quality=min(11, max(0, int(round(level * 11 / 9.0)))))
+    raise ValueError('Unsupported content encoding: %s' % encoding)
+
+
+def decompress(data, encoding):
+    decompressor = Decompressor(encoding)
+    return decompressor.decompress(data) + decompressor.flush()
+
+
+def negotiate(accept_encoding, supported=None):
+    """
+    Return the best encoding in supported accepted by an Accept-Encoding
+    header value, or None when the identity encoding has to be used
+    """
+    if not accept_encoding:
+        return None
+
+    supported = supported or available_encodings()
+    accepted = {}
+    for item in accept_encoding.split(','):
+        parts = item.strip().split(';')
+        name = parts[0].strip().lower()
+        quality = 1.0
+        for param in parts[1:]:
+            key, _, value = param.strip().partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            accepted[name] = quality
+
+    candidates = [(accepted.get(encoding, accepted.get('*', 0.0)), -index, encoding)
+                  for index, encoding in enumerate(supported)]
+    quality, _, encoding = max(candidates)
+    return encoding if quality > 0 else None
+
+
+class Decompressor(object):  # pylint: disable=too-few-public-methods
+    """
+    Incremental decompressor so chunks can be decoded as they arrive
+    """
+
+    def __init__(self, encoding):
+        self.encoding = encoding.strip().lower() if encoding else IDENTITY
+        self._raw_deflate_fallback = False
+
+        if self.encoding == GZIP:
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self.encoding == DEFLATE:
+            # Some servers send raw deflate instead of zlib wrapped data
+            self._raw_deflate_fallback = True
+            self._decompressor = zlib.decompressobj()
+        elif self.encoding == BROTLI and brotli:
+            self._decompressor = brotli.Decompressor()
+        elif self.encoding == IDENTITY:
+            self._decompressor = None
+        else:
+            raise ValueError('Unsupported content encoding: %s' % encoding)
+
+    @staticmethod
+    def is_supported(encoding):
+        return bool(encoding) and encoding.strip().lower() in available_encodings()
+
+    def decompress(self, chunk):
+        if self._decompressor is None:
+            return chunk
+
+        if self.encoding == BROTLI:
+            process = getattr(self._decompressor, 'process', None)
+            return (process or self._decompressor.decompress)(chunk)
+
+        try:
+            data = self._decompressor.decompress(chunk)
+        except zlib.error:
+            if not self._raw_deflate_fallback:
+                raise
+            self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            data = self._decompressor.decompress(chunk)
+        self._raw_deflate_fallback = False
+        return data
+
+    def flush(self):
+        if self._decompressor is None or self.encoding == BROTLI:
+            return b''
+        return self._decompressor.flush()
@@ -0,0 +1,117 @@
+"""
+Request-wide time budgets
+"""
+import time
+
+from prjname.common import constants
+from prjname.common import exceptions
+from prjname.common import settings
+
+
+class Deadline(object):
+    """
+    Absolute point in time after which the work done for a request is no
+    longer useful. Requests without a time budget get an unbounded deadline
+    that never expires but can still be cancelled.
+    """
+
+    def __init__(self, expires_at):
+        self.expires_at = expires_at
+        self.cancelled = False
+
+    @classmethod
+    def from_timeout(cls, timeout, start_time=None):
+        """
+        Deadline timeout seconds after start_time (now by default)
+        """
+        return cls((start_time if start_time is not None else time.time()) + timeout)
+
+    @classmethod
+    def unbounded(cls):
+        """
+        Deadline that never expires, only when cancelled
+        """
+        return cls(float('inf'))
+
+    @property
+    def bounded(self):
+        return self.expires_at != float('inf')
+
+    @classmethod
+    def from_request(cls, request):
+        """
+        Deadline of an inbound request based on the remaining budget (in
+        milliseconds) the client sent in the request timeout header,
+        settings.DEFAULT_REQUEST_TIMEOUT (0 for none) when there is none and
+        always capped by settings.MAX_REQUEST_TIMEOUT.
+        The deadline is unbounded when the request has no time budget. It is
+        kept in the request so everything built from it shares the same one.
+        """
+        if hasattr(request, 'deadline'):
+            return request.deadline
+
+        request.deadline = cls._from_request(request)
+        return request.deadline
+
+    @classmethod
+    def _from_request(cls, request):
+        timeout = float(settings.DEFAULT_REQUEST_TIMEOUT) or None
+        header_value = request.headers.get(constants.REQUEST_TIMEOUT_HTTP_HEADER)
+        if header_value:
+            try:
+                timeout = max(0.0, float(header_value) / 1000.0)
+            except ValueError:
+                pass
+
+        if timeout is None:
+            return cls.unbounded()
+
+        timeout = min(timeout, float(settings.MAX_REQUEST_TIMEOUT))
+
+        # Use the time BaseHandler.prepare saw the request so every Context
+        # built for the same request gets the same deadline
+        start_time = getattr(request, 'received_at', None)
+        return cls.from_timeout(timeout, start_time)
+
+    def remaining(self):
+        """
+        Seconds left until the deadline, never negative
+        """
+        if self.cancelled:
+            return 0.0
+        return max(0.0, self.expires_at - time.time())
+
+    def expired(self):
+        return self.cancelled or time.time() >= self.expires_at
+
+    def cancel(self):
+        """
+        Expire the deadline now, e.g. when the client went away and the
+        work left is no longer useful
+        """
+        self.cancelled = True
+
+    def timeout(self, timeout=None):
+        """
+        Return timeout bounded by the time left until the deadline, timeout
+        itself for unbounded deadlines
+        """
+        if not self.bounded and not self.cancelled:
+            return timeout
+        remaining = self.remaining()
+        return remaining if timeout is None else min(timeout, remaining)
+
+    def check(self, operation):
+        """
+        Raise DeadlineExceeded if the deadline has already passed
+        """
+        if self.cancelled:
+            raise exceptions.DeadlineExceeded('%s (request cancelled)' % operation)
+        if self.expired():
+            raise exceptions.DeadlineExceeded(operation)
+
+    def header_value(self):
+        """
+        Remaining budget to forward downstream in the request timeout header
+        """
+        return str(int(self.remaining() * 1000))
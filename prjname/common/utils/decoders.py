@@ -0,0 +1,124 @@
+"""
+Response decoders selected by content type
+"""
+import xmltodict
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+from prjname.common.utils import json_codec
+
+
+class ResponseDecoder(object):
+    """
+    Base class for response decoders.
+    Override decode() and, when the format allows to parse as data arrives,
+    decode_stream().
+    """
+
+    CONTENT_TYPES = ()
+    SUFFIXES = ()
+
+    def accepts(self, content_type):
+        return content_type in self.CONTENT_TYPES or any(
+            content_type.endswith(suffix) for suffix in self.SUFFIXES)
+
+    def decode(self, body):
+        raise NotImplementedError()
+
+    def decode_stream(self, chunks):
+        """
+        Decode a body given as an iterable of chunks. It is called from a
+        worker thread while chunks are still arriving.
+        """
+        return self.decode(b''.join(chunks))
+
+
+class JsonDecoder(ResponseDecoder):
+    """
+    JSON decoder. Streams are parsed incrementally when ijson is installed.
+    """
+
+    CONTENT_TYPES = ('application/json', 'text/json')
+    SUFFIXES = ('+json',)
+
+    def decode(self, body):
+        return json_codec.loads(body)
+
+    def decode_stream(self, chunks):
+        if ijson is None:
+            return super(JsonDecoder, self).decode_stream(chunks)
+        return next(ijson.items(ChunksReader(chunks), '', use_float=True))
+
+
+class XmlDecoder(ResponseDecoder):
+    """
+    XML decoder, always parsed incrementally by expat through xmltodict
+    """
+
+    CONTENT_TYPES = ('application/xml', 'text/xml')
+    SUFFIXES = ('+xml',)
+
+    def decode(self, body):
+        return xmltodict.parse(body)
+
+    def decode_stream(self, chunks):
+        return xmltodict.parse(ChunksReader(chunks))
+
+
+class DecoderRegistry(object):
+    """
+    Decoders by content type
+    """
+
+    def __init__(self, decoders=None):
+        self._decoders = list(decoders) if decoders is not None else []
+
+    def register(self, decoder):
+        """
+        Register a decoder, it takes precedence over the ones already
+        registered for the same content types
+        """
+        self._decoders.insert(0, decoder)
+
+    def get_decoder(self, content_type):
+        """
+        Return the decoder for a Content-Type header value or None
+        """
+        if not content_type:
+            return None
+
+        media_type = content_type.split(';', 1)[0].strip().lower()
+        for decoder in self._decoders:
+            if decoder.accepts(media_type):
+                return decoder
+        return None
+
+
+class ChunksReader(object):  # pylint: disable=too-few-public-methods
+    """
+    File-like object reading from an iterable of chunks, so file based
+    incremental parsers can consume a body while it is being received
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b''
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+
+        if size < 0:
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+DEFAULT_REGISTRY = DecoderRegistry([JsonDecoder(), XmlDecoder()])
@@ -0,0 +1,27 @@
+"""
+Shared thread pools used to run blocking or CPU bound work off the IOLoop
+"""
+from concurrent import futures
+
+from prjname.common import settings
+
+_EXECUTORS = {}
+
+
+def get_executor(name='default', max_workers=None):
+    """
+    Return the shared thread pool with the given name, creating it on first
+    use so processes forked after import get their own threads
+    """
+    executor = _EXECUTORS.get(name)
+    if executor is None:
+        executor = futures.ThreadPoolExecutor(
+            max_workers or int(settings.WORKER_THREADS))
+        _EXECUTORS[name] = executor
+    return executor
+
+
+def shutdown(wait=True):
+    for executor in _EXECUTORS.values():
+        executor.shutdown(wait=wait)
+    _EXECUTORS.clear()
@@ -0,0 +1,64 @@
+"""
+HyperLogLog cardinality estimator
+"""
+import hashlib
+import math
+import struct
+
+
+class HyperLogLog(object):
+    """
+    Estimates the number of distinct values added using 2 ** precision
+    registers (one byte each), with a standard error of about
+    1.04 / sqrt(2 ** precision): 1.6% for the default precision.
+    """
+
+    def __init__(self, precision=12):
+        if not 4 <= precision <= 16:
+            raise ValueError('precision must be between 4 and 16')
+        self._precision = precision
+        self._size = 1 << precision
+        self._registers = bytearray(self._size)
+        self._value_bits = 64 - precision
+
+        if self._size >= 128:
+            self._alpha = 0.7213 / (1 + 1.079 / self._size)
+        else:
+            self._alpha = {16: 0.673, 32: 0.697, 64: 0.709}[self._size]
+
+    def add(self, value):
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        hashed = struct.unpack('<Q', hashlib.md5(str(value)).digest()[:8])[0]
+
+        index = hashed >> self._value_bits
+        remaining = hashed & ((1 << self._value_bits) - 1)
+        rank = self._value_bits - remaining.bit_length() + 1
+
+        if rank > self._registers[index]:
+            self._registers[index] = rank
+
+    def merge(self, other):
+        if other._size != self._size:  # pylint: disable=protected-access
+            raise ValueError('Cannot merge estimators with different precision')
+        for index, rank in enumerate(other._registers):  # pylint: disable=protected-access
+            if rank > self._registers[index]:
+                self._registers[index] = rank
+
+    def cardinality(self):
+        estimate = self._alpha * self._size ** 2 / sum(
+            2.0 ** -rank for rank in self._registers)
+
+        if estimate <= 2.5 * self._size:
+            # Small range correction: linear counting
+            empty_registers = self._registers.count(b'\x00')
+            if empty_registers:
+                estimate = self._size * math.log(float(self._size) / empty_registers)
+
+        return int(round(estimate))
+
+    def clear(self):
+        self._registers = bytearray(self._size)
+
+    def __len__(self):
+        return self.cardinality()
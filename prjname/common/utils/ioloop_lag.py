@@ -0,0 +1,82 @@
+"""
+IOLoop lag monitor: how late callbacks run compared to when they were
+scheduled, a direct measure of how busy the IOLoop thread is
+"""
+import time
+
+from tornado import ioloop
+
+
+class LagMonitor(object):
+    """
+    Schedules a callback every interval seconds and measures how late it
+    runs. lag is the last measure and average an exponentially weighted
+    moving average, both in milliseconds.
+    """
+
+    def __init__(self, interval=0.5, smoothing=0.2):
+        self._interval = interval
+        self._smoothing = smoothing
+        self._expected_at = None
+        self._timeout = None
+        self._io_loop = None
+        self.lag = 0.0
+        self.average = 0.0
+        self.max_lag = 0.0
+
+    def start(self, io_loop=None):
+        self._io_loop = io_loop or ioloop.IOLoop.current()
+        self._schedule()
+
+    def stop(self):
+        if self._timeout is not None:
+            self._io_loop.remove_timeout(self._timeout)
+            self._timeout = None
+
+    @property
+    def running(self):
+        return self._timeout is not None
+
+    def _schedule(self):
+        self._expected_at = time.time() + self._interval
+        self._timeout = self._io_loop.call_later(self._interval, self._measure)
+
+    def _measure(self):
+        self.lag = max(0.0, (time.time() - self._expected_at) * 1000.0)
+        self.average += self._smoothing * (self.lag - self.average)
+        self.max_lag = max(self.max_lag, self.lag)
+        self._schedule()
+
+    def reset_max(self):
+        max_lag = self.max_lag
+        self.max_lag = self.lag
+        return max_lag
+
+
+_MONITOR = None
+
+
+def get_monitor():
+    """
+    Process lag monitor, None when not started
+    """
+    return _MONITOR
+
+
+def start(interval=0.5):
+    """
+    Start the process lag monitor on the current IOLoop
+    """
+    global _MONITOR  # pylint: disable=global-statement
+    if _MONITOR is not None:
+        _MONITOR.stop()
+    _MONITOR = LagMonitor(interval)
+    _MONITOR.start()
+    return _MONITOR
+
+
+def current_lag():
+    """
+    Smoothed IOLoop lag in milliseconds, 0 when the monitor is not running
+    """
+    return _MONITOR.average if _MONITOR is not None else 0.0
@@ -0,0 +1,77 @@
+"""
+JSON encoding and decoding with the fastest library installed:
+ujson, then simplejson, then the standard json module.
+Selected with settings.JSON_CODEC ('auto', 'ujson', 'simplejson' or 'json').
+"""
+import collections
+import json
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+try:
+    import simplejson
+except ImportError:
+    simplejson = None
+
+from prjname.common import settings
+
+CODECS = (AUTO, UJSON, SIMPLEJSON, JSON) = ('auto', 'ujson', 'simplejson', 'json')
+
+
+class JsonCodec(object):
+    """
+    loads/dumps for one JSON library. Key order is only kept on decoding
+    when asked, native libraries do not support object_pairs_hook so ordered
+    decoding always uses json/simplejson.
+    """
+
+    def __init__(self, name=AUTO):
+        if name == AUTO:
+            name = UJSON if ujson else SIMPLEJSON if simplejson else JSON
+        if name == UJSON and not ujson or name == SIMPLEJSON and not simplejson:
+            raise ValueError('JSON library not installed: %s' % name)
+        if name not in CODECS:
+            raise ValueError('Unsupported JSON codec: %s' % name)
+
+        self.name = name
+        self._ordered_module = simplejson if simplejson else json
+
+    def loads(self, data, ordered=False):
+        if ordered:
+            return self._ordered_module.loads(data, object_pairs_hook=collections.OrderedDict)
+        if self.name == UJSON:
+            return ujson.loads(data)
+        if self.name == SIMPLEJSON:
+            return simplejson.loads(data)
+        return json.loads(data)
+
+    def dumps(self, obj):
+        if self.name == UJSON:
+            return ujson.dumps(obj, escape_forward_slashes=False)
+        if self.name == SIMPLEJSON:
+            return simplejson.dumps(obj)
+        return json.dumps(obj)
+
+
+_CODEC = None
+
+
+def get_codec():
+    """
+    Process wide codec, created on first use
+    """
+    global _CODEC  # pylint: disable=global-statement
+    if _CODEC is None:
+        _CODEC = JsonCodec(settings.JSON_CODEC)
+    return _CODEC
+
+
+def loads(data, ordered=False):
+    return get_codec().loads(data, ordered)
+
+
+def dumps(obj):
+    return get_codec().dumps(obj)
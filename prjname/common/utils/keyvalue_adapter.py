@@ -1,7 +1,7 @@
 '''
 Adapter to key value database
 '''
-import json
+import copy
 import re
 import sys
 
@@ -11,6 +11,7 @@ import stevedore
 from prjname.common import exceptions
 from prjname.common import settings
 from prjname.common.utils import cassandra_adapter
+from prjname.common.utils import json_codec
 
 
 EXTENSIONS = stevedore.extension.ExtensionManager(
@@ -28,11 +29,16 @@ class KeyValueAdapter(object):  # pylint: disable=R0201,R0903
                  cb_bucket='default',
                  hosts=settings.CASSANDRA_HOSTS,
                  keyspace='system',
-                 auth_provider=None):
+                 auth_provider=None,
+                 context=None):
+        """
+        context: request Context, every query is bounded by its deadline
+        """
 
         self._bucket = cb_bucket
         self._keyspace = keyspace
         self._support = None
+        self.deadline = getattr(context, 'deadline', None)
 
         try:
             self._adapter = cassandra_adapter.CassandraAdapter(
@@ -48,6 +54,30 @@ class KeyValueAdapter(object):  # pylint: disable=R0201,R0903
     def set_support(self, support):
         self._support = support
 
+    def set_deadline(self, deadline):
+        """
+        Bound every query to the time left for the request and drop queries
+        once the deadline has passed
+        """
+        self.deadline = deadline
+
+    def for_context(self, context):
+        """
+        Adapter sharing this one's session whose queries are bounded by the
+        deadline of context, for adapters shared by the whole application
+        """
+        adapter = copy.copy(self)
+        adapter.set_deadline(getattr(context, 'deadline', None))
+        return adapter
+
+    def _execute(self, query, params):
+        timeout = None
+        if self.deadline:
+            self.deadline.check(self.LOG_TAG % ('query on %s' % self._bucket))
+            timeout = self.deadline.timeout()
+        return self._adapter.execute_async(self._keyspace, query, params,
+                                           timeout=timeout)
+
     @gen.coroutine
     def get(self, key):
         data = yield self._get_internal(key)
@@ -72,6 +102,39 @@ class KeyValueAdapter(object):  # pylint: disable=R0201,R0903
         data = yield self._get_internal(key)
         raise gen.Return(data.get("value"))
 
+    @gen.coroutine
+    def get_version(self, key):
+        """
+        Retrieve from db the write time (microseconds since epoch) of the
+        value associated with key, without reading the value. Useful as an
+        entity version for conditional requests.
+        @param key: the key to get the version for
+        """
+        criteria = {
+            "table": self._bucket,
+            "key": key
+        }
+        result = yield self._execute(
+            """
+            SELECT writetime(value) AS version
+              FROM {table}
+             WHERE key = %(key)s
+            """.format(**criteria),
+            criteria)
+
+        version = None
+        for row in result:
+            version = row.version
+        if version is None:
+            raise exceptions.DatabaseOperationError('Value for Key %s on table %s not found' %
+                                                    (criteria.get("key"), criteria.get("table")))
+
+        if self._support:
+            self._support.stat_increment('db.total_count')
+            self._support.stat_increment('db.get_version_count')
+
+        raise gen.Return(version)
+
     @gen.coroutine
     def get_all_values(self):
         data = yield self._multi_get_internal()
@@ -133,8 +196,7 @@ class KeyValueAdapter(object):  # pylint: disable=R0201,R0903
             "table": self._bucket,
             "key": key
         }
-        result = yield self._adapter.execute_async(
-            self._keyspace,
+        result = yield self._execute(
             """
             SELECT *
               FROM {table}
@@ -146,7 +208,7 @@ class KeyValueAdapter(object):  # pylint: disable=R0201,R0903
         for row in result:
             data = {
                 "key": row.key,
-                "value": json.loads(row.value)
+                "value": json_codec.loads(row.value)
             }
         if data is None:
             raise exceptions.DatabaseOperationError('Value for Key %s on table %s not found' %
@@ -168,8 +230,7 @@ class KeyValueAdapter(object):  # pylint: disable=R0201,R0903
         if keys is not None:
             criteria['keys'] = "WHERE key in ('{0}')".format("', '".join(keys))
 
-        result = yield self._adapter.execute_async(
-            self._keyspace,
+        result = yield self._execute(
             """
             SELECT *
               FROM {table}
@@ -181,7 +242,7 @@ class KeyValueAdapter(object):  # pylint: disable=R0201,R0903
         for row in result:
             data = {
                 "key": row.key,
-                "value": json.loads(row.value)
+                "value": json_codec.loads(row.value)
             }
             rows.append(data)
 
@@ -197,12 +258,11 @@ class KeyValueAdapter(object):  # pylint: disable=R0201,R0903
         data = {
             "table": self._bucket,
             "key": key,
-            "value": json.dumps(value),
+            "value": json_codec.dumps(value),
             "ttl": ttl
         }
 
-        yield self._adapter.execute_async(
-            self._keyspace,
+        yield self._execute(
             """
             INSERT INTO {table} (key,
                                  value)
@@ -227,11 +287,10 @@ class KeyValueAdapter(object):  # pylint: disable=R0201,R0903
         data = {
             "table": self._bucket,
             "key": key,
-            "value": json.dumps(value),
+            "value": json_codec.dumps(value),
             "ttl": ttl
         }
-        yield self._adapter.execute_async(
-            self._keyspace,
+        yield self._execute(
             """
             UPDATE {table} USING TTL {ttl}
                SET value = %(value)s
@@ -255,8 +314,7 @@ class KeyValueAdapter(object):  # pylint: disable=R0201,R0903
             "table": self._bucket,
             "key": key
         }
-        yield self._adapter.execute_async(
-            self._keyspace,
+        yield self._execute(
             """
             DELETE FROM {table}
              WHERE key = %(key)s
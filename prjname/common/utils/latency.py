@@ -0,0 +1,107 @@
+"""
+In process latency histograms
+"""
+import bisect
+import time
+
+
+def _build_bucket_bounds(lowest=1.0, highest=120000.0, growth=1.2):
+    bounds = []
+    bound = lowest
+    while bound < highest:
+        bounds.append(round(bound, 3))
+        bound *= growth
+    bounds.append(highest)
+    return tuple(bounds)
+
+
+class LatencyHistogram(object):
+    """
+    Fixed size latency histogram with logarithmic buckets (milliseconds).
+    Samples are kept in two rotating windows so percentiles follow recent
+    traffic instead of the whole process lifetime.
+    """
+
+    BUCKET_BOUNDS = _build_bucket_bounds()
+
+    def __init__(self, window=60):
+        self._window = window
+        self._window_start = time.time()
+        self._current = [0] * (len(self.BUCKET_BOUNDS) + 1)
+        self._previous = [0] * (len(self.BUCKET_BOUNDS) + 1)
+
+    def _rotate(self, now):
+        if now - self._window_start >= self._window:
+            # A window with no samples at all leaves nothing worth keeping
+            if now - self._window_start >= 2 * self._window:
+                self._previous = [0] * len(self._current)
+            else:
+                self._previous = self._current
+            self._current = [0] * len(self._previous)
+            self._window_start = now
+
+    def record(self, value):
+        """
+        Record a latency sample in milliseconds
+        """
+        self._rotate(time.time())
+        self._current[bisect.bisect_left(self.BUCKET_BOUNDS, value)] += 1
+
+    @property
+    def count(self):
+        self._rotate(time.time())
+        return sum(self._current) + sum(self._previous)
+
+    def percentile(self, percentile):
+        """
+        Return the upper bound (milliseconds) of the bucket holding the given
+        percentile, or None when there are no samples
+        """
+        self._rotate(time.time())
+        counts = [current + previous for current, previous
+                  in zip(self._current, self._previous)]
+        total = sum(counts)
+        if not total:
+            return None
+
+        rank = total * percentile / 100.0
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            seen += bucket_count
+            if seen >= rank:
+                break
+
+        # pylint: disable=undefined-loop-variable
+        if index >= len(self.BUCKET_BOUNDS):
+            return self.BUCKET_BOUNDS[-1]
+        return self.BUCKET_BOUNDS[index]
+
+    def snapshot(self, percentiles=(50, 90, 99)):
+        return dict([('count', self.count)] +
+                    [('p%s' % each, self.percentile(each)) for each in percentiles])
+
+
+class LatencyRegistry(object):
+    """
+    Latency histograms per (endpoint, path template)
+    """
+
+    def __init__(self, window=60):
+        self._window = window
+        self._histograms = {}
+
+    def histogram(self, endpoint, path_template=None):
+        key = (endpoint, path_template)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = LatencyHistogram(self._window)
+            self._histograms[key] = histogram
+        return histogram
+
+    def snapshot(self):
+        return dict(('%s %s' % (endpoint, path_template or ''), histogram.snapshot())
+                    for (endpoint, path_template), histogram
+                    in self._histograms.items())
+
+
+REGISTRY = LatencyRegistry()
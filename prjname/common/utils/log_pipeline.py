@@ -0,0 +1,214 @@
+"""
+Non blocking logging: records are queued by the IOLoop thread and written
+in batches by a background thread
+"""
+import atexit
+import datetime
+import json
+import logging
+import Queue
+import threading
+
+OVERFLOW_POLICIES = (DROP, BLOCK) = ('drop', 'block')
+
+
+class LogPipeline(object):
+    """
+    Bounded queue of log records consumed by a background writer thread.
+    When the queue is full records are dropped (and counted) or the caller
+    blocks until there is room, depending on overflow.
+    """
+
+    _STOP = object()
+
+    def __init__(self, queue_size=10000, overflow=DROP, batch_size=512):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError('overflow must be one of %s' % (OVERFLOW_POLICIES,))
+        self._queue = Queue.Queue(maxsize=queue_size)
+        self._overflow = overflow
+        self._batch_size = batch_size
+        # Incremented by the logging threads, read by the writer thread
+        self._dropped_lock = threading.Lock()
+        self.dropped = 0
+        self._reported_dropped = 0
+        self._thread = threading.Thread(target=self._run, name='log-writer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def put(self, handlers, record):
+        try:
+            self._queue.put_nowait((handlers, record))
+        except Queue.Full:
+            if self._overflow == BLOCK:
+                self._queue.put((handlers, record))
+            else:
+                with self._dropped_lock:
+                    self.dropped += 1
+
+    def is_alive(self):
+        return self._thread.is_alive()
+
+    def close(self, timeout=5):
+        """
+        Write pending records and stop the writer thread
+        """
+        if self._thread.is_alive():
+            self._queue.put((None, self._STOP))
+            self._thread.join(timeout)
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        while len(batch) < self._batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except Queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        running = True
+        while running:
+            records_by_handlers = {}
+            for handlers, record in self._next_batch():
+                if record is self._STOP:
+                    running = False
+                    continue
+                records_by_handlers.setdefault(handlers, []).append(record)
+
+            for handlers, records in records_by_handlers.iteritems():
+                self._report_dropped(handlers, records)
+                for handler in handlers:
+                    _write_batch(handler, records)
+
+    def _report_dropped(self, handlers, records):
+        with self._dropped_lock:
+            dropped = self.dropped
+        if dropped != self._reported_dropped:
+            record = logging.LogRecord(
+                records[0].name, logging.WARNING, __file__, 0,
+                '%d log records dropped, log queue full', (dropped - self._reported_dropped,),
+                None)
+            record.__dict__.update(dict((key, getattr(records[0], key, ''))
+                                        for key in ('env', 'service', 'handler', 'requestId',
+                                                    'details')))
+            records.append(record)
+            self._reported_dropped = dropped
+
+
+class AsyncLogHandler(logging.Handler):
+    """
+    Handler queueing records to be written by target handlers in the
+    LogPipeline writer thread, like logging.handlers.QueueHandler
+    """
+
+    def __init__(self, pipeline, handlers, level=logging.NOTSET):
+        super(AsyncLogHandler, self).__init__(level)
+        self._pipeline = pipeline
+        self._handlers = tuple(handlers)
+
+    @staticmethod
+    def prepare(record):
+        """
+        Render the message and the exception now, arguments may be mutated
+        before the writer thread gets to them
+        """
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            self._pipeline.put(self._handlers, self.prepare(record))
+        except Exception:  # pylint: disable=W0703
+            self.handleError(record)
+
+    def close(self):
+        for handler in self._handlers:
+            handler.close()
+        super(AsyncLogHandler, self).close()
+
+
+def _write_batch(handler, records):
+    """
+    Write records with a single write and flush for stream handlers
+    """
+    records = [record for record in records
+               if record.levelno >= handler.level and handler.filter(record)]
+    if not records:
+        return
+
+    if not isinstance(handler, logging.StreamHandler):
+        for record in records:
+            handler.handle(record)
+        return
+
+    handler.acquire()
+    try:
+        if handler.stream is None:
+            handler.stream = handler._open()  # pylint: disable=protected-access
+        try:
+            handler.stream.write(''.join(handler.format(record) + '\n' for record in records))
+        except UnicodeError:
+            for record in records:
+                handler.emit(record)
+        handler.flush()
+    except Exception:  # pylint: disable=W0703
+        handler.handleError(records[0])
+    finally:
+        handler.release()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line, including the extra fields
+    Support adds to every record
+    """
+
+    FIELDS = ('env', 'service', 'handler', 'requestId', 'app', 'account',
+              'user', 'device')
+
+    def format(self, record):
+        data = {
+            'time': datetime.datetime.utcfromtimestamp(record.created).isoformat() + 'Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.thread,
+            'message': record.getMessage(),
+        }
+        for field in self.FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+_PIPELINE = None
+
+
+def install(logger_names, queue_size=10000, overflow=DROP, batch_size=512):
+    """
+    Move the handlers configured for the given loggers behind a shared
+    LogPipeline, so logging calls only enqueue the records
+    """
+    global _PIPELINE  # pylint: disable=global-statement
+
+    # The writer thread does not survive a fork
+    if _PIPELINE is None or not _PIPELINE.is_alive():
+        _PIPELINE = LogPipeline(queue_size, overflow, batch_size)
+        atexit.register(_PIPELINE.close)
+
+    for logger_name in logger_names:
+        logger = logging.getLogger(logger_name)
+        handlers = [handler for handler in logger.handlers
+                    if not isinstance(handler, AsyncLogHandler)]
+        if handlers:
+            logger.handlers = [AsyncLogHandler(_PIPELINE, handlers)]
+
+    return _PIPELINE
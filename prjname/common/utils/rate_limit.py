@@ -0,0 +1,109 @@
+"""
+Token bucket rate limiting. Buckets live in this process (LocalBucketStore)
+or in shared memory (SharedBucketStore) so the limits hold across the worker
+processes forked from the same parent.
+"""
+import hashlib
+import mmap
+import multiprocessing
+import struct
+import time
+
+from prjname.common.utils import caches
+
+
+def consume(tokens, updated_at, now, rate, burst, cost=1):
+    """
+    Refill a bucket holding tokens at updated_at and take cost tokens.
+    Return (allowed, tokens left, seconds until cost tokens are available).
+    A bucket with a rate of 0 is never refilled.
+    """
+    rate = float(rate)
+    tokens = min(float(burst), tokens + max(0.0, now - updated_at) * rate)
+    if tokens >= cost:
+        return True, tokens - cost, 0.0
+    return False, tokens, (cost - tokens) / rate if rate else float('inf')
+
+
+class LocalBucketStore(object):
+    """
+    Buckets of this process. Idle buckets are full so they are simply
+    dropped when there are more than maxsize.
+    """
+
+    def __init__(self, maxsize=100000, idle_ttl=3600):
+        self._buckets = caches.TTLCache(maxsize, idle_ttl)
+
+    def consume(self, key, rate, burst, cost=1, now=None):
+        now = now if now is not None else time.time()
+        tokens, updated_at = self._buckets.get(key, (float(burst), now))
+        allowed, tokens, retry_after = consume(tokens, updated_at, now, rate, burst, cost)
+        self._buckets.set(key, (tokens, now))
+        return allowed, retry_after
+
+
+class SharedBucketStore(object):
+    """
+    Buckets in an anonymous shared memory map. It has to be created before
+    forking the worker processes, which then share it. Every slot holds a
+    key hash, tokens and last update time; keys are placed by open
+    addressing and, when the probed slots are taken, the least recently
+    updated one is reused.
+    """
+
+    SLOT = struct.Struct('=Qdd')
+    PROBES = 8
+
+    def __init__(self, slots=65536):
+        self._slots = slots
+        self._memory = mmap.mmap(-1, slots * self.SLOT.size)
+        self._lock = multiprocessing.Lock()
+
+    @staticmethod
+    def _hash(key):
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        # 0 marks empty slots
+        return struct.unpack('=Q', hashlib.md5(key).digest()[:8])[0] or 1
+
+    def _find_slot(self, key_hash):
+        """
+        Return (offset, stored key hash, tokens, updated at) of the slot for key_hash
+        """
+        oldest = None
+        for probe in range(self.PROBES):
+            offset = ((key_hash + probe) % self._slots) * self.SLOT.size
+            slot_hash, tokens, updated_at = self.SLOT.unpack_from(self._memory, offset)
+            if slot_hash == key_hash or slot_hash == 0:
+                return offset, slot_hash, tokens, updated_at
+            if oldest is None or updated_at < oldest[3]:
+                oldest = (offset, slot_hash, tokens, updated_at)
+        return oldest
+
+    def consume(self, key, rate, burst, cost=1, now=None):
+        now = now if now is not None else time.time()
+        key_hash = self._hash(key)
+        with self._lock:
+            offset, slot_hash, tokens, updated_at = self._find_slot(key_hash)
+            if slot_hash != key_hash:
+                tokens, updated_at = float(burst), now
+            allowed, tokens, retry_after = consume(tokens, updated_at, now, rate, burst, cost)
+            self.SLOT.pack_into(self._memory, offset, key_hash, tokens, now)
+        return allowed, retry_after
+
+
+_SHARED_STORE = None
+
+
+def install_shared_store(slots=65536):
+    """
+    Create the shared bucket store. Call it before forking worker processes.
+    """
+    global _SHARED_STORE  # pylint: disable=global-statement
+    if _SHARED_STORE is None:
+        _SHARED_STORE = SharedBucketStore(slots)
+    return _SHARED_STORE
+
+
+def get_shared_store():
+    return _SHARED_STORE
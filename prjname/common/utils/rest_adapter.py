@@ -2,14 +2,26 @@
 Asynchronous REST Adapter
 """
 import json
+import Queue
+import re
+import time
 import urllib
+import urlparse
 
 from tornado import gen
 from tornado import httpclient
 
 from prjname.common import constants
+from prjname.common import exceptions
+from prjname.common import settings
+from prjname.common.utils import compression
+from prjname.common.utils import decoders
 from prjname.common.utils import enable_curl_rest_adapter
 from prjname.common.utils import dictionaries
+from prjname.common.utils import executors
+from prjname.common.utils import latency
+from prjname.common.utils import resource_normalizer
+from prjname.common.utils.support import truncated
 
 
 class RestAdapter(object):
@@ -21,7 +33,31 @@ class RestAdapter(object):
 
     # pylint: disable=too-many-arguments
     def __init__(self, endpoint, context, support, validate_certs=None, certs=None,
-                 use_system_proxies=False):
+                 use_system_proxies=False, connect_timeout=None,
+                 adaptive_timeout=None, accept_compressed=None,
+                 compress_requests=None, decode_responses=None,
+                 decoder_registry=None, incremental_decoding=None,
+                 offload_decoding=None):
+        """
+        connect_timeout: seconds to establish the connection, when None the
+            request timeout is used as before.
+        adaptive_timeout: derive request timeouts from the observed latency
+            percentiles of each path template. Defaults to
+            settings.REST_ADAPTIVE_TIMEOUT.
+        accept_compressed: send Accept-Encoding and transparently decompress
+            responses. Defaults to settings.REST_ACCEPT_COMPRESSED.
+        compress_requests: compress request bodies bigger than
+            settings.REST_COMPRESS_MIN_SIZE with settings.REST_REQUEST_ENCODING.
+            Defaults to settings.REST_COMPRESS_REQUESTS.
+        decode_responses: return response bodies decoded by the decoder
+            registered in decoder_registry for their Content-Type instead of
+            raw bytes. Defaults to settings.REST_DECODE_RESPONSES.
+        incremental_decoding: parse big bodies in a worker thread while they
+            are being received. Defaults to settings.REST_INCREMENTAL_DECODING.
+        offload_decoding: decode bodies of at least
+            settings.REST_DECODE_OFFLOAD_MIN_SIZE bytes in a worker thread.
+            Defaults to settings.REST_OFFLOAD_DECODING.
+        """
         self._http_client = httpclient.AsyncHTTPClient()
 
         self._endpoint = endpoint.rstrip('/')
@@ -31,66 +67,182 @@ class RestAdapter(object):
         self._use_system_proxies = use_system_proxies
         self._support = support
         self._request_id = context.request_id if context else None
+        self.deadline = getattr(context, 'deadline', None)
+        self._connect_timeout = connect_timeout
+        self._adaptive_timeout = (adaptive_timeout if adaptive_timeout is not None
+                                  else settings.REST_ADAPTIVE_TIMEOUT)
+        self._accept_compressed = (accept_compressed if accept_compressed is not None
+                                   else settings.REST_ACCEPT_COMPRESSED)
+        self._compress_requests = (compress_requests if compress_requests is not None
+                                   else settings.REST_COMPRESS_REQUESTS)
+        self._decode_responses = (decode_responses if decode_responses is not None
+                                  else settings.REST_DECODE_RESPONSES)
+        self._incremental_decoding = (incremental_decoding if incremental_decoding is not None
+                                      else settings.REST_INCREMENTAL_DECODING)
+        self._offload_decoding = (offload_decoding if offload_decoding is not None
+                                  else settings.REST_OFFLOAD_DECODING)
+        self.decoder_registry = decoder_registry or decoders.DEFAULT_REGISTRY
+        self._stat_prefix = 'rest.' + _stat_name(urlparse.urlparse(self._endpoint).netloc)
 
     @gen.coroutine
-    def post(self, path=None, headers=None, body=None, timeout=None):
+    # pylint: disable=R0913
+    def post(self, path=None, headers=None, body=None, timeout=None,
+             path_template=None, streaming_callback=None,
+             normalization_rules=None):
         """
         Send a http POST request
         """
 
         response_code, response_body = yield self._request('POST', path, None,
                                                            headers, body,
-                                                           timeout)
+                                                           timeout,
+                                                           path_template,
+                                                           streaming_callback,
+                                                           normalization_rules)
         raise gen.Return((response_code, response_body))
 
     @gen.coroutine
-    def get(self, path=None, query=None, headers=None, timeout=None):
+    # pylint: disable=R0913
+    def get(self, path=None, query=None, headers=None, timeout=None,
+            path_template=None, streaming_callback=None,
+            normalization_rules=None):
         """
         Send a http GET request
         """
 
         response_code, response_body = yield self._request('GET', path, query,
                                                            headers, None,
-                                                           timeout)
+                                                           timeout,
+                                                           path_template,
+                                                           streaming_callback,
+                                                           normalization_rules)
         raise gen.Return((response_code, response_body))
 
     @gen.coroutine
     # pylint: disable=R0913
     def put(self, path=None, query=None, headers=None, body=None,
-            timeout=None):
+            timeout=None, path_template=None, streaming_callback=None,
+            normalization_rules=None):
         """
         Send a http PUT request
         """
 
         response_code, response_body = yield self._request('PUT', path, query,
                                                            headers, body,
-                                                           timeout)
+                                                           timeout,
+                                                           path_template,
+                                                           streaming_callback,
+                                                           normalization_rules)
         raise gen.Return((response_code, response_body))
 
     @gen.coroutine
-    def delete(self, path=None, query=None, headers=None, timeout=None):
+    # pylint: disable=R0913
+    def delete(self, path=None, query=None, headers=None, timeout=None,
+               path_template=None, streaming_callback=None,
+               normalization_rules=None):
         """
         Send a http DELETE request
         """
 
         response_code, response_body = yield self._request('DELETE', path,
                                                            query, headers,
-                                                           None, timeout)
+                                                           None, timeout,
+                                                           path_template,
+                                                           streaming_callback,
+                                                           normalization_rules)
         raise gen.Return((response_code, response_body))
 
+    def _adapt_timeout(self, histogram, timeout):
+        """
+        Return the request timeout to use, derived from the latency
+        percentiles observed for this path template when adaptive timeouts
+        are enabled. An explicit timeout is always used as upper bound.
+        """
+        if not self._adaptive_timeout:
+            return timeout
+
+        if histogram.count < int(settings.REST_ADAPTIVE_TIMEOUT_MIN_SAMPLES):
+            return timeout
+
+        observed = histogram.percentile(
+            float(settings.REST_ADAPTIVE_TIMEOUT_PERCENTILE)) / 1000.0
+        adapted = observed * float(settings.REST_ADAPTIVE_TIMEOUT_FACTOR)
+        adapted = max(adapted, float(settings.REST_ADAPTIVE_TIMEOUT_MIN))
+        adapted = min(adapted, float(settings.REST_ADAPTIVE_TIMEOUT_MAX))
+
+        return min(adapted, timeout) if timeout is not None else adapted
+
+    def _record_latency(self, method, path_template, response_code, elapsed_ms):
+        # Timeouts only tell the latency was above the timeout, they would
+        # drag the percentiles adaptive timeouts are derived from to it
+        if response_code != 599:
+            latency.REGISTRY.histogram(self._endpoint).record(elapsed_ms)
+            if path_template:
+                latency.REGISTRY.histogram(self._endpoint, path_template).record(elapsed_ms)
+
+        if self._support:
+            self._support.stat_timing(self._stat_prefix + '.time', elapsed_ms)
+            self._support.stat_timing('%s.%s.%s.time' % (
+                self._stat_prefix, method,
+                _stat_name(path_template) if path_template else 'all'), elapsed_ms)
+
     def _get_system_proxies(self):
         return (
             enable_curl_rest_adapter.PROXY if self._use_system_proxies else {})
 
+    def _compress_body(self, body, headers):
+        """
+        Compress the request body when it is worth it
+        """
+        if (not self._compress_requests or not body or
+                'Content-Encoding' in headers or
+                len(body) < int(settings.REST_COMPRESS_MIN_SIZE)):
+            return body
+
+        encoding = settings.REST_REQUEST_ENCODING
+        start_time = time.time()
+        compressed = compression.compress(body, encoding,
+                                          int(settings.REST_COMPRESS_LEVEL))
+        self._report_compression('compress', len(body), len(compressed),
+                                 (time.time() - start_time) * 1000.0)
+
+        headers['Content-Encoding'] = encoding
+        return compressed
+
+    def _report_compression(self, operation, original_size, compressed_size,
+                            elapsed_ms):
+        if not self._support:
+            return
+
+        self._support.stat_timing('%s.%s.time' % (self._stat_prefix, operation),
+                                  elapsed_ms)
+        self._support.stat_increment('%s.%s.original_bytes' % (self._stat_prefix, operation),
+                                     original_size)
+        self._support.stat_increment('%s.%s.compressed_bytes' % (self._stat_prefix, operation),
+                                     compressed_size)
+        self._support.notify_debug(
+            self.LOG_TAG % '%s: %d -> %d bytes (ratio %.2f) in %.2f ms',
+            operation, original_size, compressed_size,
+            float(original_size) / compressed_size if compressed_size else 0,
+            elapsed_ms)
+
     # pylint: disable=no-self-use
     def _create_request(self, *args, **kwargs):
         return httpclient.HTTPRequest(*args, **kwargs)
 
     @gen.coroutine
     # pylint: disable=R0913
-    def _request(self, method, path, query, headers, body, timeout):
+    def _request(self, method, path, query, headers, body, timeout,
+                 path_template=None, streaming_callback=None,
+                 normalization_rules=None):
         """
         Send a http request
+        path_template identifies the route (e.g. '/users/{id}') to keep
+        latency histograms and stats with bounded cardinality.
+        streaming_callback receives the (decompressed) response body in
+        chunks instead of getting it in the returned response body.
+        normalization_rules are applied to decoded bodies with
+        resource_normalizer.normalize_response.
         """
 
         if not headers:
@@ -99,37 +251,300 @@ class RestAdapter(object):
         if self._request_id:
             headers[constants.REQUEST_ID_HTTP_HEADER] = self._request_id
 
+        if self.deadline:
+            self.deadline.check(self.LOG_TAG % ('request: %s %s' % (method, path)))
+
         url = self._endpoint
         if path is not None:
             url = ('%s%s' % (url, path)).rstrip('/')
         if query is not None:
             url = ('%s?%s' % (url, urllib.urlencode(query)))
 
+        histogram = latency.REGISTRY.histogram(self._endpoint, path_template)
+        request_timeout = self._adapt_timeout(histogram, timeout)
+        if self.deadline:
+            request_timeout = self.deadline.timeout(request_timeout)
+            if self.deadline.bounded:
+                headers[constants.REQUEST_TIMEOUT_HTTP_HEADER] = self.deadline.header_value()
+        connect_timeout = (self._connect_timeout if self._connect_timeout is not None
+                           else request_timeout)
+        if connect_timeout is not None and request_timeout is not None:
+            connect_timeout = min(connect_timeout, request_timeout)
+
+        if self._support:
+            self._support.notify_debug(
+                self.LOG_TAG % 'request: %s %s', method, path)
+            self._support.notify_debug(
+                self.LOG_TAG % 'request body: %s', truncated(body))
+
+        body = self._compress_body(body, headers)
+
+        request_options = dict(self._get_system_proxies())
+        reader = _ResponseReader(self, streaming_callback,
+                                 decompress=self._accept_compressed,
+                                 decode=self._decode_responses)
+        if self._accept_compressed:
+            headers.setdefault('Accept-Encoding',
+                               compression.accept_encoding_header())
+            request_options['decompress_response'] = False
+        if self._accept_compressed or self._decode_responses:
+            request_options['header_callback'] = reader.header_line
+        if streaming_callback or (self._decode_responses and self._incremental_decoding):
+            request_options['streaming_callback'] = reader.feed
+
         request = self._create_request(url=url,
                                        method=method,
                                        headers=headers,
                                        body=body,
-                                       connect_timeout=timeout,
-                                       request_timeout=timeout,
+                                       connect_timeout=connect_timeout,
+                                       request_timeout=request_timeout,
                                        validate_cert=self._validate_certs,
                                        ca_certs=self._certs,
-                                       **self._get_system_proxies())
+                                       **request_options)
+
+        start_time = time.time()
+        try:
+            try:
+                response = yield self._http_client.fetch(request,
+                                                         raise_error=False)
+            except httpclient.HTTPError as ex:
+                response = dictionaries.DictAsObject(
+                    code=ex.code,
+                    body=json.dumps({"message": ex.message}))
+            response_code = response.code
+            response_body = response.body
+
+            self._record_latency(method, path_template, response_code,
+                                 (time.time() - start_time) * 1000.0)
 
+            if response_code != 599 and (request_options.get('header_callback') or
+                                         request_options.get('streaming_callback')):
+                try:
+                    response_body = yield reader.finish(response)
+                except Exception as ex:  # pylint: disable=W0703
+                    raise exceptions.ExternalProviderBadResponse(
+                        'Could not decode response from %s: %s' % (url, ex))
+
+                if normalization_rules is not None and reader.decoded:
+                    response_body = resource_normalizer.normalize_response(
+                        response_body, normalization_rules)
+        finally:
+            # Never leave a decoders thread waiting for chunks
+            reader.abort()
+
+        raise gen.Return((response_code, response_body))
+
+    @gen.coroutine
+    def _decode(self, decoder, body):
+        """
+        Decode a complete body, in the decoders thread pool when it is big
+        """
+        start_time = time.time()
+        if self._offload_decoding and len(body) >= int(settings.REST_DECODE_OFFLOAD_MIN_SIZE):
+            result = yield executors.get_executor('decoders').submit(decoder.decode, body)
+        else:
+            result = decoder.decode(body)
+        self._report_decoding(len(body), (time.time() - start_time) * 1000.0)
+        raise gen.Return(result)
+
+    def _decode_stream(self, decoder):
+        """
+        Start decoding a body while it is being received.
+        Return the incremental decoding that has to be fed with the chunks.
+        """
+        return _IncrementalDecoding(decoder, executors.get_executor('decoders'))
+
+    def _report_decoding(self, size, elapsed_ms):
         if self._support:
-            self._support.notify_debug(
-                self.LOG_TAG % ('request: %s %s' % (method, path)))
-            self._support.notify_debug(
-                self.LOG_TAG % ('request body: %s' % body))
+            self._support.stat_timing(self._stat_prefix + '.decode.time', elapsed_ms)
+            self._support.stat_increment(self._stat_prefix + '.decode.bytes', size)
+
+
+class _ResponseReader(object):  # pylint: disable=too-many-instance-attributes
+    """
+    Reads a response body as a whole or in chunks, transparently
+    decompressing it and decoding it according to its Content-Type.
+    Chunks are passed to the caller streaming callback when there is one.
+    """
+
+    def __init__(self, adapter, streaming_callback=None, decompress=False,
+                 decode=False):
+        self._adapter = adapter
+        self._streaming_callback = streaming_callback
+        self._decompress_enabled = decompress
+        self._decode_enabled = decode and not streaming_callback
+        self._encoding = None
+        self._content_type = None
+        self._content_length = None
+        self._decompressor = None
+        self._compressed_size = 0
+        self._original_size = 0
+        self._elapsed_ms = 0.0
+        self._chunks = []
+        self._incremental = None
+        self._streamed = False
+        self._code = None
+        self.decoded = False
+
+    def header_line(self, line):
+        if line.startswith('HTTP/'):
+            # A new response starts (redirects, 100-continue)
+            try:
+                self._code = int(line.split()[1])
+            except (IndexError, ValueError):
+                self._code = None
+            self._encoding = None
+            self._content_type = None
+            self._content_length = None
+            self._decompressor = None
+            return
+
+        name, _, value = line.partition(':')
+        name = name.strip().lower()
+        if name == 'content-encoding':
+            self._encoding = value.strip().lower()
+        elif name == 'content-type':
+            self._content_type = value.strip()
+        elif name == 'content-length':
+            try:
+                self._content_length = int(value.strip())
+            except ValueError:
+                pass
+
+    def _get_decompressor(self):
+        if self._decompressor is None:
+            encoding = (self._encoding if (self._decompress_enabled and
+                                           compression.Decompressor.is_supported(self._encoding))
+                        else compression.IDENTITY)
+            self._decompressor = compression.Decompressor(encoding)
+        return self._decompressor
 
+    def _decompress(self, chunk, final=False):
+        decompressor = self._get_decompressor()
+        if decompressor.encoding == compression.IDENTITY:
+            return chunk
+
+        start_time = time.time()
         try:
-            response = yield self._http_client.fetch(request,
-                                                     raise_error=False)
-        except httpclient.HTTPError as ex:
-            response = dictionaries.DictAsObject(
-                code=ex.code,
-                body=json.dumps({"message": ex.message}))
+            data = decompressor.decompress(chunk)
+            if final:
+                data += decompressor.flush()
+        except Exception as ex:  # pylint: disable=W0703
+            raise ValueError('invalid %s content: %s' % (decompressor.encoding, ex))
+        self._elapsed_ms += (time.time() - start_time) * 1000.0
+        self._compressed_size += len(chunk)
+        self._original_size += len(data)
+        return data
 
-        response_code = response.code
-        response_body = response.body
+    def _deliver(self, data):
+        if not data:
+            return
 
-        raise gen.Return((response_code, response_body))
+        if self._streaming_callback:
+            self._streaming_callback(data)
+            return
+
+        # Error bodies are kept whole, they are returned as they are when
+        # they cannot be decoded
+        if (self._incremental is None and not self._chunks and self._decode_enabled and
+                _successful(self._code)):
+            decoder = self._adapter.decoder_registry.get_decoder(self._content_type)
+            big_body = (self._content_length is None or
+                        self._content_length >= int(settings.REST_DECODE_OFFLOAD_MIN_SIZE))
+            if decoder is not None and big_body:
+                self._incremental = self._adapter._decode_stream(decoder)  # pylint: disable=W0212
+
+        if self._incremental is not None:
+            self._incremental.feed(data)
+        else:
+            self._chunks.append(data)
+
+    def feed(self, chunk):
+        self._streamed = True
+        self._deliver(self._decompress(chunk))
+
+    def abort(self):
+        if self._incremental is not None:
+            self._incremental.close()
+
+    @gen.coroutine
+    def finish(self, response):
+        """
+        Return the response body, decoded when there is a decoder for it
+        """
+        if self._content_type is None:
+            self._content_type = (getattr(response, 'headers', None) or {}).get(
+                'Content-Type')
+        if self._encoding is None:
+            self._encoding = (getattr(response, 'headers', None) or {}).get(
+                'Content-Encoding')
+
+        if self._streamed:
+            self._deliver(self._decompress(b'', final=True))
+        else:
+            self._deliver(self._decompress(response.body or b'', final=True))
+
+        if self._get_decompressor().encoding != compression.IDENTITY:
+            self._adapter._report_compression(  # pylint: disable=protected-access
+                'decompress', self._original_size, self._compressed_size,
+                self._elapsed_ms)
+
+        if self._streaming_callback:
+            raise gen.Return(response.body)
+
+        if self._incremental is not None:
+            start_time = time.time()
+            body = yield self._incremental.close()
+            self._adapter._report_decoding(  # pylint: disable=protected-access
+                self._incremental.size, (time.time() - start_time) * 1000.0)
+            self.decoded = True
+            raise gen.Return(body)
+
+        body = b''.join(self._chunks)
+        decoder = (self._adapter.decoder_registry.get_decoder(self._content_type)
+                   if self._decode_enabled and body else None)
+        if decoder is not None:
+            try:
+                body = yield self._adapter._decode(decoder, body)  # pylint: disable=W0212
+                self.decoded = True
+            except Exception:  # pylint: disable=W0703
+                if _successful(response.code):
+                    raise
+        raise gen.Return(body)
+
+
+class _IncrementalDecoding(object):
+    """
+    Decodes a body in a worker thread while its chunks are being received
+    """
+
+    def __init__(self, decoder, executor):
+        self._chunks = Queue.Queue()
+        self._closed = False
+        self.size = 0
+        self.future = executor.submit(decoder.decode_stream,
+                                      iter(self._chunks.get, None))
+
+    def feed(self, chunk):
+        self.size += len(chunk)
+        self._chunks.put(chunk)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._chunks.put(None)
+        return self.future
+
+
+def _successful(code):
+    """
+    Whether code is a 2xx status code, unknown ones are taken as successful
+    """
+    return code is None or 200 <= code < 300
+
+
+def _stat_name(value):
+    """
+    Build a statsd friendly name from a host or path template
+    """
+    return re.sub(r'[^A-Za-z0-9_-]+', '_', value).strip('_') or 'root'
@@ -0,0 +1,94 @@
+"""
+Retry policy helpers: jittered backoff delays and retry budgets
+"""
+import random
+import time
+
+from prjname.common import settings
+
+JITTERS = (FULL_JITTER, DECORRELATED_JITTER, NO_JITTER) = ('full', 'decorrelated', 'none')
+
+
+def backoff_delays(delay, backoff=2, max_delay=None, jitter=FULL_JITTER):
+    """
+    Infinite generator of the seconds to wait before each retry.
+    - full: random between 0 and the exponential delay
+    - decorrelated: random between delay and 3 times the previous wait
+    - none: the exponential delay itself
+    Waits are capped by max_delay.
+    """
+    if jitter not in JITTERS:
+        raise ValueError('jitter must be one of %s' % (JITTERS,))
+
+    exponential_delay = delay
+    previous_delay = delay
+    while True:
+        if jitter == FULL_JITTER:
+            wait = random.uniform(0, exponential_delay)
+        elif jitter == DECORRELATED_JITTER:
+            wait = random.uniform(delay, previous_delay * 3)
+        else:
+            wait = exponential_delay
+
+        if max_delay is not None:
+            wait = min(wait, max_delay)
+        previous_delay = max(wait, delay)
+        exponential_delay *= backoff
+        yield wait
+
+
+class RetryBudget(object):
+    """
+    Limits retries to a ratio of the calls made to a target, so a failing
+    target does not get retry waves on top of the normal traffic. Every
+    call deposits ratio tokens (up to ratio * window_calls) and every retry
+    takes one; min_retries_per_second are always allowed.
+    """
+
+    def __init__(self, ratio=0.1, min_retries_per_second=1.0, window_calls=1000):
+        self._ratio = ratio
+        self._max_tokens = max(1.0, ratio * window_calls)
+        self._tokens = 0.0
+        self._min_retries_per_second = min_retries_per_second
+        # At least one free retry can be saved up, less than one per second
+        # still means one now and then
+        self._max_free_retries = max(1.0, min_retries_per_second) if min_retries_per_second > 0 else 0.0
+        self._free_retries = self._max_free_retries
+        self._free_retries_at = time.time()
+
+    def record_call(self):
+        self._tokens = min(self._max_tokens, self._tokens + self._ratio)
+
+    def try_retry(self):
+        """
+        Take a retry from the budget, False when there is none left
+        """
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+
+        now = time.time()
+        self._free_retries = min(
+            self._max_free_retries,
+            self._free_retries + (now - self._free_retries_at) * self._min_retries_per_second)
+        self._free_retries_at = now
+        if self._free_retries >= 1:
+            self._free_retries -= 1
+            return True
+        return False
+
+
+_BUDGETS = {}
+
+
+def get_budget(target, ratio=None, min_retries_per_second=None):
+    """
+    Retry budget shared by everything retrying calls to target
+    """
+    budget = _BUDGETS.get(target)
+    if budget is None:
+        budget = _BUDGETS[target] = RetryBudget(
+            float(ratio if ratio is not None else settings.RETRY_BUDGET_RATIO),
+            float(min_retries_per_second if min_retries_per_second is not None
+                  else settings.RETRY_BUDGET_MIN_PER_SECOND))
+    return budget
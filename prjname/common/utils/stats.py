@@ -0,0 +1,167 @@
+"""
+Client side aggregated statsd client
+"""
+import random
+import socket
+
+from tornado import ioloop
+
+from prjname.common.utils.hyperloglog import HyperLogLog
+
+
+class AggregatingStatsClient(object):  # pylint: disable=too-many-instance-attributes
+    """
+    statsd.StatsClient compatible client that aggregates metrics in process
+    and sends them every flush_interval seconds in multi-metric packets of at
+    most max_packet_size bytes:
+    - counters and delta gauges are summed, gauges keep the last value.
+    - timings keep at most max_timing_samples per metric and interval
+      (reservoir sampling), sent with the resulting sample rate so the
+      sampling adapts to the traffic volume.
+    - sets are counted locally with HyperLogLog and the estimated number of
+      distinct values seen in the last set_window seconds is sent as the
+      <stat>.cardinality gauge, the set itself is not sent.
+    It must be used from the IOLoop thread.
+    """
+
+    # Fits in a 1500 bytes MTU after IP and UDP headers
+    DEFAULT_MAX_PACKET_SIZE = 1432
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, host='localhost', port=8125, prefix=None,
+                 flush_interval=1.0, max_packet_size=DEFAULT_MAX_PACKET_SIZE,
+                 max_timing_samples=100, set_window=60.0):
+        self._address = (socket.gethostbyname(host), port)
+        self._prefix = prefix
+        self._flush_interval = flush_interval
+        self._max_packet_size = max_packet_size
+        self._max_timing_samples = max_timing_samples
+        self._set_window = set_window
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+
+        self._counters = {}
+        self._gauges = {}
+        self._gauge_deltas = {}
+        self._timings = {}
+        self._timing_counts = {}
+        self._sets = {}
+        self._set_flushes = 0
+
+        self.dropped_packets = 0
+        self._periodic_flush = None
+
+    def start(self):
+        """
+        Start flushing periodically on the current IOLoop
+        """
+        if self._periodic_flush is None:
+            self._periodic_flush = ioloop.PeriodicCallback(
+                self.flush, self._flush_interval * 1000)
+            self._periodic_flush.start()
+
+    def stop(self):
+        if self._periodic_flush is not None:
+            self._periodic_flush.stop()
+            self._periodic_flush = None
+        self.flush()
+
+    # statsd.StatsClient interface
+
+    def incr(self, stat, count=1, rate=1):  # pylint: disable=unused-argument
+        self._counters[stat] = self._counters.get(stat, 0) + count
+
+    def decr(self, stat, count=1, rate=1):
+        self.incr(stat, -count, rate)
+
+    def gauge(self, stat, value, rate=1, delta=False):  # pylint: disable=unused-argument
+        if delta:
+            self._gauge_deltas[stat] = self._gauge_deltas.get(stat, 0) + value
+        else:
+            self._gauges[stat] = value
+            self._gauge_deltas.pop(stat, None)
+
+    def set(self, stat, value, rate=1):  # pylint: disable=unused-argument
+        estimator = self._sets.get(stat)
+        if estimator is None:
+            estimator = self._sets[stat] = HyperLogLog()
+        estimator.add(value)
+
+    def timing(self, stat, delta, rate=1):  # pylint: disable=unused-argument
+        seen = self._timing_counts.get(stat, 0) + 1
+        self._timing_counts[stat] = seen
+
+        samples = self._timings.get(stat)
+        if samples is None:
+            samples = self._timings[stat] = []
+
+        if len(samples) < self._max_timing_samples:
+            samples.append(delta)
+        else:
+            index = random.randint(0, seen - 1)
+            if index < self._max_timing_samples:
+                samples[index] = delta
+
+    # Flushing
+
+    def _name(self, stat):
+        return '%s.%s' % (self._prefix, stat) if self._prefix else stat
+
+    def _collect(self):
+        lines = []
+
+        for stat, value in self._counters.iteritems():
+            lines.append('%s:%s|c' % (self._name(stat), value))
+
+        for stat, value in self._gauges.iteritems():
+            lines.append('%s:%s|g' % (self._name(stat), value))
+        for stat, value in self._gauge_deltas.iteritems():
+            lines.append('%s:%+g|g' % (self._name(stat), value))
+
+        for stat, samples in self._timings.iteritems():
+            rate = float(len(samples)) / self._timing_counts[stat]
+            suffix = '|ms|@%.4f' % rate if rate < 1 else '|ms'
+            name = self._name(stat)
+            lines.extend('%s:%0.6f%s' % (name, sample, suffix) for sample in samples)
+
+        for stat, estimator in self._sets.iteritems():
+            # A new name: statsd would count the estimate as a set member
+            lines.append('%s.cardinality:%d|g' % (self._name(stat), estimator.cardinality()))
+
+        self._counters = {}
+        self._gauges = {}
+        self._gauge_deltas = {}
+        self._timings = {}
+        self._timing_counts = {}
+
+        self._set_flushes += 1
+        if self._set_flushes * self._flush_interval >= self._set_window:
+            self._sets = {}
+            self._set_flushes = 0
+
+        return lines
+
+    def _packets(self, lines):
+        packet = []
+        size = 0
+        for line in lines:
+            line_size = len(line) + (1 if packet else 0)
+            if packet and size + line_size > self._max_packet_size:
+                yield '\n'.join(packet)
+                packet = []
+                line_size = len(line)
+                size = 0
+            packet.append(line)
+            size += line_size
+        if packet:
+            yield '\n'.join(packet)
+
+    def flush(self):
+        """
+        Send everything aggregated since the last flush
+        """
+        for packet in self._packets(self._collect()):
+            try:
+                self._socket.sendto(packet.encode('ascii'), self._address)
+            except socket.error:
+                self.dropped_packets += 1
@@ -1,96 +1,135 @@
 """
 Generic (domain agnostic) stuff to support application
 """
-import Queue
-import statsd
+import collections
+import logging
+import random
+import time
 
 from prjname.common import constants
 from prjname.common import settings
+from prjname.common.utils import bootstrap
 
 
 class Support(object):
     """
-    Class used to notify events useful to support the application
+    Class used to notify events useful to support the application.
+    It is created for every request so it only holds request data, logging
+    configuration and the stats client are shared by the whole process
+    (see bootstrap).
     """
 
-    def __init__(self, logger, session_info=None):
+    def __init__(self, logger, session_info=None, stats_client=None):
         """
         Initialize instance with a logger to be used, info related to the request and info related to
-        the service
+        the service. When stats_client is not given the process one is used.
         """
 
-        self._logger = logger
+        process_context = bootstrap.get_process_context()
 
         if not session_info:
             session_info = {}
 
-        environment = session_info.get('environment')
-
         self._extra = {
-            'env': environment,
+            'env': session_info.get('environment'),
             'service': session_info.get('service'),
             'handler': session_info.get('handler'),
             'requestId': session_info.get('requestId', constants.NO_REQUEST_ID),
             'details': ''
         }
+        self._logger = logging.LoggerAdapter(logger, self._extra)
 
-        self._stats_enabled = settings.STATS_ENABLED
+        self._stats_client = (stats_client if stats_client is not None
+                              else process_context.stats_client)
+        self._stats_enabled = self._stats_client is not None
 
-        if self._stats_enabled:
-            self._stats_client = statsd.StatsClient(host=settings.STATS_SERVICE_HOSTNAME,
-                                                    port=8125, prefix='prjname.' + environment)
-        self._messages_queue = Queue.Queue()
-        self.log_entire_request = settings.LOG_LEVEL in ['CRITICAL', 'ERROR']
-
-    def _log_entire_request(self, log_method):
-        try:
-            while True:
-                message = self._messages_queue.get_nowait()
-                log_method(message, extra=self._extra)
-        except Queue.Empty:
-            pass
-
-    def notify_critical(self, message, details=None):
+        # Tail sampling: records below the logger level are kept in a ring
+        # buffer and only written if the request fails, is slow or sampled
+        self.log_entire_request = process_context.log_entire_request
+        self._tail_records = (collections.deque(maxlen=int(settings.LOG_TAIL_BUFFER_SIZE))
+                              if self.log_entire_request else None)
+        self._failed = False
+
+    def is_enabled_for(self, level):
+        """
+        Whether a message of the given logging level would be written
+        """
+        return self.log_entire_request or self._logger.isEnabledFor(level)
+
+    def notify_critical(self, message, *args, **kwargs):
         """Notify a critical event"""
 
-        self._extra['details'] = details if details else message
-        log_method = self._logger.critical
-        if self.log_entire_request:
-            self._log_entire_request(log_method)
-        log_method(message, extra=self._extra)
+        self._notify_failure(logging.CRITICAL, message, args, kwargs.get('details'))
 
-    def notify_error(self, message, details=None):
+    def notify_error(self, message, *args, **kwargs):
         """Notify an error event"""
 
-        self._extra['details'] = details if details else message
-        log_method = self._logger.error
-        if self.log_entire_request:
-            self._log_entire_request(log_method)
-        log_method(message, extra=self._extra)
+        self._notify_failure(logging.ERROR, message, args, kwargs.get('details'))
 
-    def notify_warning(self, message, details=None):
+    def notify_warning(self, message, *args, **kwargs):
         """Notify a warning event"""
 
-        self._extra['details'] = details if details else message
-        self._logger.warning(message, extra=self._extra)
-        if self.log_entire_request:
-            self._messages_queue.put_nowait(message)
+        self._notify(logging.WARNING, message, args, kwargs.get('details'))
 
-    def notify_info(self, message, details=None):
+    def notify_info(self, message, *args, **kwargs):
         """Notify an information event"""
 
-        self._extra['details'] = details if details else message
-        self._logger.info(message, extra=self._extra)
-        if self.log_entire_request:
-            self._messages_queue.put_nowait(message)
+        self._notify(logging.INFO, message, args, kwargs.get('details'))
+
+    def notify_debug(self, message, *args, **kwargs):
+        """
+        Notify a debug event.
+        message is only formatted with args (use LazyValue or truncated()
+        for expensive ones) if the message is going to be written.
+        """
+
+        self._notify(logging.DEBUG, message, args, kwargs.get('details'))
 
-    def notify_debug(self, message, details=None):
-        """Notify a debug event"""
+    def _notify(self, level, message, args, details):
+        args, details = _positional_details(message, args, details)
+        if self._logger.isEnabledFor(level):
+            self._extra['details'] = details or message
+            self._logger.log(level, message, *args)
+        elif self.log_entire_request:
+            self._tail_records.append((time.time(), level, message, args, details))
 
-        self._extra['details'] = details if details else message
-        self._logger.debug(message, extra=self._extra)
+    def _notify_failure(self, level, message, args, details):
+        args, details = _positional_details(message, args, details)
+        self._failed = True
         if self.log_entire_request:
-            self._messages_queue.put_nowait(message)
+            self._write_tail_records()
+        self._extra['details'] = details or message
+        self._logger.log(level, message, *args)
+
+    def _write_tail_records(self):
+        """
+        Write the buffered records with their original level and time
+        """
+        logger = self._logger.logger
+        while self._tail_records:
+            created, level, message, args, details = self._tail_records.popleft()
+            extra = dict(self._extra, details=details or message)
+            record = logger.makeRecord(logger.name, level, '(tail)', 0, message, args,
+                                       None, extra=extra)
+            record.created = created
+            record.msecs = (created - int(created)) * 1000
+            logger.handle(record)
+
+    def finish_request(self, status_code, request_time_ms):
+        """
+        Called when the request is done, writes the buffered records if it
+        failed, took more than settings.LOG_TAIL_LATENCY_THRESHOLD
+        milliseconds or was picked by settings.LOG_TAIL_SAMPLE_RATE
+        """
+        if not self.log_entire_request or not self._tail_records:
+            return
+
+        if (self._failed or status_code >= 500 or
+                request_time_ms >= float(settings.LOG_TAIL_LATENCY_THRESHOLD) or
+                random.random() < float(settings.LOG_TAIL_SAMPLE_RATE)):
+            self._write_tail_records()
+        else:
+            self._tail_records.clear()
 
     def stat_increment(self, stat, count=1, rate=1):
         if self._stats_enabled:
@@ -111,3 +150,49 @@ class Support(object):
     def stat_timing(self, stat, value, rate=1):
         if self._stats_enabled:
             self._stats_client.timing(stat, value, rate)
+
+
+class LazyValue(object):  # pylint: disable=too-few-public-methods
+    """
+    Log argument rendered by calling function(*args) only when the message
+    is actually formatted
+    """
+
+    def __init__(self, function, *args):
+        self._function = function
+        self._args = args
+
+    def __str__(self):
+        return str(self._function(*self._args))
+
+
+def _positional_details(message, args, details):
+    """
+    details used to be the second positional parameter of the notify
+    methods. A single argument is still taken as details when it can not be
+    a format argument: structured details (dict, list or tuple) or any
+    argument of a message that is not a string (e.g. an exception). Pass
+    details by keyword otherwise. Return (args, details).
+    """
+    if details is None and len(args) == 1 and (
+            isinstance(args[0], (dict, list, tuple)) or not isinstance(message, basestring)):
+        return (), args[0]
+    return args, details
+
+
+def _truncate(value, limit):
+    if value is None:
+        return value
+    text = value if isinstance(value, basestring) else str(value)
+    if len(text) <= limit:
+        return text
+    return '%s... (%d bytes)' % (text[:limit], len(text))
+
+
+def truncated(value, limit=None):
+    """
+    Log argument rendering at most limit (settings.LOG_BODY_MAX_LENGTH by
+    default) characters of value, only when the message is formatted
+    """
+    return LazyValue(_truncate, value,
+                     limit if limit is not None else int(settings.LOG_BODY_MAX_LENGTH))
@@ -0,0 +1,46 @@
+"""
+Warm-up hooks every service can use
+"""
+from tornado import gen
+
+from prjname.common import settings
+from prjname.common.tornado.handlers import health
+from prjname.common.utils import cassandra_adapter
+from prjname.common.utils import executors
+from prjname.common.warmup.hook import WarmupHook
+
+
+class CassandraWarmupHook(WarmupHook):
+    """
+    Connect the sessions of settings.WARMUP_CASSANDRA_KEYSPACES, adapters
+    created later reuse them
+    """
+    ORDER = 10
+
+    @gen.coroutine
+    def warm_up(self):
+        keyspaces = settings.WARMUP_CASSANDRA_KEYSPACES
+        if isinstance(keyspaces, basestring):
+            keyspaces = [keyspace for keyspace in keyspaces.split(',') if keyspace]
+        if not keyspaces:
+            return
+
+        # A single cluster for every keyspace, its sessions are the ones the
+        # adapters use afterwards
+        adapter = cassandra_adapter.CassandraAdapter(
+            contact_points=settings.CASSANDRA_HOSTS,
+            port=settings.CASSANDRA_PORT)
+        # Connecting blocks, do it off the IOLoop
+        yield [executors.get_executor().submit(adapter.connect, keyspace)
+               for keyspace in keyspaces]
+
+
+class HealthWarmupHook(WarmupHook):
+    """
+    Load the health plugins and get their first results
+    """
+    ORDER = 1000
+    REQUIRED = False
+
+    def warm_up(self):
+        return health.HEALTH_MONITOR.refresh()
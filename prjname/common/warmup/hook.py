@@ -0,0 +1,33 @@
+import abc
+import six
+
+
+@six.add_metaclass(abc.ABCMeta)  # pylint: disable=too-few-public-methods
+class WarmupHook(object):
+    """Base class for warm-up hooks
+    Warm-up hooks run when the service starts, before it reports itself
+    ready on /ready: connect sessions, prepare statements, preload hot keys.
+    To add a new hook you should use WarmupHook as your base class and
+    override the warm_up() method.
+    Then add to your setup.py a new entry_point to this class in the
+    'prjname.warmup' namespace
+        setuptools.setup(
+            .
+            entry_points={
+                'prjname.warmup': [
+                    'newWarmupHook = path.to.new.hook:NewWarmupHook',
+                ],
+            },
+        )
+    Hooks run one after the other sorted by ORDER. The service is not ready
+    until every REQUIRED hook succeeded.
+    """
+    ORDER = 100
+    REQUIRED = True
+
+    @abc.abstractmethod
+    def warm_up(self):
+        """Warm up the service/plugin/etc. this hook takes care of.
+        It may return a Future, an exception means the warm-up failed.
+        """
+        raise NotImplementedError()
@@ -0,0 +1,120 @@
+import datetime
+import time
+
+import stevedore
+
+from tornado import gen
+from tornado import ioloop
+
+from prjname.common import settings
+from prjname.common.utils import bootstrap
+from prjname.common.utils.support import Support
+
+WARMUP_STATES = (PENDING, WARMING, READY, FAILED) = ('PENDING', 'WARMING', 'READY', 'FAILED')
+
+
+class WarmupRunner(object):
+    """
+    Runs the warm-up hooks once, when the service starts, each one bounded
+    by timeout seconds. The service is ready when every required hook
+    succeeded; failed required hooks are run again every retry_interval
+    seconds.
+    """
+
+    LOG_TAG = '[Warm-up] %s'
+
+    def __init__(self, hooks=None, timeout=None, retry_interval=None):
+        self.hooks = hooks if hooks is not None else stevedore.extension.ExtensionManager(
+            namespace='prjname.warmup',
+            invoke_on_load=True,
+        )
+        self._timeout = float(timeout if timeout is not None else settings.WARMUP_TIMEOUT)
+        self._retry_interval = float(retry_interval if retry_interval is not None
+                                     else settings.WARMUP_RETRY_INTERVAL)
+        self.state = PENDING
+        # Hook name to its status
+        self._results = {}
+
+    @property
+    def ready(self):
+        return self.state == READY
+
+    def start(self):
+        """
+        Run the warm-up on the current IOLoop, once
+        """
+        if self.state == PENDING:
+            self.state = WARMING
+            ioloop.IOLoop.current().spawn_callback(self.run)
+
+    def _pending_hooks(self):
+        """
+        Hooks not run yet and required hooks that failed
+        """
+        hooks = [hook for hook in self.hooks
+                 if hook.name not in self._results or
+                 (hook.obj.REQUIRED and self._results[hook.name]['status'] == FAILED)]
+        return sorted(hooks, key=lambda hook: (hook.obj.ORDER, hook.name))
+
+    @staticmethod
+    def _create_support():
+        process_context = bootstrap.get_process_context()
+        return Support(process_context.logger,
+                       {'environment': process_context.environment, 'handler': 'Warmup'},
+                       process_context.stats_client)
+
+    @gen.coroutine
+    def run(self):
+        self.state = WARMING
+        support = self._create_support()
+        started_at = time.time()
+        for hook in self._pending_hooks():
+            yield self._warm_up(hook)
+
+        failed = [hook.name for hook in self.hooks
+                  if hook.obj.REQUIRED and self._results[hook.name]['status'] == FAILED]
+        if failed:
+            self.state = FAILED
+            support.stat_increment('warmup.failed_count')
+            support.notify_error(self.LOG_TAG % '%s failed, retrying in %.1f s',
+                                 ', '.join(failed), self._retry_interval)
+            ioloop.IOLoop.current().call_later(self._retry_interval, self.run)
+        else:
+            self.state = READY
+            elapsed_ms = (time.time() - started_at) * 1000
+            support.stat_timing('warmup.time', elapsed_ms)
+            support.notify_info(self.LOG_TAG % 'ready in %.0f ms', elapsed_ms)
+
+    @gen.coroutine
+    def _warm_up(self, hook):
+        started_at = time.time()
+        status = {'name': hook.name, 'required': hook.obj.REQUIRED}
+        try:
+            yield gen.with_timeout(datetime.timedelta(seconds=self._timeout),
+                                   gen.maybe_future(hook.obj.warm_up()))
+            status['status'] = READY
+        except gen.TimeoutError:
+            status.update(status=FAILED, error='timed out after %.1f s' % self._timeout)
+        except Exception as ex:  # pylint: disable=W0703
+            status.update(status=FAILED, error=str(ex))
+
+        status['elapsed'] = round((time.time() - started_at) * 1000, 3)
+        self._results[hook.name] = status
+
+    def get_status(self):
+        """
+        Return (ready, state, status of every hook)
+        """
+        hook_status = [self._results.get(hook.name, {'name': hook.name, 'status': PENDING})
+                       for hook in self.hooks]
+        return self.ready, self.state, hook_status
+
+
+DEFAULT_RUNNER = WarmupRunner()
+
+
+def start():
+    """
+    Start warming up the service on the current IOLoop
+    """
+    DEFAULT_RUNNER.start()
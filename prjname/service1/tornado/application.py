@@ -5,12 +5,15 @@ from tornado import web
 
 from prjname.service1 import settings
 from prjname.common.tornado.handlers import health
+from prjname.common.tornado.handlers import ready
 
 
 APPLICATION = web.Application(
     [
         (r'.*/health/?$', health.HealthHandler,
-         {'application_settings': settings, 'handler': 'Health'})
+         {'application_settings': settings, 'handler': 'Health'}),
+        (r'.*/ready/?$', ready.ReadyHandler,
+         {'application_settings': settings, 'handler': 'Ready'})
     ],
     service_name='service1',
     autoreload=settings.AUTO_RELOAD)
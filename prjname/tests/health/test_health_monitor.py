@@ -0,0 +1,136 @@
+"""
+HealthMonitor tests
+"""
+import threading
+import time
+
+from tornado import gen
+from tornado import testing
+
+from prjname.common.health.health_monitor import HealthMonitor
+from prjname.common.health.plugin import HealthPlugin
+
+
+class Extension(object):  # pylint: disable=too-few-public-methods
+
+    def __init__(self, name, obj):
+        self.name = name
+        self.obj = obj
+
+
+class BlockingPlugin(HealthPlugin):
+    """
+    Synchronous plugin, like the built-in ones
+    """
+
+    def __init__(self, name, delay=0, release=None):
+        self.name = name
+        self.delay = delay
+        self.release = release
+        self.threads = []
+
+    def get_status(self):
+        self.threads.append(threading.current_thread())
+        if self.release is not None:
+            self.release.wait(5)
+        time.sleep(self.delay)
+        return HealthPlugin.OK, {'name': self.name, 'status': 'OK', 'exposure': HealthPlugin.LOW}
+
+
+class CoroutinePlugin(HealthPlugin):
+
+    RUN_ON_IOLOOP = True
+    name = 'coroutine'
+
+    @gen.coroutine
+    def get_status(self):
+        yield gen.moment
+        raise gen.Return((HealthPlugin.WARNING, {'name': 'coroutine', 'status': 'WARNING',
+                                                 'exposure': HealthPlugin.LOW}))
+
+
+class HealthMonitorTest(testing.AsyncTestCase):
+
+    @staticmethod
+    def _monitor(*plugins):
+        return HealthMonitor([Extension(plugin.name, plugin) for plugin in plugins],
+                             timeout=0.1, max_age=10, refresh_interval=0)
+
+    @testing.gen_test
+    def test_blocking_plugin_off_ioloop(self):
+        plugin = BlockingPlugin('blocking')
+
+        health, status, _ = yield self._monitor(plugin).get_status(include_details=True)
+
+        self.assertEqual(HealthPlugin.OK, health)
+        self.assertEqual('blocking', status[1]['name'])
+        self.assertIsNot(threading.current_thread(), plugin.threads[0])
+
+    @testing.gen_test
+    def test_blocking_plugin_timeout(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        monitor = self._monitor(BlockingPlugin('hung', release=release), BlockingPlugin('ok'))
+        start_time = time.time()
+
+        health, status, _ = yield monitor.get_status(include_details=True)
+
+        self.assertLess(time.time() - start_time, 1)
+        self.assertEqual(HealthPlugin.ERROR, health)
+        self.assertEqual('timed out after 0.1 s', status[1]['error'])
+        self.assertEqual('OK', status[2]['status'])
+
+    @testing.gen_test
+    def test_blocking_plugins_run_concurrently(self):
+        monitor = self._monitor(BlockingPlugin('first', delay=0.06),
+                                BlockingPlugin('second', delay=0.06))
+        start_time = time.time()
+
+        health, _, _ = yield monitor.get_status()
+
+        self.assertLess(time.time() - start_time, 0.1)
+        self.assertEqual(HealthPlugin.OK, health)
+
+    @testing.gen_test
+    def test_coroutine_plugin(self):
+        health, status, _ = yield self._monitor(CoroutinePlugin()).get_status(include_details=True)
+
+        self.assertEqual(HealthPlugin.WARNING, health)
+        self.assertEqual('coroutine', status[1]['name'])
+
+    @testing.gen_test
+    def test_hung_plugin_not_started_again(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        plugin = BlockingPlugin('hung', release=release)
+        monitor = self._monitor(plugin)
+        pop_threads = []
+        pending = monitor._pending = PendingChecks(pop_threads)  # pylint: disable=protected-access
+
+        yield monitor.refresh()
+        yield monitor.refresh()
+        self.assertEqual(1, len(plugin.threads))
+
+        release.set()
+        for _ in range(100):
+            if not pending:
+                break
+            yield gen.sleep(0.01)
+        yield monitor.refresh()
+
+        self.assertEqual(2, len(plugin.threads))
+        self.assertEqual([threading.current_thread()] * 2, pop_threads)
+
+
+class PendingChecks(dict):
+    """
+    Records the threads the finished checks are removed from
+    """
+
+    def __init__(self, pop_threads):
+        super(PendingChecks, self).__init__()
+        self.pop_threads = pop_threads
+
+    def pop(self, *args):
+        self.pop_threads.append(threading.current_thread())
+        return super(PendingChecks, self).pop(*args)
@@ -0,0 +1,106 @@
+"""
+Saturation health plugins tests
+"""
+import threading
+import unittest
+
+import mock
+from tornado import gen
+from tornado import httpclient
+from tornado import testing
+
+from prjname.common.health import saturation
+from prjname.common.health.health_monitor import HealthMonitor
+from prjname.common.health.plugin import HealthPlugin
+from prjname.common.utils import ioloop_lag
+
+
+class Extension(object):  # pylint: disable=too-few-public-methods
+
+    def __init__(self, name, obj):
+        self.name = name
+        self.obj = obj
+
+
+class SeverityTest(unittest.TestCase):
+
+    def test_thresholds(self):
+        self.assertEqual(HealthPlugin.OK, saturation.severity(1, '10', '20'))
+        self.assertEqual(HealthPlugin.WARNING, saturation.severity(10, '10', '20'))
+        self.assertEqual(HealthPlugin.ERROR, saturation.severity(25, '10', '20'))
+
+    def test_disabled_thresholds(self):
+        self.assertEqual(HealthPlugin.OK, saturation.severity(1000, 0, 0))
+        self.assertEqual(HealthPlugin.ERROR, saturation.severity(1000, 0, 20))
+
+
+class Metrics(saturation.SaturationPlugin):
+    NAME = 'metrics'
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.threads = []
+
+    def get_metrics(self):
+        self.threads.append(threading.current_thread())
+        return self.metrics
+
+
+class SaturationPluginTest(testing.AsyncTestCase):
+
+    def test_worst_metric_is_plugin_health(self):
+        health, status = Metrics([('low', 1.23456, 10, 20), ('high', 15, 10, 20)]).get_status()
+
+        self.assertEqual(HealthPlugin.WARNING, health)
+        self.assertEqual({'name': 'metrics', 'exposure': HealthPlugin.HIGH, 'status': 'WARNING',
+                          'low': 1.235, 'high': 15}, status)
+
+    @testing.gen_test
+    def test_checked_on_ioloop_thread(self):
+        plugin = Metrics([('value', 1, 10, 20)])
+        monitor = HealthMonitor([Extension('metrics', plugin)], timeout=1, max_age=10,
+                                refresh_interval=0)
+
+        health, _, _ = yield monitor.get_status()
+
+        self.assertEqual(HealthPlugin.OK, health)
+        self.assertEqual([threading.current_thread()], plugin.threads)
+
+    @testing.gen_test
+    def test_ioloop_lag(self):
+        self.addCleanup(setattr, ioloop_lag, '_MONITOR', ioloop_lag.get_monitor())
+        monitor = ioloop_lag.start(0.01)
+        self.addCleanup(monitor.stop)
+        yield gen.sleep(0.03)
+        monitor.max_lag = 600.0
+
+        health, status = saturation.IOLoopLagPlugin().get_status()
+
+        self.assertEqual(HealthPlugin.OK, health)
+        self.assertEqual(600.0, status['maxLag'])
+        self.assertEqual(monitor.lag, monitor.max_lag)
+
+    def test_http_client_queue(self):
+        client = httpclient.AsyncHTTPClient()
+
+        with mock.patch.object(client, 'queue', range(150), create=True):
+            health, status = saturation.HttpClientPlugin().get_status()
+
+        self.assertEqual(HealthPlugin.ERROR, health)
+        self.assertEqual(150, status['queued'])
+
+    def test_file_descriptors(self):
+        with mock.patch.object(saturation.resource, 'getrlimit', return_value=(10 ** 6, 10 ** 6)):
+            health, status = saturation.FileDescriptorPlugin().get_status()
+
+        self.assertEqual(HealthPlugin.OK, health)
+        self.assertGreater(status['open'], 0)
+
+    def test_memory_limit(self):
+        with mock.patch.object(saturation.settings, 'HEALTH_MEMORY_LIMIT', '1'):
+            plugin = saturation.MemoryPlugin()
+        with mock.patch.object(plugin, 'get_rss', return_value=950 * 1024):
+            health, status = plugin.get_status()
+
+        self.assertEqual(HealthPlugin.ERROR, health)
+        self.assertEqual(0.928, status['usage'])
@@ -0,0 +1,74 @@
+"""
+Admission control tests
+"""
+import mock
+from tornado import testing
+from tornado import web
+
+from prjname.common import settings
+from prjname.common.tornado.handlers import admission
+from prjname.common.tornado.handlers import base
+from prjname.common.utils import rate_limit
+
+
+class LimitedHandler(base.BaseHandler):  # pylint: disable=too-many-public-methods
+    # Limits overridden from the environment are strings
+    route_rate_limit = ('1', '2')
+
+    def get(self):
+        self.build_response({'served': True})
+
+
+class UnlimitedHandler(base.BaseHandler):  # pylint: disable=too-many-public-methods
+
+    def get(self):
+        self.build_response({'served': True})
+
+
+class AdmissionTest(testing.AsyncHTTPTestCase):
+
+    def setUp(self):
+        super(AdmissionTest, self).setUp()
+        for name, value in (('RATE_LIMIT_GLOBAL_RATE', '0'), ('RATE_LIMIT_GLOBAL_BURST', '0'),
+                            ('RATE_LIMIT_ROUTE_RATE', '0'), ('RATE_LIMIT_ROUTE_BURST', '0'),
+                            ('LOAD_SHEDDING_LAG_THRESHOLD', '500')):
+            patcher = mock.patch.object(settings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        controller = admission.AdmissionController(rate_limit.LocalBucketStore())
+        patcher = mock.patch.object(admission, 'DEFAULT_CONTROLLER', controller)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_app(self):
+        return web.Application([
+            (r'/limited', LimitedHandler, {'application_settings': settings, 'handler': 'Limited'}),
+            (r'/unlimited', UnlimitedHandler, {'application_settings': settings,
+                                               'handler': 'Unlimited'}),
+        ], service_name='tests')
+
+    def test_admitted_without_limits(self):
+        for _ in range(5):
+            self.assertEqual(200, self.fetch('/unlimited').code)
+
+    def test_route_limit_exceeded(self):
+        codes = [self.fetch('/limited').code for _ in range(3)]
+
+        self.assertEqual([200, 200, 429], codes)
+
+    def test_too_many_requests_retry_after(self):
+        for _ in range(2):
+            self.fetch('/limited')
+
+        response = self.fetch('/limited')
+
+        self.assertEqual(429, response.code)
+        self.assertEqual('1', response.headers['Retry-After'])
+
+    @mock.patch.object(admission.ioloop_lag, 'current_lag', return_value=1000.0)
+    def test_shed_when_ioloop_lags(self, _):
+        response = self.fetch('/unlimited')
+
+        self.assertEqual(503, response.code)
+        self.assertEqual('1', response.headers['Retry-After'])
@@ -0,0 +1,327 @@
+"""
+BaseHandler tests
+"""
+import datetime
+import json
+
+import mock
+from tornado import gen
+from tornado import testing
+from tornado import web
+
+from prjname.common import exceptions
+from prjname.common import settings
+from prjname.common.tornado.handlers import base
+from prjname.common.utils import compression
+from prjname.common.utils.support import Support
+
+
+class EagerBodyHandler(base.BaseHandler):  # pylint: disable=too-many-public-methods
+    calls = 0
+
+    def post(self):
+        EagerBodyHandler.calls += 1
+        self.build_response(self.request.body_arguments)
+
+
+class LazyBodyHandler(base.BaseHandler):  # pylint: disable=too-many-public-methods
+    lazy_body_parsing = True
+    parsed_in_prepare = None
+
+    def prepare(self):
+        super(LazyBodyHandler, self).prepare()
+        LazyBodyHandler.parsed_in_prepare = self._body_arguments is not self._NOT_PARSED
+
+    def post(self):
+        try:
+            self.build_response(self.body_arguments)
+        except exceptions.InfoException as ex:
+            self.build_response(ex)
+
+
+class BodyParsingTest(testing.AsyncHTTPTestCase):
+
+    def get_app(self):
+        arguments = {'application_settings': settings, 'handler': 'Body'}
+        return web.Application([
+            (r'/eager', EagerBodyHandler, arguments),
+            (r'/lazy', LazyBodyHandler, arguments),
+        ], service_name='tests')
+
+    def post(self, path, body):
+        return self.fetch(path, method='POST', body=body,
+                          headers={'Content-Type': 'application/json'})
+
+    def test_body_parsed_in_prepare(self):
+        response = self.post('/eager', '{"a": 1}')
+
+        self.assertEqual(201, response.code)
+        self.assertEqual({'a': 1}, json.loads(response.body))
+
+    def test_invalid_body_rejected_before_handler_method(self):
+        EagerBodyHandler.calls = 0
+
+        response = self.post('/eager', '{"a": ')
+
+        self.assertEqual(400, response.code)
+        self.assertIn('invalid body', response.body)
+        self.assertEqual(0, EagerBodyHandler.calls)
+
+    def test_lazy_body_parsed_on_access(self):
+        response = self.post('/lazy', '{"a": 1}')
+
+        self.assertEqual(201, response.code)
+        self.assertEqual({'a': 1}, json.loads(response.body))
+        self.assertFalse(LazyBodyHandler.parsed_in_prepare)
+
+    def test_lazy_invalid_body_raises_on_access(self):
+        response = self.post('/lazy', '{"a": ')
+
+        self.assertEqual(400, response.code)
+        self.assertIn('invalid body', response.body)
+
+
+class StreamingResponseHandler(base.BaseHandler):  # pylint: disable=too-many-public-methods
+
+    @gen.coroutine
+    def get(self, mode):
+        yield self.build_streaming_response(self._items(mode), ndjson=True)
+
+    def _items(self, mode):
+        for number in range(20):
+            if mode == 'error_before' or (mode == 'error_after' and number == 10):
+                raise ValueError('item %d' % number)
+            if mode == 'close' and number == 10:
+                self.request.connection.stream.close()
+            yield {'number': number}
+
+
+@mock.patch.object(settings, 'STREAMING_RESPONSE_FLUSH_SIZE', 50)
+class StreamingResponseTest(testing.AsyncHTTPTestCase):
+
+    def setUp(self):
+        super(StreamingResponseTest, self).setUp()
+        patcher = mock.patch.object(Support, 'finish_request')
+        self.finish_request = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(Support, 'stat_increment')
+        self.stat_increment = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_app(self):
+        return web.Application([
+            (r'/(\w+)', StreamingResponseHandler,
+             {'application_settings': settings, 'handler': 'Streaming'}),
+        ], service_name='tests')
+
+    def _stats(self):
+        return [call[0][0] for call in self.stat_increment.call_args_list]
+
+    def _wait_finished(self):
+        # The server side of the request may finish after the client response
+        self.io_loop.add_timeout(self.io_loop.time() + 0.05, self.stop)
+        self.wait()
+
+    def test_items_streamed(self):
+        response = self.fetch('/success')
+
+        self.assertEqual(200, response.code)
+        self.assertEqual('application/x-ndjson', response.headers['Content-Type'])
+        self.assertEqual([{'number': number} for number in range(20)],
+                         [json.loads(line) for line in response.body.splitlines()])
+        self.assertIn('net.responses.streamed_count', self._stats())
+        self.finish_request.assert_called_once_with(200, mock.ANY)
+
+    def test_error_before_flush(self):
+        response = self.fetch('/error_before')
+
+        self.assertEqual(500, response.code)
+        self.assertNotIn('net.responses.streamed_count', self._stats())
+        self.finish_request.assert_called_once_with(500, mock.ANY)
+
+    def test_error_after_flush(self):
+        response = self.fetch('/error_after')
+        self._wait_finished()
+
+        self.assertNotEqual(200, response.code)
+        self.assertIn('net.responses.streamed_error_count', self._stats())
+        self.assertNotIn('net.responses.streamed_count', self._stats())
+        self.finish_request.assert_called_once_with(500, mock.ANY)
+
+    def test_client_closed(self):
+        self.fetch('/close')
+        self._wait_finished()
+
+        self.assertNotIn('net.responses.streamed_count', self._stats())
+        self.assertNotIn('net.responses.streamed_error_count', self._stats())
+
+
+class FixedOffset(datetime.tzinfo):
+
+    def __init__(self, hours):
+        super(FixedOffset, self).__init__()
+        self._offset = datetime.timedelta(hours=hours)
+
+    def utcoffset(self, dt):
+        return self._offset
+
+    def dst(self, dt):
+        return datetime.timedelta(0)
+
+
+# 2020-01-01 10:00:00 UTC
+LAST_MODIFIED = {
+    'naive': datetime.datetime(2020, 1, 1, 10, 0, 0, 500000),
+    'aware': datetime.datetime(2020, 1, 1, 12, 0, 0, tzinfo=FixedOffset(2)),
+    'timestamp': 1577872800,
+}
+
+
+class ConditionalHandler(base.BaseHandler):  # pylint: disable=too-many-public-methods
+
+    def get(self, kind):
+        if kind == 'plain':
+            self.build_response({'entity': 1})
+        else:
+            self.build_response({'entity': 1}, version='v1', last_modified=LAST_MODIFIED[kind])
+
+
+class ConditionalRequestTest(testing.AsyncHTTPTestCase):
+
+    def get_app(self):
+        return web.Application([
+            (r'/(\w+)', ConditionalHandler,
+             {'application_settings': settings, 'handler': 'Conditional'}),
+        ], service_name='tests')
+
+    def test_validators_sent(self):
+        response = self.fetch('/aware')
+
+        self.assertEqual(200, response.code)
+        self.assertEqual('"v1"', response.headers['Etag'])
+        self.assertEqual('Wed, 01 Jan 2020 10:00:00 GMT', response.headers['Last-Modified'])
+
+    def test_if_none_match(self):
+        not_modified = self.fetch('/naive', headers={'If-None-Match': '"v1"'})
+        modified = self.fetch('/naive', headers={'If-None-Match': '"v0"'})
+
+        self.assertEqual(304, not_modified.code)
+        self.assertEqual('', not_modified.body)
+        self.assertEqual(200, modified.code)
+        self.assertEqual({'entity': 1}, json.loads(modified.body))
+
+    def test_if_none_match_takes_precedence(self):
+        response = self.fetch('/naive', headers={
+            'If-None-Match': '"v0"', 'If-Modified-Since': 'Wed, 01 Jan 2020 10:00:00 GMT'})
+
+        self.assertEqual(200, response.code)
+
+    def test_if_modified_since(self):
+        for kind in ('naive', 'aware', 'timestamp'):
+            not_modified = self.fetch('/' + kind, headers={
+                'If-Modified-Since': 'Wed, 01 Jan 2020 10:00:00 GMT'})
+            modified = self.fetch('/' + kind, headers={
+                'If-Modified-Since': 'Wed, 01 Jan 2020 09:59:59 GMT'})
+
+            self.assertEqual(304, not_modified.code, kind)
+            self.assertEqual(200, modified.code, kind)
+
+    def test_if_modified_since_with_offset(self):
+        response = self.fetch('/aware', headers={
+            'If-Modified-Since': 'Wed, 01 Jan 2020 11:00:00 +0100'})
+
+        self.assertEqual(304, response.code)
+
+    def test_invalid_if_modified_since(self):
+        response = self.fetch('/aware', headers={'If-Modified-Since': 'yesterday'})
+
+        self.assertEqual(200, response.code)
+
+    def test_etag_added_in_finish(self):
+        response = self.fetch('/plain')
+        etag = response.headers['Etag']
+
+        not_modified = self.fetch('/plain', headers={'If-None-Match': etag})
+
+        self.assertEqual(200, response.code)
+        self.assertEqual(304, not_modified.code)
+        self.assertEqual(etag, not_modified.headers['Etag'])
+
+
+class CompressedHandler(base.BaseHandler):  # pylint: disable=too-many-public-methods
+
+    @gen.coroutine
+    def get(self, kind):
+        size = int(self.get_argument('size', 2048))
+        if kind == 'encoded':
+            self.set_header('Content-Type', 'application/json')
+            self.set_header('Content-Encoding', 'gzip')
+            self.finish(compression.compress('{"data": "%s"}' % ('x' * size), 'gzip'))
+        elif kind == 'streamed':
+            yield self.build_streaming_response([{'data': 'x' * size}])
+        else:
+            self.build_response({'data': 'x' * size})
+
+
+@mock.patch.object(settings, 'RESPONSE_COMPRESSION', True)
+@mock.patch.object(settings, 'RESPONSE_COMPRESSION_MIN_SIZE', 1024)
+class ResponseCompressionTest(testing.AsyncHTTPTestCase):
+
+    def get_app(self):
+        return web.Application([
+            (r'/(\w+)', CompressedHandler,
+             {'application_settings': settings, 'handler': 'Compressed'}),
+        ], service_name='tests')
+
+    def _fetch(self, path, accept_encoding='gzip'):
+        headers = {'Accept-Encoding': accept_encoding} if accept_encoding else {}
+        return self.fetch(path, headers=headers, decompress_response=False)
+
+    def test_gzip_negotiated(self):
+        response = self._fetch('/json', 'deflate;q=0.5, gzip')
+
+        self.assertEqual('gzip', response.headers['Content-Encoding'])
+        self.assertEqual('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual({'data': 'x' * 2048},
+                         json.loads(compression.decompress(response.body, 'gzip')))
+
+    def test_deflate_negotiated(self):
+        response = self._fetch('/json', 'deflate')
+
+        self.assertEqual('deflate', response.headers['Content-Encoding'])
+        self.assertEqual({'data': 'x' * 2048},
+                         json.loads(compression.decompress(response.body, 'deflate')))
+
+    def test_not_accepted_encoding(self):
+        for accept_encoding in (None, 'identity', 'gzip;q=0, deflate;q=0'):
+            response = self._fetch('/json', accept_encoding)
+
+            self.assertNotIn('Content-Encoding', response.headers)
+            self.assertEqual('Accept-Encoding', response.headers['Vary'])
+            self.assertEqual({'data': 'x' * 2048}, json.loads(response.body))
+
+    def test_small_body_not_compressed(self):
+        response = self._fetch('/json?size=100')
+
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertNotIn('Vary', response.headers)
+        self.assertEqual({'data': 'x' * 100}, json.loads(response.body))
+
+    def test_disabled(self):
+        with mock.patch.object(settings, 'RESPONSE_COMPRESSION', False):
+            response = self._fetch('/json')
+
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_encoded_response_not_compressed_again(self):
+        response = self._fetch('/encoded')
+
+        self.assertEqual('gzip', response.headers['Content-Encoding'])
+        self.assertEqual({'data': 'x' * 2048},
+                         json.loads(compression.decompress(response.body, 'gzip')))
+
+    def test_streamed_response_not_compressed(self):
+        response = self._fetch('/streamed')
+
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual([{'data': 'x' * 2048}], json.loads(response.body))
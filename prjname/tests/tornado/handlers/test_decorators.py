@@ -0,0 +1,241 @@
+"""
+Handler decorators tests
+"""
+import mock
+from tornado import concurrent
+from tornado import gen
+from tornado import testing
+from tornado import web
+
+from prjname.common import constants
+from prjname.common import exceptions
+from prjname.common import settings
+from prjname.common.tornado.handlers import base
+from prjname.common.tornado.handlers import decorators
+from prjname.common.tornado.handlers import idempotency
+from prjname.common.tornado.handlers import subscription_cache
+from prjname.common.utils import retry as retry_policy
+from prjname.common.utils.deadline import Deadline
+
+
+class Support(object):
+
+    def __init__(self):
+        self.stats = {}
+
+    def stat_increment(self, stat, count=1):
+        self.stats[stat] = self.stats.get(stat, 0) + count
+
+    def notify_debug(self, message, *args):
+        pass
+
+
+class Adapter(object):
+
+    def __init__(self, failures, deadline=None):
+        self.failures = failures
+        self.deadline = deadline
+        self.support = Support()
+        self.calls = 0
+
+    @decorators.retry(ValueError, tries=4, delay=0.01, jitter=retry_policy.NO_JITTER, budget='tests')
+    @gen.coroutine
+    def call(self):
+        self.calls += 1
+        yield gen.moment
+        if self.calls <= self.failures:
+            raise ValueError('failure %d' % self.calls)
+        raise gen.Return('result')
+
+    @decorators.retry(ValueError, tries=4, delay=0.2, jitter=retry_policy.NO_JITTER)
+    @gen.coroutine
+    def slow_retried_call(self):
+        self.calls += 1
+        yield gen.moment
+        raise ValueError('failure %d' % self.calls)
+
+
+class RetryTest(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(RetryTest, self).setUp()
+        retry_policy._BUDGETS.pop('tests', None)  # pylint: disable=protected-access
+
+    @testing.gen_test
+    def test_retried_until_success(self):
+        adapter = Adapter(failures=2)
+
+        result = yield adapter.call()
+
+        self.assertEqual('result', result)
+        self.assertEqual(3, adapter.calls)
+        self.assertEqual(2, adapter.support.stats['retry.tests.retry_count'])
+
+    @testing.gen_test
+    def test_gives_up_after_tries(self):
+        adapter = Adapter(failures=10)
+
+        with self.assertRaises(ValueError):
+            yield adapter.call()
+
+        self.assertEqual(4, adapter.calls)
+        self.assertEqual(1, adapter.support.stats['retry.tests.exhausted_count'])
+
+    @testing.gen_test
+    def test_no_retry_past_deadline(self):
+        adapter = Adapter(failures=10, deadline=Deadline.from_timeout(0.005))
+
+        with self.assertRaises(ValueError):
+            yield adapter.call()
+
+        self.assertEqual(1, adapter.calls)
+        self.assertEqual(1, adapter.support.stats['retry.tests.deadline_count'])
+
+    @testing.gen_test
+    def test_cancelled_without_time_budget(self):
+        deadline = Deadline.unbounded()
+        adapter = Adapter(failures=10, deadline=deadline)
+        # The client goes away while the first retry is waiting
+        self.io_loop.call_later(0.02, deadline.cancel)
+
+        with self.assertRaises(exceptions.DeadlineExceeded):
+            yield adapter.slow_retried_call()
+
+        self.assertEqual(1, adapter.calls)
+
+    @testing.gen_test
+    def test_only_calls_deposit_in_budget(self):
+        adapter = Adapter(failures=2)
+
+        yield adapter.call()
+
+        # pylint: disable=protected-access
+        self.assertAlmostEqual(retry_policy.get_budget('tests')._ratio,
+                               retry_policy.get_budget('tests')._tokens)
+
+
+class ApiKeyHandler(base.BaseHandler):  # pylint: disable=too-many-public-methods
+
+    @decorators.api_key_authorization
+    @gen.coroutine
+    def get(self):
+        self.build_response({'client': self.get_argument('client_id')})
+
+
+class ApiKeyAuthorizationTest(testing.AsyncHTTPTestCase):
+
+    def setUp(self):
+        super(ApiKeyAuthorizationTest, self).setUp()
+        patcher = mock.patch.object(subscription_cache.DEFAULT_CACHE, 'get_subscription',
+                                    side_effect=self._get_subscription)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(ApiKeyHandler, 'admit_client')
+        self.admit_client = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    @gen.coroutine
+    def _get_subscription(client_id, support, cassandra_adapter):  # pylint: disable=unused-argument
+        raise gen.Return({'clientId': client_id} if client_id == 'known' else None)
+
+    def get_app(self):
+        return web.Application([
+            (r'/', ApiKeyHandler, {'application_settings': settings, 'handler': 'ApiKey'}),
+        ], service_name='tests')
+
+    def test_known_client_admitted(self):
+        response = self.fetch('/?client_id=known')
+
+        self.assertEqual(200, response.code)
+        self.admit_client.assert_called_once_with('known')
+
+    def test_unknown_client_not_admitted(self):
+        response = self.fetch('/?client_id=random')
+
+        self.assertEqual(401, response.code)
+        self.assertFalse(self.admit_client.called)
+
+
+class IdempotentHandler(base.BaseHandler):  # pylint: disable=too-many-public-methods
+
+    calls = 0
+    release = None
+
+    @decorators.idempotent(store=idempotency.MemoryIdempotencyStore(maxsize=10, ttl=60))
+    @gen.coroutine
+    def post(self):
+        IdempotentHandler.calls += 1
+        if IdempotentHandler.release is not None:
+            yield IdempotentHandler.release
+        if self.request.body == b'invalid':
+            raise exceptions.BadRequest('body')
+        self.build_response({'call': IdempotentHandler.calls})
+
+
+class IdempotentTest(testing.AsyncHTTPTestCase):
+
+    def setUp(self):
+        super(IdempotentTest, self).setUp()
+        IdempotentHandler.calls = 0
+        IdempotentHandler.release = None
+
+    def get_app(self):
+        return web.Application([
+            (r'/', IdempotentHandler, {'application_settings': settings, 'handler': 'Idempotent'}),
+        ], service_name='tests')
+
+    def _post(self, key, body=b'body', callback=None):
+        headers = {constants.IDEMPOTENCY_KEY_HTTP_HEADER: key}
+        if callback:
+            return self.http_client.fetch(self.get_url('/'), callback, method='POST',
+                                          body=body, headers=headers, raise_error=False)
+        return self.fetch('/', method='POST', body=body, headers=headers)
+
+    def test_retry_replayed(self):
+        first = self._post('replayed')
+        retry = self._post('replayed')
+
+        self.assertEqual(201, retry.code)
+        self.assertEqual(first.body, retry.body)
+        self.assertEqual('true', retry.headers[constants.IDEMPOTENT_REPLAY_HTTP_HEADER])
+        self.assertEqual(1, IdempotentHandler.calls)
+
+    def test_different_keys_not_replayed(self):
+        self._post('first')
+        response = self._post('second')
+
+        self.assertNotIn(constants.IDEMPOTENT_REPLAY_HTTP_HEADER, response.headers)
+        self.assertEqual(2, IdempotentHandler.calls)
+
+    def test_concurrent_requests_wait_for_first(self):
+        IdempotentHandler.release = concurrent.Future()
+        responses = []
+
+        def on_response(response):
+            responses.append(response)
+            if len(responses) == 2:
+                self.stop()
+
+        self._post('concurrent', callback=on_response)
+        self._post('concurrent', callback=on_response)
+        self.io_loop.call_later(0.05, IdempotentHandler.release.set_result, None)
+        self.wait()
+
+        self.assertEqual([201, 201], [response.code for response in responses])
+        self.assertEqual(1, IdempotentHandler.calls)
+        self.assertEqual(responses[0].body, responses[1].body)
+
+    def test_different_body_rejected(self):
+        self._post('reused', body=b'first')
+        response = self._post('reused', body=b'second')
+
+        self.assertEqual(422, response.code)
+        self.assertEqual(1, IdempotentHandler.calls)
+
+    def test_client_errors_not_stored(self):
+        self._post('invalid', body=b'invalid')
+        response = self._post('invalid', body=b'invalid')
+
+        self.assertEqual(400, response.code)
+        self.assertEqual(2, IdempotentHandler.calls)
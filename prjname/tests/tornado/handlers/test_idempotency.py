@@ -0,0 +1,90 @@
+"""
+Idempotency-Key support tests
+"""
+import unittest
+
+import mock
+from tornado import gen
+from tornado import testing
+
+from prjname.common.tornado.handlers import idempotency
+
+
+class IsCacheableTest(unittest.TestCase):
+
+    def test_successful_responses_stored(self):
+        for status_code in (200, 201, 204):
+            self.assertTrue(idempotency.is_cacheable({'status_code': status_code}))
+
+    def test_errors_not_stored(self):
+        for status_code in (400, 404, 409, 429, 500, 503):
+            self.assertFalse(idempotency.is_cacheable({'status_code': status_code}))
+
+    def test_listed_client_errors_stored(self):
+        self.assertTrue(idempotency.is_cacheable({'status_code': 404}, (400, 404)))
+        self.assertFalse(idempotency.is_cacheable({'status_code': 429}, (400, 404)))
+
+    def test_missing_response_not_stored(self):
+        self.assertFalse(idempotency.is_cacheable(None))
+
+
+class FingerprintTest(unittest.TestCase):
+
+    def test_different_bodies(self):
+        first = idempotency.fingerprint(mock.Mock(body=b'{"amount": 1}'))
+        second = idempotency.fingerprint(mock.Mock(body=b'{"amount": 2}'))
+
+        self.assertNotEqual(first, second)
+        self.assertTrue(idempotency.matches({'fingerprint': first}, first))
+        self.assertFalse(idempotency.matches({'fingerprint': first}, second))
+
+    def test_responses_without_fingerprint_match(self):
+        self.assertTrue(idempotency.matches({'status_code': 200}, 'fingerprint'))
+
+
+class AcquireTest(testing.AsyncTestCase):
+
+    def tearDown(self):
+        idempotency._IN_FLIGHT.clear()  # pylint: disable=protected-access
+        super(AcquireTest, self).tearDown()
+
+    @testing.gen_test
+    def test_same_key_waits_for_release(self):
+        yield idempotency.acquire('key')
+        waiting = idempotency.acquire('key')
+        yield gen.moment
+
+        self.assertFalse(waiting.done())
+
+        idempotency.release('key')
+        yield waiting
+
+        self.assertIn('key', idempotency._IN_FLIGHT)  # pylint: disable=protected-access
+
+    @testing.gen_test
+    def test_different_keys_do_not_wait(self):
+        yield idempotency.acquire('key')
+
+        yield gen.with_timeout(self.io_loop.time() + 1, idempotency.acquire('other'))
+
+    @testing.gen_test
+    def test_release_unknown_key(self):
+        idempotency.release('key')
+
+        self.assertNotIn('key', idempotency._IN_FLIGHT)  # pylint: disable=protected-access
+
+
+@mock.patch('prjname.common.utils.caches.time.time', return_value=1000.0)
+class MemoryIdempotencyStoreTest(testing.AsyncTestCase):
+
+    @testing.gen_test
+    def test_stored_until_ttl(self, time_mock):
+        store = idempotency.MemoryIdempotencyStore(maxsize=10, ttl=60)
+        yield store.set('key', {'status_code': 200})
+
+        stored = yield store.get('key')
+        self.assertEqual({'status_code': 200}, stored)
+
+        time_mock.return_value = 1060.0
+        stored = yield store.get('key')
+        self.assertIsNone(stored)
@@ -0,0 +1,131 @@
+"""
+PolicyCache tests
+"""
+import mock
+from tornado import concurrent
+from tornado import gen
+from tornado import testing
+
+from prjname.common import exceptions
+from prjname.common.tornado.handlers import policy_cache
+from prjname.common.utils.deadline import Deadline
+
+
+class Request(object):  # pylint: disable=too-few-public-methods
+
+    def __init__(self, deadline=None):
+        self.deadline = deadline
+
+
+class PolicyCacheTest(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(PolicyCacheTest, self).setUp()
+        self.fetches = []
+        patcher = mock.patch.object(policy_cache.configuration, 'ConfigurationPolicy')
+        configuration_policy = patcher.start()
+        self.addCleanup(patcher.stop)
+        configuration_policy.return_value.get_policies.side_effect = self._get_policies
+        self.configuration_policy = configuration_policy
+
+        patcher = mock.patch.object(policy_cache.enforcer, 'Enforcer', side_effect=lambda config: config)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.cache = policy_cache.PolicyCache(ttl=60, stale_ttl=60, maxsize=10)
+        self.cache._support = mock.Mock()  # pylint: disable=protected-access
+        self.support = mock.Mock()
+
+    def _get_policies(self, products):
+        future = concurrent.Future()
+        self.fetches.append((products, future))
+        return future
+
+    def _finish_fetch(self, result=None, error=None):
+        products, future = self.fetches.pop(0)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result if result is not None else {'products': products})
+
+    @testing.gen_test
+    def test_concurrent_misses_share_one_fetch(self):
+        first = self.cache.get_enforcer(['b', 'a'], self.support, Request())
+        second = self.cache.get_enforcer(['a', 'b', 'a'], self.support, Request())
+        yield gen.moment
+
+        self.assertEqual(1, len(self.fetches))
+        self._finish_fetch()
+        results = yield [first, second]
+
+        self.assertEqual([{'products': ['a', 'b']}] * 2, results)
+        self.assertEqual(2, self.support.stat_increment.call_count)
+
+    @testing.gen_test
+    def test_fetch_not_bound_to_requests(self):
+        # The request starting the fetch runs out of time
+        with self.assertRaises(exceptions.DeadlineExceeded):
+            yield self.cache.get_enforcer(['a'], self.support,
+                                          Request(Deadline.from_timeout(0.01)))
+
+        # Other requests still get the fetch it started
+        other = self.cache.get_enforcer(['a'], self.support, Request(Deadline.from_timeout(60)))
+        yield gen.moment
+        self.assertEqual(1, len(self.fetches))
+        self._finish_fetch()
+        result = yield other
+
+        self.assertEqual({'products': ['a']}, result)
+        context = self.configuration_policy.call_args[0][1]
+        self.assertIsNone(context.deadline)
+        self.assertIsNone(context.request_id)
+
+    @testing.gen_test
+    def test_cancelled_request_does_not_wait(self):
+        deadline = Deadline.unbounded()
+        deadline.cancel()
+
+        with self.assertRaises(exceptions.DeadlineExceeded):
+            yield self.cache.get_enforcer(['a'], self.support, Request(deadline))
+        self.assertEqual(1, len(self.fetches))
+
+    @testing.gen_test
+    def test_stale_entry_used_while_refreshing(self):
+        with mock.patch.object(policy_cache.time, 'time', return_value=1000.0):
+            first = self.cache.get_enforcer(['a'], self.support, Request())
+            self._finish_fetch({'version': 1})
+            yield first
+
+        with mock.patch.object(policy_cache.time, 'time', return_value=1061.0):
+            stale = yield self.cache.get_enforcer(['a'], self.support, Request())
+            yield gen.moment
+            self.assertEqual({'version': 1}, stale)
+            self.assertEqual(1, len(self.fetches))
+
+            self._finish_fetch({'version': 2})
+            yield gen.moment
+            refreshed = yield self.cache.get_enforcer(['a'], self.support, Request())
+
+        self.assertEqual({'version': 2}, refreshed)
+        self.support.stat_increment.assert_any_call('policies.cache_stale_count')
+        self.support.stat_increment.assert_any_call('policies.cache_hit_count')
+
+    @testing.gen_test
+    def test_failed_refresh_keeps_stale_entry(self):
+        with mock.patch.object(policy_cache.time, 'time', return_value=1000.0):
+            first = self.cache.get_enforcer(['a'], self.support, Request())
+            self._finish_fetch({'version': 1})
+            yield first
+
+        with mock.patch.object(policy_cache.time, 'time', return_value=1061.0):
+            yield self.cache.get_enforcer(['a'], self.support, Request())
+            yield gen.moment
+            self._finish_fetch(error=IOError('unavailable'))
+            yield gen.moment
+            stale = yield self.cache.get_enforcer(['a'], self.support, Request())
+            yield gen.moment
+
+        self.assertEqual({'version': 1}, stale)
+        self.cache.support.stat_increment.assert_called_with('policies.refresh_error_count')
+        # The failed fetch is not shared anymore, a new refresh started
+        self.assertEqual(1, len(self.fetches))
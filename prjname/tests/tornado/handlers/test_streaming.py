@@ -0,0 +1,86 @@
+"""
+StreamingHandler tests
+"""
+import base64
+import hashlib
+
+from tornado import gen
+from tornado import testing
+from tornado import web
+
+from prjname.common import exceptions
+from prjname.common import settings
+from prjname.common.tornado.handlers import streaming
+
+
+class UploadHandler(streaming.StreamingHandler):  # pylint: disable=too-many-public-methods
+    calls = 0
+
+    def post(self):
+        UploadHandler.calls += 1
+        try:
+            self.build_response({'size': len(self.body_file.read())})
+        except exceptions.InfoException as ex:
+            self.build_response(ex)
+
+
+class UnlimitedConnectionUploadHandler(UploadHandler):  # pylint: disable=too-many-public-methods
+    """
+    Lets tornado read past max_body_size, as it does with compressed bodies
+    """
+
+    def prepare(self):
+        super(UnlimitedConnectionUploadHandler, self).prepare()
+        self.request.connection.set_max_body_size(1024 * 1024)
+
+
+class StreamingHandlerTest(testing.AsyncHTTPTestCase):
+
+    def get_app(self):
+        arguments = {'application_settings': settings, 'handler': 'Upload',
+                     'max_body_size': 10}
+        return web.Application([
+            (r'/upload', UploadHandler, arguments),
+            (r'/unlimited', UnlimitedConnectionUploadHandler, arguments),
+        ], service_name='tests')
+
+    def setUp(self):
+        super(StreamingHandlerTest, self).setUp()
+        UploadHandler.calls = 0
+
+    def post(self, path, body, headers=None, **kwargs):
+        headers = dict(headers or {}, **{'Content-Type': 'application/octet-stream'})
+        return self.fetch(path, method='POST', body=body, headers=headers, **kwargs)
+
+    def test_body_received(self):
+        response = self.post('/upload', '0123456789')
+
+        self.assertEqual(201, response.code)
+        self.assertIn('"size": 10', response.body)
+
+    def test_content_length_too_large(self):
+        response = self.post('/upload', '0123456789x')
+
+        self.assertEqual(413, response.code)
+        self.assertEqual(0, UploadHandler.calls)
+
+    def test_streamed_body_too_large(self):
+        @gen.coroutine
+        def body_producer(write):
+            yield write('0123456789')
+            yield write('0123456789')
+
+        response = self.fetch('/unlimited', method='POST', body_producer=body_producer,
+                              headers={'Content-Type': 'application/octet-stream'})
+
+        self.assertEqual(413, response.code)
+        self.assertEqual(0, UploadHandler.calls)
+
+    def test_digest_verified(self):
+        digest = base64.b64encode(hashlib.sha256('0123').digest())
+
+        response = self.post('/upload', '0123', {'Digest': 'SHA-256=' + digest})
+        self.assertEqual(201, response.code)
+
+        response = self.post('/upload', '3210', {'Digest': 'SHA-256=' + digest})
+        self.assertEqual(400, response.code)
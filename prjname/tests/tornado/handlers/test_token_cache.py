@@ -0,0 +1,119 @@
+"""
+Verified JWT token cache tests
+"""
+import mock
+from tornado import testing
+
+from prjname.common.tornado.handlers import token_cache
+
+
+class Token(object):  # pylint: disable=too-few-public-methods
+    """
+    JWTToken replacement: token strings starting with 'invalid' do not verify
+    """
+
+    created = 0
+
+    def __init__(self, token, certificate):
+        Token.created += 1
+        if token.startswith('invalid'):
+            raise ValueError('invalid signature')
+        self.token = token
+        self.certificate = certificate
+        self.payload = {'exp': EXPIRATIONS.get(token)} if token in EXPIRATIONS else {}
+
+
+# Token string to exp claim, relative to the mocked time of 1000
+EXPIRATIONS = {
+    'expiring': 1030,
+    'expired': 990,
+    'unreadable_exp': 'tomorrow',
+}
+
+
+@mock.patch('prjname.common.utils.caches.time.time', return_value=1000.0)
+@mock.patch('prjname.common.tornado.handlers.token_cache.time.time', return_value=1000.0)
+@mock.patch('prjname.common.tornado.handlers.token_cache.JWTToken', Token)
+class VerifiedTokenCacheTest(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(VerifiedTokenCacheTest, self).setUp()
+        Token.created = 0
+        self.cache = token_cache.VerifiedTokenCache(maxsize=2, max_ttl=60, offload=False)
+
+    def _advance(self, mocked_times, now):
+        for mocked_time in mocked_times:
+            mocked_time.return_value = now
+
+    @testing.gen_test
+    def test_verified_once(self, *_):
+        first = yield self.cache.get_token('token', 'certificate')
+        second = yield self.cache.get_token('token', 'certificate')
+
+        self.assertIs(first, second)
+        self.assertEqual(1, Token.created)
+
+    @testing.gen_test
+    def test_verified_again_with_other_certificate(self, *_):
+        yield self.cache.get_token('token', 'certificate')
+        token = yield self.cache.get_token('token', 'other')
+
+        self.assertEqual('other', token.certificate)
+        self.assertEqual(2, Token.created)
+
+    @testing.gen_test
+    def test_expiry_capped_at_token_expiration(self, *mocked_times):
+        yield self.cache.get_token('expiring', 'certificate')
+
+        self._advance(mocked_times, 1029.0)
+        yield self.cache.get_token('expiring', 'certificate')
+        self.assertEqual(1, Token.created)
+
+        self._advance(mocked_times, 1030.0)
+        yield self.cache.get_token('expiring', 'certificate')
+        self.assertEqual(2, Token.created)
+
+    @testing.gen_test
+    def test_expiry_capped_at_max_ttl(self, *mocked_times):
+        yield self.cache.get_token('token', 'certificate')
+
+        self._advance(mocked_times, 1060.0)
+        yield self.cache.get_token('token', 'certificate')
+
+        self.assertEqual(2, Token.created)
+
+    @testing.gen_test
+    def test_expired_and_invalid_expiration_not_cached(self, *_):
+        for token_str in ('expired', 'unreadable_exp'):
+            yield self.cache.get_token(token_str, 'certificate')
+            yield self.cache.get_token(token_str, 'certificate')
+
+        self.assertEqual(4, Token.created)
+
+    @testing.gen_test
+    def test_invalid_tokens_not_cached(self, *_):
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                yield self.cache.get_token('invalid', 'certificate')
+
+        self.assertEqual(2, Token.created)
+
+    @testing.gen_test
+    def test_size_bounded(self, *_):
+        for token_str in ('first', 'second', 'third'):
+            yield self.cache.get_token(token_str, 'certificate')
+
+        yield self.cache.get_token('third', 'certificate')
+        self.assertEqual(3, Token.created)
+        yield self.cache.get_token('first', 'certificate')
+        self.assertEqual(4, Token.created)
+
+    @testing.gen_test
+    def test_stats(self, *_):
+        support = mock.Mock()
+
+        yield self.cache.get_token('token', 'certificate', support)
+        yield self.cache.get_token('token', 'certificate', support)
+
+        support.stat_increment.assert_has_calls([mock.call('auth.jwt.cache_miss_count'),
+                                                 mock.call('auth.jwt.cache_hit_count')])
@@ -0,0 +1,46 @@
+"""
+Pre-fork tests
+"""
+import argparse
+import unittest
+
+import mock
+
+from prjname.common.tornado import prefork
+
+
+class ParseWorkersTest(unittest.TestCase):
+
+    def test_number(self):
+        self.assertEqual(3, prefork.parse_workers('3'))
+
+    @mock.patch.object(prefork.multiprocessing, 'cpu_count', return_value=8)
+    def test_auto(self, _):
+        self.assertEqual(8, prefork.parse_workers(prefork.AUTO))
+
+    @mock.patch.object(prefork.multiprocessing, 'cpu_count', side_effect=NotImplementedError)
+    def test_auto_without_cpu_count(self, _):
+        self.assertEqual(1, prefork.parse_workers(prefork.AUTO))
+
+    def test_invalid(self):
+        for value in ('0', '-1', 'many'):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                prefork.parse_workers(value)
+
+
+@mock.patch.object(prefork, 'fork_workers', return_value=1)
+@mock.patch.object(prefork.bootstrap, 'before_fork')
+class StartTest(unittest.TestCase):
+
+    def test_single_process_not_forked(self, before_fork, fork_workers):
+        self.assertIsNone(prefork.start(1))
+
+        self.assertFalse(before_fork.called)
+        self.assertFalse(fork_workers.called)
+
+    def test_workers_forked_after_shared_resources(self, before_fork, fork_workers):
+        with mock.patch.object(prefork.settings, 'WORKER_MAX_RESTARTS', '10'):
+            self.assertEqual(1, prefork.start(4))
+
+        before_fork.assert_called_once_with()
+        fork_workers.assert_called_once_with(4, 10)
@@ -0,0 +1,85 @@
+"""
+Analytics pipeline tests
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+from tornado import gen
+from tornado import testing
+
+from prjname.common.utils import analytics
+
+
+class RotatingGzipWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def _files(self):
+        return sorted(name.endswith(analytics.PARTIAL_SUFFIX)
+                      for name in os.listdir(self.directory))
+
+    @mock.patch('prjname.common.utils.analytics.time.time', return_value=1000.0)
+    def test_idle_file_closed_after_max_age(self, now):
+        writer = analytics.RotatingGzipWriter(self.directory, max_age=60)
+        writer.write_lines(['{}'])
+
+        writer.close_expired()
+        self.assertEqual([True], self._files())
+
+        now.return_value = 1060.0
+        writer.close_expired()
+        self.assertEqual([False], self._files())
+
+    def test_file_closed_after_max_bytes(self):
+        writer = analytics.RotatingGzipWriter(self.directory, max_bytes=1)
+
+        writer.write_lines(['{}'])
+
+        self.assertEqual([False], self._files())
+
+
+class AnalyticsPipelineTest(testing.AsyncTestCase):
+
+    def _pipeline(self, writer, **kwargs):
+        pipeline = analytics.AnalyticsPipeline(writer, flush_interval=0.01, **kwargs)
+        self.addCleanup(pipeline.close)
+        return pipeline
+
+    @gen.coroutine
+    def _wait_for(self, condition):
+        for _ in range(100):
+            if condition():
+                return
+            yield gen.sleep(0.01)
+
+    @testing.gen_test
+    def test_dropped_events_reported(self):
+        writer = mock.Mock()
+        writer.write_lines.side_effect = IOError('disk full')
+        support = mock.Mock()
+        pipeline = self._pipeline(writer, max_buffered=2)
+        pipeline.set_support(support, self.io_loop)
+
+        for _ in range(3):
+            pipeline.record('env', 'service', 'handler', 'app', 'account', 'user', 'device')
+        reported = lambda: sum(call[0][1] for call in support.stat_increment.call_args_list
+                               if call[0][0] == 'analytics.dropped_count')
+        yield self._wait_for(lambda: reported() == 3)
+
+        self.assertEqual(3, pipeline.dropped)
+        self.assertEqual(3, reported())
+
+    @testing.gen_test
+    def test_expired_files_closed_without_events(self):
+        writer = mock.Mock()
+        self._pipeline(writer)
+
+        yield self._wait_for(lambda: writer.close_expired.called)
+
+        self.assertTrue(writer.close_expired.called)
+        self.assertFalse(writer.write_lines.called)
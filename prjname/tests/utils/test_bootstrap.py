@@ -0,0 +1,28 @@
+"""
+Process bootstrap tests
+"""
+import unittest
+
+import mock
+
+from prjname.common.utils import bootstrap
+
+
+class BootstrapTest(unittest.TestCase):
+
+    @mock.patch.object(bootstrap, '_PROCESS_CONTEXT', None)
+    @mock.patch.object(bootstrap.settings, 'RATE_LIMIT_SHARED', True)
+    @mock.patch.object(bootstrap.rate_limit, 'install_shared_store')
+    def test_shared_resources_not_created(self, install_shared_store):
+        process_context = bootstrap.bootstrap()
+
+        self.assertIs(process_context, bootstrap.get_process_context())
+        self.assertFalse(install_shared_store.called)
+
+    @mock.patch.object(bootstrap.settings, 'RATE_LIMIT_SHARED', True)
+    @mock.patch.object(bootstrap.rate_limit, 'install_shared_store')
+    def test_shared_rate_limit_store_before_fork(self, install_shared_store):
+        with mock.patch.object(bootstrap.settings, 'RATE_LIMIT_SHARED_SLOTS', '128'):
+            bootstrap.before_fork()
+
+        install_shared_store.assert_called_once_with(128)
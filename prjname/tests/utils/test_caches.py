@@ -0,0 +1,59 @@
+"""
+In process caches tests
+"""
+import unittest
+
+import mock
+
+from prjname.common.utils import caches
+
+
+@mock.patch('prjname.common.utils.caches.time.time', return_value=1000.0)
+class TTLCacheTest(unittest.TestCase):
+
+    def test_get_before_expiry(self, _):
+        cache = caches.TTLCache(maxsize=2, ttl=10)
+        cache.set('key', 'value')
+
+        self.assertEqual('value', cache.get('key'))
+        self.assertIn('key', cache)
+
+    def test_expired_entries_removed(self, time_mock):
+        cache = caches.TTLCache(maxsize=2, ttl=10)
+        cache.set('key', 'value')
+
+        time_mock.return_value = 1010.0
+
+        self.assertEqual('default', cache.get('key', 'default'))
+        self.assertNotIn('key', cache)
+        self.assertEqual(0, len(cache))
+
+    def test_ttl_per_entry(self, time_mock):
+        cache = caches.TTLCache(maxsize=2, ttl=10)
+        cache.set('short', 'value', ttl=1)
+        cache.set('long', 'value')
+
+        time_mock.return_value = 1005.0
+
+        self.assertIsNone(cache.get('short'))
+        self.assertEqual('value', cache.get('long'))
+
+    def test_least_recently_used_evicted(self, _):
+        cache = caches.TTLCache(maxsize=2, ttl=10)
+        cache.set('first', 1)
+        cache.set('second', 2)
+        cache.get('first')
+
+        cache.set('third', 3)
+
+        self.assertEqual(2, len(cache))
+        self.assertEqual(1, cache.get('first'))
+        self.assertIsNone(cache.get('second'))
+        self.assertEqual(3, cache.get('third'))
+
+    def test_pop(self, _):
+        cache = caches.TTLCache(maxsize=2, ttl=10)
+        cache.set('key', 'value')
+
+        self.assertEqual('value', cache.pop('key'))
+        self.assertIsNone(cache.pop('key'))
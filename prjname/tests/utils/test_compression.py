@@ -0,0 +1,64 @@
+"""
+HTTP content encodings tests
+"""
+import unittest
+import zlib
+
+from prjname.common.utils import compression
+
+DATA = b'{"items": [%s]}' % b', '.join(b'{"id": %d}' % number for number in range(200))
+
+
+class CompressionTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        for encoding in (compression.GZIP, compression.DEFLATE):
+            compressed = compression.compress(DATA, encoding)
+
+            self.assertLess(len(compressed), len(DATA))
+            self.assertEqual(DATA, compression.decompress(compressed, encoding))
+
+    def test_incremental_decompression(self):
+        compressed = compression.compress(DATA, compression.GZIP)
+        decompressor = compression.Decompressor('GZIP ')
+
+        chunks = [decompressor.decompress(compressed[start:start + 10])
+                  for start in range(0, len(compressed), 10)]
+
+        self.assertEqual(DATA, b''.join(chunks) + decompressor.flush())
+
+    def test_raw_deflate_accepted(self):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        raw = compressor.compress(DATA) + compressor.flush()
+
+        self.assertEqual(DATA, compression.decompress(raw, compression.DEFLATE))
+
+    def test_identity(self):
+        self.assertEqual(DATA, compression.decompress(DATA, None))
+        self.assertEqual(DATA, compression.decompress(DATA, compression.IDENTITY))
+
+    def test_unsupported_encoding(self):
+        with self.assertRaises(ValueError):
+            compression.compress(DATA, 'compress')
+        with self.assertRaises(ValueError):
+            compression.Decompressor('compress')
+
+
+class NegotiateTest(unittest.TestCase):
+
+    supported = (compression.GZIP, compression.DEFLATE)
+
+    def test_preferred_supported_encoding(self):
+        self.assertEqual('gzip', compression.negotiate('deflate, gzip', self.supported))
+
+    def test_quality(self):
+        self.assertEqual('deflate', compression.negotiate('gzip;q=0.5, deflate',
+                                                          self.supported))
+
+    def test_wildcard(self):
+        self.assertEqual('deflate', compression.negotiate('gzip;q=0, *', self.supported))
+
+    def test_identity_used(self):
+        for accept_encoding in (None, '', 'identity', 'br', 'gzip;q=0, deflate;q=0'):
+            self.assertIsNone(compression.negotiate(accept_encoding, self.supported),
+                              accept_encoding)
@@ -0,0 +1,64 @@
+"""
+Deadline tests
+"""
+import unittest
+
+import mock
+from tornado import httputil
+
+from prjname.common import constants
+from prjname.common import exceptions
+from prjname.common.utils.deadline import Deadline
+
+
+def _request(timeout_ms=None):
+    headers = httputil.HTTPHeaders()
+    if timeout_ms is not None:
+        headers[constants.REQUEST_TIMEOUT_HTTP_HEADER] = str(timeout_ms)
+    request = httputil.HTTPServerRequest('GET', '/', headers=headers)
+    request.received_at = 1000.0
+    return request
+
+
+@mock.patch('prjname.common.utils.deadline.time.time', return_value=1000.5)
+class DeadlineTest(unittest.TestCase):
+
+    def test_from_request_header(self, _):
+        deadline = Deadline.from_request(_request(2000))
+
+        self.assertTrue(deadline.bounded)
+        self.assertEqual(1002.0, deadline.expires_at)
+        self.assertEqual(1.5, deadline.remaining())
+        self.assertEqual(1.0, deadline.timeout(1.0))
+        self.assertEqual('1500', deadline.header_value())
+
+    def test_shared_by_the_request(self, _):
+        request = _request(2000)
+
+        self.assertIs(Deadline.from_request(request), Deadline.from_request(request))
+
+    def test_unbounded_without_budget(self, _):
+        deadline = Deadline.from_request(_request())
+
+        self.assertFalse(deadline.bounded)
+        self.assertFalse(deadline.expired())
+        self.assertIsNone(deadline.timeout())
+        self.assertEqual(3.0, deadline.timeout(3.0))
+        deadline.check('operation')
+
+    def test_unbounded_deadline_cancelled(self, _):
+        deadline = Deadline.from_request(_request())
+
+        deadline.cancel()
+
+        self.assertTrue(deadline.expired())
+        self.assertEqual(0.0, deadline.timeout(3.0))
+        with self.assertRaises(exceptions.DeadlineExceeded):
+            deadline.check('operation')
+
+    def test_expired(self, _):
+        deadline = Deadline.from_request(_request(100))
+
+        self.assertEqual(0.0, deadline.remaining())
+        with self.assertRaises(exceptions.DeadlineExceeded):
+            deadline.check('operation')
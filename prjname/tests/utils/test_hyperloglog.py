@@ -0,0 +1,66 @@
+"""
+HyperLogLog cardinality estimator tests
+"""
+import unittest
+
+from prjname.common.utils.hyperloglog import HyperLogLog
+
+
+class HyperLogLogTest(unittest.TestCase):
+
+    def _assert_within(self, expected, estimate, error):
+        self.assertLessEqual(abs(estimate - expected), expected * error,
+                             '%d estimated for %d distinct values' % (estimate, expected))
+
+    def test_empty(self):
+        self.assertEqual(0, HyperLogLog().cardinality())
+
+    def test_small_cardinalities_almost_exact(self):
+        estimator = HyperLogLog()
+        for value in range(100):
+            estimator.add('device-%d' % value)
+
+        self._assert_within(100, estimator.cardinality(), 0.02)
+
+    def test_large_cardinality_within_error_bound(self):
+        # 3 standard errors (1.6% each for the default precision)
+        estimator = HyperLogLog()
+        for value in range(50000):
+            estimator.add('device-%d' % value)
+
+        self._assert_within(50000, estimator.cardinality(), 0.05)
+
+    def test_lower_precision_bigger_error_bound(self):
+        # 3 standard errors (1.04 / sqrt(2 ** 8) = 6.5% each)
+        estimator = HyperLogLog(precision=8)
+        for value in range(10000):
+            estimator.add('device-%d' % value)
+
+        self._assert_within(10000, estimator.cardinality(), 0.2)
+
+    def test_repeated_values_counted_once(self):
+        estimator = HyperLogLog()
+        for _ in range(10):
+            for value in range(1000):
+                estimator.add(u'device-%d' % value)
+
+        self._assert_within(1000, estimator.cardinality(), 0.05)
+
+    def test_merge(self):
+        first = HyperLogLog()
+        second = HyperLogLog()
+        for value in range(2000):
+            first.add(value)
+            second.add(value + 1000)
+
+        first.merge(second)
+
+        self._assert_within(3000, first.cardinality(), 0.05)
+
+    def test_merge_different_precision(self):
+        with self.assertRaises(ValueError):
+            HyperLogLog(precision=10).merge(HyperLogLog(precision=12))
+
+    def test_invalid_precision(self):
+        with self.assertRaises(ValueError):
+            HyperLogLog(precision=20)
@@ -0,0 +1,92 @@
+"""
+KeyValueAdapter tests
+"""
+import unittest
+
+import mock
+from tornado import concurrent
+from tornado import httputil
+from tornado import testing
+
+from prjname.common import constants
+from prjname.common import exceptions
+from prjname.common.tornado.handlers.base import Context
+from prjname.common.utils import keyvalue_adapter
+
+
+class KeyValueAdapterDeadlineTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(keyvalue_adapter.cassandra_adapter, 'CassandraAdapter')
+        self.cassandra = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+        time_patcher = mock.patch('prjname.common.utils.deadline.time.time', return_value=1000.0)
+        time_patcher.start()
+        self.addCleanup(time_patcher.stop)
+
+    @staticmethod
+    def _context(timeout_ms):
+        request = httputil.HTTPServerRequest(
+            'GET', '/', headers=httputil.HTTPHeaders(
+                {constants.REQUEST_TIMEOUT_HTTP_HEADER: str(timeout_ms)}))
+        request.received_at = 1000.0
+        return Context(request)
+
+    def test_query_bounded_by_context_deadline(self):
+        context = self._context(1500)
+        adapter = keyvalue_adapter.KeyValueAdapter(keyspace='tests', context=context)
+
+        adapter._execute('SELECT * FROM t', {})  # pylint: disable=protected-access
+
+        self.cassandra.execute_async.assert_called_once_with(
+            'tests', 'SELECT * FROM t', {}, timeout=context.deadline.remaining())
+        self.assertEqual(1.5, context.deadline.remaining())
+
+    def test_shared_adapter_bound_to_context(self):
+        shared = keyvalue_adapter.KeyValueAdapter(keyspace='tests')
+        adapter = shared.for_context(self._context(200))
+
+        adapter._execute('SELECT * FROM t', {})  # pylint: disable=protected-access
+
+        self.cassandra.execute_async.assert_called_once_with(
+            'tests', 'SELECT * FROM t', {}, timeout=mock.ANY)
+        self.assertAlmostEqual(0.2, self.cassandra.execute_async.call_args[1]['timeout'])
+        self.assertIsNone(shared.deadline)
+
+    def test_no_query_after_deadline(self):
+        adapter = keyvalue_adapter.KeyValueAdapter(keyspace='tests', context=self._context(0))
+
+        with self.assertRaises(exceptions.DeadlineExceeded):
+            adapter._execute('SELECT * FROM t', {})  # pylint: disable=protected-access
+        self.assertFalse(self.cassandra.execute_async.called)
+
+
+class KeyValueAdapterVersionTest(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(KeyValueAdapterVersionTest, self).setUp()
+        patcher = mock.patch.object(keyvalue_adapter.cassandra_adapter, 'CassandraAdapter')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.adapter = keyvalue_adapter.KeyValueAdapter(cb_bucket='values', keyspace='tests')
+
+    def _rows(self, rows):
+        result = concurrent.Future()
+        result.set_result(rows)
+        return mock.patch.object(self.adapter, '_execute', return_value=result)
+
+    @testing.gen_test
+    def test_version(self):
+        with self._rows([mock.Mock(version=1234)]):
+            version = yield self.adapter.get_version('key')
+
+        self.assertEqual(1234, version)
+
+    @testing.gen_test
+    def test_missing_key(self):
+        with self._rows([]):
+            with self.assertRaises(exceptions.DatabaseOperationError) as raised:
+                yield self.adapter.get_version('key')
+
+        self.assertIn('Value for Key key on table values not found', str(raised.exception))
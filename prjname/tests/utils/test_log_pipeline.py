@@ -0,0 +1,139 @@
+"""
+Non blocking logging tests
+"""
+import logging
+import threading
+import time
+import unittest
+
+from prjname.common.utils import log_pipeline
+
+
+class Stream(object):
+    """
+    Records every write, the first one waits until released
+    """
+
+    def __init__(self):
+        self.writes = []
+        self.writing = threading.Event()
+        self.released = threading.Event()
+
+    def write(self, data):
+        self.writing.set()
+        self.released.wait(5)
+        self.writes.append(data)
+
+    def flush(self):
+        pass
+
+
+def _record(message):
+    return logging.LogRecord('tests', logging.INFO, __file__, 0, message, None, None)
+
+
+class LogPipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stream = Stream()
+        self.handler = logging.StreamHandler(self.stream)
+        self.handlers = (self.handler,)
+
+    def _start(self, **kwargs):
+        pipeline = log_pipeline.LogPipeline(**kwargs)
+        self.addCleanup(self.stream.released.set)
+        # The writer thread is busy with the first record until released
+        pipeline.put(self.handlers, _record('first'))
+        self.assertTrue(self.stream.writing.wait(5))
+        return pipeline
+
+    def _written(self):
+        return ''.join(self.stream.writes).splitlines()
+
+    def test_records_dropped_when_full(self):
+        pipeline = self._start(queue_size=1, overflow=log_pipeline.DROP)
+
+        pipeline.put(self.handlers, _record('second'))
+        pipeline.put(self.handlers, _record('third'))
+        self.stream.released.set()
+        pipeline.close()
+
+        self.assertEqual(1, pipeline.dropped)
+        self.assertEqual(['first', 'second', '1 log records dropped, log queue full'],
+                         self._written())
+
+    def test_caller_blocked_when_full(self):
+        pipeline = self._start(queue_size=1, overflow=log_pipeline.BLOCK)
+        pipeline.put(self.handlers, _record('second'))
+
+        caller = threading.Thread(target=pipeline.put, args=(self.handlers, _record('third')))
+        caller.start()
+        caller.join(0.05)
+        self.assertTrue(caller.is_alive())
+
+        self.stream.released.set()
+        caller.join(5)
+        pipeline.close()
+
+        self.assertEqual(0, pipeline.dropped)
+        self.assertEqual(['first', 'second', 'third'], self._written())
+
+    def test_records_written_in_batches(self):
+        pipeline = self._start(batch_size=2)
+
+        for number in range(5):
+            pipeline.put(self.handlers, _record('record %d' % number))
+        self.stream.released.set()
+        pipeline.close()
+
+        self.assertEqual(['first\n', 'record 0\nrecord 1\n', 'record 2\nrecord 3\n',
+                          'record 4\n'], self.stream.writes)
+
+    def test_concurrent_drops_counted(self):
+        pipeline = self._start(queue_size=1, overflow=log_pipeline.DROP)
+        pipeline.put(self.handlers, _record('second'))
+
+        def log():
+            for _ in range(1000):
+                pipeline.put(self.handlers, _record('dropped'))
+
+        callers = [threading.Thread(target=log) for _ in range(4)]
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join(5)
+
+        self.assertEqual(4000, pipeline.dropped)
+        self.stream.released.set()
+        pipeline.close()
+
+    def test_invalid_overflow(self):
+        with self.assertRaises(ValueError):
+            log_pipeline.LogPipeline(overflow='other')
+
+
+class AsyncLogHandlerTest(unittest.TestCase):
+
+    def test_message_rendered_when_queued(self):
+        arguments = ['value']
+        record = logging.LogRecord('tests', logging.INFO, __file__, 0, 'logged %s',
+                                   (arguments,), None)
+
+        log_pipeline.AsyncLogHandler.prepare(record)
+        arguments.append('mutated')
+
+        self.assertEqual("logged ['value']", record.getMessage())
+
+    def test_records_written_by_writer_thread(self):
+        stream = Stream()
+        stream.released.set()
+        pipeline = log_pipeline.LogPipeline()
+        handler = log_pipeline.AsyncLogHandler(pipeline, [logging.StreamHandler(stream)])
+
+        handler.handle(_record('queued'))
+        started = time.time()
+        while not stream.writes and time.time() - started < 5:
+            time.sleep(0.01)
+        pipeline.close()
+
+        self.assertEqual(['queued\n'], stream.writes)
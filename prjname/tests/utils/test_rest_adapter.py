@@ -0,0 +1,183 @@
+"""
+RestAdapter tests
+"""
+import json
+
+from tornado import concurrent
+from tornado import testing
+from tornado import web
+
+import mock
+
+from prjname.common import exceptions
+from prjname.common import settings
+from prjname.common.utils import compression
+from prjname.common.utils import latency
+from prjname.common.utils import rest_adapter
+
+
+class JsonHandler(web.RequestHandler):  # pylint: disable=abstract-method
+
+    def get(self, code):
+        body = self.get_argument('body')
+        self.set_status(int(code))
+        self.set_header('Content-Type', 'application/json')
+        # Flushed so the body is chunked and decoded while it arrives
+        self.flush()
+        self.write(body)
+
+
+class RestAdapterDecodingTest(testing.AsyncHTTPTestCase):
+
+    def get_app(self):
+        return web.Application([(r'/(\d+)', JsonHandler)])
+
+    def _adapter(self, incremental_decoding=False):
+        return rest_adapter.RestAdapter(self.get_url(''), None, None,
+                                        decode_responses=True,
+                                        incremental_decoding=incremental_decoding)
+
+    @testing.gen_test
+    def test_decoded_body(self):
+        code, body = yield self._adapter().get('/200', {'body': '{"a": 1}'}, path_template='/{code}')
+
+        self.assertEqual(200, code)
+        self.assertEqual({'a': 1}, body)
+
+    @testing.gen_test
+    def test_invalid_successful_body(self):
+        with self.assertRaises(exceptions.ExternalProviderBadResponse):
+            yield self._adapter().get('/200', {'body': '{"a": '}, path_template='/{code}')
+
+    @testing.gen_test
+    def test_invalid_error_body_returned_as_it_is(self):
+        for incremental_decoding in (False, True):
+            code, body = yield self._adapter(incremental_decoding).get(
+                '/502', {'body': 'bad gateway'}, path_template='/{code}')
+
+            self.assertEqual(502, code)
+            self.assertEqual('bad gateway', body)
+
+    @testing.gen_test
+    def test_incremental_decoding_closed_on_failure(self):
+        adapter = self._adapter(incremental_decoding=True)
+        decodings = []
+        decode_stream = adapter._decode_stream  # pylint: disable=protected-access
+
+        def fetch(request, **kwargs):  # pylint: disable=unused-argument
+            request.header_callback('HTTP/1.1 200 OK\r\n')
+            request.header_callback('Content-Type: application/json\r\n')
+            request.streaming_callback('{"a": ')
+            future = concurrent.Future()
+            future.set_exception(IOError('connection reset'))
+            return future
+
+        def record_decode_stream(decoder):
+            decodings.append(decode_stream(decoder))
+            return decodings[-1]
+
+        with mock.patch.object(adapter, '_decode_stream', record_decode_stream), \
+                mock.patch.object(adapter._http_client, 'fetch', fetch):  # pylint: disable=protected-access
+            with self.assertRaises(IOError):
+                yield adapter.get('/200')
+
+        self.assertEqual(1, len(decodings))
+        with self.assertRaises(Exception):
+            # The worker got the end of the stream instead of waiting forever
+            yield decodings[0].future
+
+
+class RestAdapterLatencyTest(testing.AsyncHTTPTestCase):
+
+    def setUp(self):
+        super(RestAdapterLatencyTest, self).setUp()
+        patcher = mock.patch.object(latency, 'REGISTRY', latency.LatencyRegistry())
+        self.registry = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.adapter = rest_adapter.RestAdapter(self.get_url(''), None, None)
+
+    def get_app(self):
+        return web.Application([(r'/(\d+)', JsonHandler)])
+
+    @testing.gen_test
+    def test_latency_by_path_template(self):
+        yield self.adapter.get('/200', {'body': '{}'}, path_template='/{code}')
+
+        self.assertEqual(1, self.registry.histogram(self.get_url('')).count)
+        self.assertEqual(1, self.registry.histogram(self.get_url(''), '/{code}').count)
+
+    @testing.gen_test
+    def test_latency_without_path_template_recorded_once(self):
+        yield self.adapter.get('/200', {'body': '{}'})
+
+        self.assertEqual(1, self.registry.histogram(self.get_url('')).count)
+
+    @testing.gen_test
+    def test_timeouts_not_recorded(self):
+        timeout = concurrent.Future()
+        timeout.set_result(mock.Mock(code=599, body=None))
+
+        with mock.patch.object(self.adapter._http_client, 'fetch',  # pylint: disable=protected-access
+                               return_value=timeout):
+            code, _ = yield self.adapter.get('/200', path_template='/{code}')
+
+        self.assertEqual(599, code)
+        self.assertEqual(0, self.registry.histogram(self.get_url('')).count)
+        self.assertEqual(0, self.registry.histogram(self.get_url(''), '/{code}').count)
+
+
+class EchoHandler(web.RequestHandler):  # pylint: disable=abstract-method
+
+    def post(self):
+        encoding = self.request.headers.get('Content-Encoding')
+        self.write(json.dumps({
+            'encoding': encoding,
+            'body': compression.decompress(self.request.body, encoding),
+        }))
+
+    def get(self):
+        body = self.get_argument('body')
+        if 'gzip' in self.request.headers.get('Accept-Encoding', ''):
+            self.set_header('Content-Encoding', 'gzip')
+            body = compression.compress(body, 'gzip')
+        self.write(body)
+
+
+@mock.patch.object(settings, 'REST_COMPRESS_MIN_SIZE', 1024)
+@mock.patch.object(settings, 'REST_REQUEST_ENCODING', 'gzip')
+class RestAdapterCompressionTest(testing.AsyncHTTPTestCase):
+
+    def get_app(self):
+        return web.Application([(r'/', EchoHandler)])
+
+    def _adapter(self, **kwargs):
+        return rest_adapter.RestAdapter(self.get_url(''), None, mock.Mock(), **kwargs)
+
+    @testing.gen_test
+    def test_request_compressed(self):
+        body = 'x' * 2048
+
+        _, response = yield self._adapter(compress_requests=True).post('/', body=body)
+
+        self.assertEqual({'encoding': 'gzip', 'body': body}, json.loads(response))
+
+    @testing.gen_test
+    def test_small_request_not_compressed(self):
+        _, response = yield self._adapter(compress_requests=True).post('/', body='x' * 100)
+
+        self.assertEqual({'encoding': None, 'body': 'x' * 100}, json.loads(response))
+
+    @testing.gen_test
+    def test_request_not_compressed_when_disabled(self):
+        _, response = yield self._adapter(compress_requests=False).post('/', body='x' * 2048)
+
+        self.assertIsNone(json.loads(response)['encoding'])
+
+    @testing.gen_test
+    def test_response_decompressed(self):
+        adapter = self._adapter(accept_compressed=True)
+
+        code, body = yield adapter.get('/', {'body': 'y' * 2048})
+
+        self.assertEqual(200, code)
+        self.assertEqual('y' * 2048, body)
@@ -0,0 +1,55 @@
+"""
+Retry policy tests
+"""
+import itertools
+import unittest
+
+import mock
+
+from prjname.common.utils import retry
+
+
+class BackoffDelaysTest(unittest.TestCase):
+
+    def test_no_jitter(self):
+        delays = retry.backoff_delays(1, 2, max_delay=10, jitter=retry.NO_JITTER)
+
+        self.assertEqual([1, 2, 4, 8, 10, 10], list(itertools.islice(delays, 6)))
+
+    def test_full_jitter_bounded_by_exponential_delay(self):
+        delays = list(itertools.islice(retry.backoff_delays(1, 2, jitter=retry.FULL_JITTER), 5))
+
+        for number, wait in enumerate(delays):
+            self.assertTrue(0 <= wait <= 2 ** number)
+
+    def test_unknown_jitter(self):
+        with self.assertRaises(ValueError):
+            next(retry.backoff_delays(1, jitter='other'))
+
+
+@mock.patch('prjname.common.utils.retry.time.time', return_value=1000.0)
+class RetryBudgetTest(unittest.TestCase):
+
+    def test_retries_earned_by_calls(self, _):
+        budget = retry.RetryBudget(ratio=0.1, min_retries_per_second=0)
+
+        for _ in range(20):
+            budget.record_call()
+
+        self.assertEqual(2, sum(budget.try_retry() for _ in range(5)))
+
+    def test_free_retries_per_second(self, now):
+        budget = retry.RetryBudget(ratio=0.1, min_retries_per_second=2)
+
+        self.assertEqual(2, sum(budget.try_retry() for _ in range(5)))
+        now.return_value = 1000.5
+        self.assertEqual(1, sum(budget.try_retry() for _ in range(5)))
+
+    def test_less_than_one_free_retry_per_second(self, now):
+        budget = retry.RetryBudget(ratio=0.1, min_retries_per_second=0.5)
+
+        self.assertTrue(budget.try_retry())
+        self.assertFalse(budget.try_retry())
+        now.return_value = 1002.0
+        self.assertTrue(budget.try_retry())
+        self.assertFalse(budget.try_retry())
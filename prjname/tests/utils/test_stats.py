@@ -0,0 +1,101 @@
+"""
+Aggregating statsd client tests
+"""
+import unittest
+
+import mock
+
+from prjname.common.utils import stats
+
+
+class AggregatingStatsClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = stats.AggregatingStatsClient(prefix='tests', max_timing_samples=3)
+        self.client._socket = mock.Mock()  # pylint: disable=protected-access
+
+    def _packets(self):
+        return [call[0][0] for call in self.client._socket.sendto.call_args_list]  # pylint: disable=protected-access
+
+    def _lines(self):
+        self.client.flush()
+        return sorted(line for packet in self._packets() for line in packet.split('\n'))
+
+    def test_counters_summed(self):
+        self.client.incr('requests')
+        self.client.incr('requests', 4)
+        self.client.decr('requests', 2)
+
+        self.assertEqual(['tests.requests:3|c'], self._lines())
+
+    def test_gauges(self):
+        self.client.gauge('connections', 3)
+        self.client.gauge('connections', 5)
+        self.client.gauge('queue', 2, delta=True)
+        self.client.gauge('queue', -3, delta=True)
+
+        self.assertEqual(['tests.connections:5|g', 'tests.queue:-1|g'], self._lines())
+
+    def test_timings_below_max_samples(self):
+        self.client.timing('latency', 1.5)
+        self.client.timing('latency', 2)
+
+        self.assertEqual(['tests.latency:1.500000|ms', 'tests.latency:2.000000|ms'],
+                         self._lines())
+
+    def test_timings_sampled_with_rate(self):
+        for value in range(6):
+            self.client.timing('latency', value)
+
+        lines = self._lines()
+
+        self.assertEqual(3, len(lines))
+        for line in lines:
+            self.assertTrue(line.endswith('|ms|@0.5000'), line)
+
+    def test_sets_sent_as_cardinality_gauge(self):
+        for value in ('a', 'b', 'a'):
+            self.client.set('devices', value)
+
+        self.assertEqual(['tests.devices.cardinality:2|g'], self._lines())
+
+    def test_sets_kept_for_window(self):
+        client = stats.AggregatingStatsClient(flush_interval=1.0, set_window=2.0)
+        client._socket = mock.Mock()  # pylint: disable=protected-access
+        client.set('devices', 'a')
+
+        client.flush()
+        client.set('devices', 'b')
+        client.flush()
+        client.flush()
+
+        packets = [call[0][0] for call in client._socket.sendto.call_args_list]  # pylint: disable=protected-access
+        self.assertEqual(['devices.cardinality:1|g', 'devices.cardinality:2|g'], packets)
+
+    def test_aggregates_reset_after_flush(self):
+        self.client.incr('requests')
+        self.client.flush()
+        self.client.flush()
+
+        self.assertEqual(['tests.requests:1|c'], self._packets())
+
+    def test_packets_bounded(self):
+        self.client._max_packet_size = 45  # pylint: disable=protected-access
+        for number in range(5):
+            self.client.incr('requests.%d' % number)
+
+        self.client.flush()
+
+        packets = self._packets()
+        self.assertEqual(3, len(packets))
+        for packet in packets:
+            self.assertLessEqual(len(packet), 45)
+        self.assertEqual(5, sum(len(packet.split('\n')) for packet in packets))
+
+    def test_dropped_packets_counted(self):
+        self.client._socket.sendto.side_effect = stats.socket.error  # pylint: disable=protected-access
+        self.client.incr('requests')
+
+        self.client.flush()
+
+        self.assertEqual(1, self.client.dropped_packets)
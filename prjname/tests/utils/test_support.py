@@ -0,0 +1,174 @@
+"""
+Support tests
+"""
+import logging
+import unittest
+
+import mock
+
+from prjname.common import settings
+from prjname.common.utils import support as support_module
+
+
+class RecordsHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class SupportNotifyTest(unittest.TestCase):
+
+    def setUp(self):
+        logger = logging.getLogger('tests.support')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        self.handler = RecordsHandler()
+        logger.addHandler(self.handler)
+        self.addCleanup(logger.removeHandler, self.handler)
+        self.support = support_module.Support(logger, {'handler': 'Tests'}, mock.Mock())
+        self.support.log_entire_request = False
+
+    def test_message_formatted_with_args(self):
+        self.support.notify_info('%s of %d', 'part', 2)
+
+        self.assertEqual('part of 2', self.handler.records[0].getMessage())
+
+    def test_message_not_formatted_below_level(self):
+        render = mock.Mock(return_value='value')
+
+        self.support.notify_debug('expensive %s', support_module.LazyValue(render))
+
+        self.assertEqual([], self.handler.records)
+        self.assertFalse(render.called)
+
+    def test_lazy_value_rendered_when_written(self):
+        render = mock.Mock(return_value='value')
+
+        self.support.notify_info('expensive %s', support_module.LazyValue(render))
+
+        self.assertEqual('expensive value', self.handler.records[0].getMessage())
+        render.assert_called_once_with()
+
+    def test_details_keyword(self):
+        self.support.notify_error('failed %s', 'call', details='details')
+
+        self.assertEqual('failed call', self.handler.records[0].getMessage())
+        self.assertEqual('details', self.handler.records[0].details)
+
+    def test_positional_details(self):
+        self.support.notify_error('failed', {'call': 'details'})
+        self.support.notify_info(ValueError('invalid'), 'more details')
+
+        self.assertEqual('failed', self.handler.records[0].getMessage())
+        self.assertEqual({'call': 'details'}, self.handler.records[0].details)
+        self.assertEqual('invalid', self.handler.records[1].getMessage())
+        self.assertEqual('more details', self.handler.records[1].details)
+
+    def test_percent_in_message_with_positional_details(self):
+        self.support.notify_error('disk 95% full', {'disk': '/data'})
+
+        self.assertEqual('disk 95% full', self.handler.records[0].getMessage())
+        self.assertEqual({'disk': '/data'}, self.handler.records[0].details)
+
+    def test_single_argument_formatted(self):
+        self.support.notify_warning('failed %s', 'call')
+
+        self.assertEqual('failed call', self.handler.records[0].getMessage())
+        self.assertEqual('failed %s', self.handler.records[0].details)
+
+    def test_details_default_to_message(self):
+        self.support.notify_warning('warning')
+
+        self.assertEqual('warning', self.handler.records[0].details)
+
+
+@mock.patch.object(settings, 'LOG_TAIL_BUFFER_SIZE', 3)
+@mock.patch.object(settings, 'LOG_TAIL_LATENCY_THRESHOLD', 1000)
+@mock.patch.object(settings, 'LOG_TAIL_SAMPLE_RATE', 0.01)
+@mock.patch('prjname.common.utils.support.random.random', return_value=0.5)
+class SupportTailBufferTest(unittest.TestCase):
+
+    def setUp(self):
+        logger = logging.getLogger('tests.support.tail')
+        logger.setLevel(logging.ERROR)
+        logger.propagate = False
+        self.handler = RecordsHandler()
+        logger.addHandler(self.handler)
+        self.addCleanup(logger.removeHandler, self.handler)
+        self.process_context = mock.Mock(log_entire_request=True, stats_client=None)
+
+    def _support(self):
+        with mock.patch.object(support_module.bootstrap, 'get_process_context',
+                               return_value=self.process_context):
+            support = support_module.Support(logging.getLogger('tests.support.tail'),
+                                             {'handler': 'Tests'})
+        with mock.patch('prjname.common.utils.support.time.time', side_effect=[100.0, 101.0]):
+            support.notify_info('first %s', 'info')
+            support.notify_debug('debug')
+        return support
+
+    def _messages(self):
+        return [record.getMessage() for record in self.handler.records]
+
+    def test_written_on_failure(self, _):
+        support = self._support()
+
+        support.notify_error('failed')
+
+        self.assertEqual(['first info', 'debug', 'failed'], self._messages())
+        self.assertEqual([logging.INFO, logging.DEBUG],
+                         [record.levelno for record in self.handler.records[:2]])
+
+    def test_original_timestamps_kept(self, _):
+        support = self._support()
+
+        support.finish_request(500, 10)
+
+        self.assertEqual([100.0, 101.0], [record.created for record in self.handler.records])
+        self.assertEqual('Tests', self.handler.records[0].handler)
+
+    def test_written_on_server_error(self, _):
+        self._support().finish_request(503, 10)
+
+        self.assertEqual(['first info', 'debug'], self._messages())
+
+    def test_written_on_latency(self, _):
+        self._support().finish_request(200, 1000)
+
+        self.assertEqual(['first info', 'debug'], self._messages())
+
+    def test_written_when_sampled(self, random_mock):
+        random_mock.return_value = 0.001
+
+        self._support().finish_request(200, 10)
+
+        self.assertEqual(['first info', 'debug'], self._messages())
+
+    def test_dropped_otherwise(self, _):
+        support = self._support()
+
+        support.finish_request(200, 10)
+        support.finish_request(500, 10)
+
+        self.assertEqual([], self.handler.records)
+
+    def test_buffer_bounded(self, _):
+        support = self._support()
+        for number in range(3):
+            support.notify_debug('debug %d', number)
+
+        support.notify_error('failed')
+
+        self.assertEqual(['debug 0', 'debug 1', 'debug 2', 'failed'], self._messages())
+
+    def test_not_buffered_without_entire_request_logging(self, _):
+        self.process_context.log_entire_request = False
+        support = self._support()
+
+        support.notify_error('failed')
+
+        self.assertEqual(['failed'], self._messages())
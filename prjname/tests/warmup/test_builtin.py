@@ -0,0 +1,32 @@
+"""
+Built-in warm-up hooks tests
+"""
+import mock
+from tornado import testing
+
+from prjname.common.warmup import builtin
+
+
+class CassandraWarmupHookTest(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(CassandraWarmupHookTest, self).setUp()
+        patcher = mock.patch.object(builtin.cassandra_adapter, 'CassandraAdapter')
+        self.adapter_class = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @testing.gen_test
+    def test_keyspaces_connected_with_one_cluster(self):
+        with mock.patch.object(builtin.settings, 'WARMUP_CASSANDRA_KEYSPACES', 'users,,events'):
+            yield builtin.CassandraWarmupHook().warm_up()
+
+        self.assertEqual(1, self.adapter_class.call_count)
+        self.assertEqual(sorted([mock.call('users'), mock.call('events')]),
+                         sorted(self.adapter_class.return_value.connect.call_args_list))
+
+    @testing.gen_test
+    def test_no_keyspaces(self):
+        with mock.patch.object(builtin.settings, 'WARMUP_CASSANDRA_KEYSPACES', []):
+            yield builtin.CassandraWarmupHook().warm_up()
+
+        self.assertFalse(self.adapter_class.called)
@@ -0,0 +1,91 @@
+"""
+WarmupRunner tests
+"""
+import mock
+from tornado import gen
+from tornado import testing
+
+from prjname.common.warmup import warmup_runner
+from prjname.common.warmup.hook import WarmupHook
+
+
+class Extension(object):  # pylint: disable=too-few-public-methods
+
+    def __init__(self, name, obj):
+        self.name = name
+        self.obj = obj
+
+
+class Hook(WarmupHook):
+
+    def __init__(self, failures=0, required=True):
+        self.failures = failures
+        self.REQUIRED = required  # pylint: disable=invalid-name
+        self.calls = 0
+
+    @gen.coroutine
+    def warm_up(self):
+        self.calls += 1
+        yield gen.moment
+        if self.calls <= self.failures:
+            raise ValueError('not yet')
+
+
+class HungHook(WarmupHook):
+
+    def warm_up(self):
+        return gen.sleep(10)
+
+
+class WarmupRunnerTest(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(WarmupRunnerTest, self).setUp()
+        patcher = mock.patch.object(warmup_runner.WarmupRunner, '_create_support')
+        self.support = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _runner(**hooks):
+        return warmup_runner.WarmupRunner([Extension(name, hook) for name, hook in hooks.items()],
+                                          timeout=0.1, retry_interval=60)
+
+    @testing.gen_test
+    def test_ready(self):
+        runner = self._runner(first=Hook(), optional=Hook(failures=1, required=False))
+
+        yield runner.run()
+
+        ready, state, hooks = runner.get_status()
+        self.assertTrue(ready)
+        self.assertEqual(warmup_runner.READY, state)
+        self.assertEqual({'first': warmup_runner.READY, 'optional': warmup_runner.FAILED},
+                         dict((hook['name'], hook['status']) for hook in hooks))
+        self.support.notify_info.assert_called_once_with('[Warm-up] ready in %.0f ms', mock.ANY)
+
+    @testing.gen_test
+    def test_failed_required_hook_run_again(self):
+        hook = Hook(failures=1)
+        runner = self._runner(failing=hook, ok=Hook())
+
+        yield runner.run()
+
+        self.assertEqual(warmup_runner.FAILED, runner.state)
+        self.support.notify_error.assert_called_once_with(
+            '[Warm-up] %s failed, retrying in %.1f s', 'failing', 60.0)
+
+        yield runner.run()
+
+        self.assertTrue(runner.ready)
+        self.assertEqual(2, hook.calls)
+        self.assertEqual(1, runner.hooks[1].obj.calls)
+
+    @testing.gen_test
+    def test_hung_hook_timed_out(self):
+        runner = self._runner(hung=HungHook())
+
+        yield runner.run()
+
+        _, state, hooks = runner.get_status()
+        self.assertEqual(warmup_runner.FAILED, state)
+        self.assertEqual('timed out after 0.1 s', hooks[0]['error'])
@@ -28,13 +28,24 @@ if __name__ == "__main__":
         include_package_data=True,
         entry_points={
             'console_scripts': [
-                'prjname-runservice = prjname.common.tornado.runservice:main'
+                'prjname-runservice = prjname.common.tornado.runservice:main',
+                'prjname-analytics = prjname.common.utils.analytics_reader:main'
             ],
             'prjname.services': [
                 'service1 = '
                     'prjname.service1.tornado.service1_command:Service1Command',
             ],
             'prjname.health.plugins': [
+                'ioloopLag = prjname.common.health.saturation:IOLoopLagPlugin',
+                'cassandra = prjname.common.health.saturation:CassandraPlugin',
+                'httpClient = prjname.common.health.saturation:HttpClientPlugin',
+                'memory = prjname.common.health.saturation:MemoryPlugin',
+                'fileDescriptors = '
+                    'prjname.common.health.saturation:FileDescriptorPlugin',
+            ],
+            'prjname.warmup': [
+                'cassandra = prjname.common.warmup.builtin:CassandraWarmupHook',
+                'health = prjname.common.warmup.builtin:HealthWarmupHook',
             ],
         },
     )